@@ -1,46 +1,81 @@
 # ml-service/app.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Any, Dict, List
-from pymongo import MongoClient
+from fastapi import FastAPI, Request
 import os
 from graph_builder import DynamicAdaptiveWeightedGraph, iso_to_dt
-from bgac_model import score_graph_snapshot_ml
-from graph_store import save_graph, load_graph
+from dawg_loader import DawgWarmup, load_vendor, replay_filter
+from graph_checkpoint import CheckpointWriter, restore_checkpoint
+from bgac_model import REGISTRY as MODELS, score_graph_snapshot_ml, score_graph_snapshots_ml
+from graph_store import WRITER as GRAPH_WRITER, save_graph, append_graph, load_graph
+from metrics import METRICS, MetricsMiddleware, quantile_samples
+# the pieces app_sharded.py shares (no DAWG); the names are re-exported for app_async.py
+from app_common import (routes, READINESS, events_collection, EXACT_FEATURES, VENDOR_CACHE, EMBEDDINGS, COMPONENTS,
+                        INGEST_BATCH, EventIn, ScoreBatchIn, vendor_cache_keys, vendor_cache_version, persist_batch,
+                        record_batch, ingest_request, stop_components)
 from datetime import datetime
+import time
 import uvicorn
 
 app = FastAPI(title="Vendor BGAC ML Service (full)")
-
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(MONGO_URI)
-db = client["vendorbgac"]
-events_collection = db["events"]
+# per-route request histograms; handlers add per-stage spans (see metrics.py, GET /metrics)
+app.add_middleware(MetricsMiddleware, router=app.router)
+# /healthz, /readyz and every route that does not touch the DAWG (app_common.py)
+app.include_router(routes)
 
 # instantiate a DAWG object — this will be our in-memory dynamic graph
-DAWG = DynamicAdaptiveWeightedGraph()
+# DAWG_BACKEND=array switches to the compact columnar store (graph_arrays.py)
+DAWG = DynamicAdaptiveWeightedGraph(backend=os.getenv("DAWG_BACKEND", "networkx"))
+
+# Stream events from DB into DAWG in the background so startup does not block on history.
+# DAWG_WARMUP_BATCH bounds memory per batch; DAWG_WARMUP_LIMIT=0 loads everything.
+WARMUP = DawgWarmup(DAWG, events_collection,
+                    batch_size=int(os.getenv("DAWG_WARMUP_BATCH", 5000)),
+                    limit=int(os.getenv("DAWG_WARMUP_LIMIT", 0)))
+
+# Periodic binary checkpoint of DAWG (graph_checkpoint.py); on restart we map it and only
+# replay events newer than its high-water mark. Off unless DAWG_CHECKPOINT_PATH names the file
+# (e.g. on a volume that survives restarts); app_sharded never checkpoints.
+CHECKPOINT_PATH = os.getenv("DAWG_CHECKPOINT_PATH", "")
+CHECKPOINTER = CheckpointWriter(DAWG, CHECKPOINT_PATH, interval=float(os.getenv("DAWG_CHECKPOINT_INTERVAL", 300))) if CHECKPOINT_PATH else None
 
-# Load events from DB at startup to initialize DAWG (non-blocking minimal init)
-def init_dawg_from_db(limit=10000):
-    docs = list(events_collection.find({}, {"_id":1,"vendorId":1,"eventType":1,"timestamp":1}).sort("timestamp",1).limit(limit))
-    normalized = []
-    for d in docs:
-        normalized.append({"_id": str(d.get("_id")), "vendorId": d.get("vendorId"), "eventType": d.get("eventType"), "timestamp": d.get("timestamp")})
-    DAWG.add_events_bulk(normalized)
-    print("DAWG initialized from DB with", len(normalized), "events")
+def init_dawg_from_db():
+    if CHECKPOINT_PATH and os.path.exists(CHECKPOINT_PATH):
+        try:
+            header = restore_checkpoint(DAWG, CHECKPOINT_PATH)
+            WARMUP.query = replay_filter(header["high_water_id"], int(os.getenv("DAWG_REPLAY_MARGIN", 60)))
+            CHECKPOINTER.saved_version = DAWG.version
+            print("DAWG restored from checkpoint with", header["n_nodes"], "events")
+        except Exception as e:
+            print("DAWG checkpoint restore failed, replaying from DB:", e)
+    return WARMUP.start()
+
+def start_dawg():
+    # stays synchronous in both modes: a restore must not race requests that update the DAWG
+    # (it is a memory map, and the warm-up replay it starts is already in the background)
+    init_dawg_from_db()
+    if CHECKPOINTER:
+        CHECKPOINTER.start()
+
+def warm_scorer():
+    # one throwaway score, so the first request does not pay for first-call setup
+    score_graph_snapshot_ml({})
 
 @app.on_event("startup")
 def startup_event():
-    try:
-        init_dawg_from_db()
-    except Exception as e:
-        print("DAWG init error:", e)
+    # one run_all, so every step is registered before the first one finishes; each background
+    # component is a blocking step of its own (see app_common.COMPONENTS)
+    READINESS.run_all([(name, start, True) for name, start in COMPONENTS] +
+                      [("dawg", start_dawg, True), ("models", MODELS.ensure_loaded), ("scorer", warm_scorer)])
+
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_components()
+    if CHECKPOINTER:
+        CHECKPOINTER.stop()
 
-class EventIn(BaseModel):
-    vendorId: str
-    eventType: str
-    timestamp: str = None
-    metadata: Dict[str, Any] = {}
+@app.get("/dawg_status")
+def dawg_status():
+    return {"warmup": WARMUP.status, "nodes": DAWG.store.number_of_nodes(), "edges": DAWG.store.number_of_edges(),
+            "vendors": len(DAWG.last_event_by_vendor), "checkpoint": CHECKPOINTER.last if CHECKPOINTER else None}
 
 @app.post("/add_event")
 def add_event(event: EventIn):
@@ -53,50 +88,152 @@ def add_event(event: EventIn):
         "metadata": event.metadata,
         "timestamp": event.timestamp or datetime.utcnow().isoformat()
     }
+    # vendor history must be in the DAWG before we chain onto it (warm-up may still be running)
+    WARMUP.ensure_vendor(event.vendorId)
     # insert into events collection
-    res = events_collection.insert_one(doc)
+    with METRICS.span("mongo_insert"):
+        res = events_collection.insert_one(doc)
     doc["_id"] = str(res.inserted_id)
-    # incremental update DAWG
-    DAWG.add_event_incremental({"_id": doc["_id"], "vendorId": doc["vendorId"], "eventType": doc["eventType"], "timestamp": doc["timestamp"]})
-    # build snapshot for vendor
-    snapshot = DAWG.snapshot_for_vendor(event.vendorId)
+    with DAWG.lock:
+        # incremental update DAWG
+        with METRICS.span("dawg_update"):
+            delta = DAWG.add_event_incremental({"_id": doc["_id"], "vendorId": doc["vendorId"], "eventType": doc["eventType"], "timestamp": doc["timestamp"]})
+        # build snapshot for vendor
+        with METRICS.span("snapshot"):
+            snapshot = DAWG.snapshot_for_vendor(event.vendorId)
+        with METRICS.span("vendor_features"):
+            feats = DAWG.vendor_features(event.vendorId, exact=EXACT_FEATURES)
     # score
-    score = score_graph_snapshot_ml(snapshot)
-    # store snapshot
-    save_graph(event.vendorId, snapshot["nodes"], snapshot["edges"])
+    score = score_graph_snapshot_ml({}, features=feats)
+    # queue only the new node/edge for the stored graph (flushed in the background)
+    with METRICS.span("graph_store"):
+        append_graph(event.vendorId, delta, snapshot)
+    VENDOR_CACHE.invalidate(*vendor_cache_keys(event.vendorId))
+    EMBEDDINGS.mark((event.vendorId,))
     return {"vendorId": event.vendorId, "snapshot": snapshot, "score": score}
 
+def ingest_batch(raw_events, touched, report):
+    """
+    One /add_events batch: persist_batch, one grouped DAWG update, and the per-vendor graph
+    deltas queued for write-behind. Touched vendors are collected for scoring.
+    """
+    t0 = time.perf_counter()
+    events = persist_batch(raw_events, report, WARMUP)
+    if events:
+        with DAWG.lock:
+            with METRICS.span("dawg_update"):
+                deltas = DAWG.add_events_bulk(events)
+            # a vendor's first write after startup stores the full snapshot (see append_graph)
+            with METRICS.span("snapshot"):
+                snapshots = {vid: DAWG.snapshot_for_vendor(vid) for vid in deltas if not GRAPH_WRITER.synced(vid)}
+        with METRICS.span("graph_store"):
+            for vid, delta in deltas.items():
+                append_graph(vid, delta, snapshots.get(vid))
+        touched.update(deltas)
+        EMBEDDINGS.mark(deltas)
+    record_batch(report, len(raw_events), len(events), t0)
+
+def score_vendors(vendor_ids):
+    with DAWG.lock, METRICS.span("vendor_features"):
+        feats = [DAWG.vendor_features(vid, exact=EXACT_FEATURES) for vid in vendor_ids]
+    scores = score_graph_snapshots_ml([{}] * len(feats), feats)
+    return [{"vendorId": vid, "score": sc} for vid, sc in zip(vendor_ids, scores)]
+
+@app.post("/add_events")
+async def add_events(request: Request, scores: bool = True):
+    """
+    Bulk ingest. Body: {"events": [...]} or a JSON array, or NDJSON (Content-Type
+    application/x-ndjson, one event per line), which is consumed as it streams in. Every
+    INGEST_BATCH events are persisted with one unordered insert_many and applied to the DAWG
+    grouped per vendor; each touched vendor is scored once, after the last batch. Invalid events
+    are skipped and counted in `rejected`.
+    """
+    return await ingest_request(request, scores, ingest_batch, score_vendors)
+
 @app.get("/vendor_graph/{vendor_id}")
-def vendor_graph(vendor_id: str):
-    stored = load_graph(vendor_id)
-    if stored:
-        snapshot = {"nodes": stored.get("nodes", []), "edges": stored.get("edges", [])}
-        score = score_graph_snapshot_ml(snapshot)
-        return {"vendorId": vendor_id, "graph": snapshot, "score": score}
-    # if not stored, build snapshot from DAWG (if present) or DB
-    snapshot = DAWG.snapshot_for_vendor(vendor_id)
+def vendor_graph(vendor_id: str, exact: bool = False):
+    exact = exact or EXACT_FEATURES
+    with DAWG.lock:
+        last = DAWG.last_event_by_vendor.get(vendor_id)
+    key = vendor_cache_keys(vendor_id)[exact]
+    version = vendor_cache_version(last["_id"] if last else None)
+    cached = VENDOR_CACHE.get(key, version)
+    if cached is not None:
+        return cached
+    result = build_vendor_graph(vendor_id, exact, in_dawg=last is not None)
+    VENDOR_CACHE.put(key, version, result)
+    return result
+
+def build_vendor_graph(vendor_id, exact, in_dawg):
+    # DAWG is authoritative; the stored graph is only used for vendors it does not hold
+    if not in_dawg:
+        with METRICS.span("graph_load"):
+            stored = load_graph(vendor_id)
+        if stored:
+            snapshot = {"nodes": stored.get("nodes", []), "edges": stored.get("edges", [])}
+            score = score_graph_snapshot_ml(snapshot)
+            return {"vendorId": vendor_id, "graph": snapshot, "score": score}
+    # if not stored, build snapshot from DAWG (loading the vendor on demand during warm-up) or DB
+    with METRICS.span("vendor_load"):
+        WARMUP.ensure_vendor(vendor_id)
+    with DAWG.lock, METRICS.span("snapshot"):
+        snapshot = DAWG.snapshot_for_vendor(vendor_id)
     # if empty, fallback to DB events
     if not snapshot["nodes"]:
-        docs = list(events_collection.find({"vendorId": vendor_id}, {"_id":1,"eventType":1,"timestamp":1}).sort("timestamp",1))
-        normalized = [{"_id": str(d.get("_id")), "eventType": d.get("eventType"), "timestamp": d.get("timestamp"), "vendorId": vendor_id} for d in docs]
-        DAWG.add_events_bulk(normalized)
-        snapshot = DAWG.snapshot_for_vendor(vendor_id)
+        with METRICS.span("vendor_load"):
+            load_vendor(DAWG, events_collection, vendor_id)
+        with DAWG.lock, METRICS.span("snapshot"):
+            snapshot = DAWG.snapshot_for_vendor(vendor_id)
+    with DAWG.lock, METRICS.span("vendor_features"):
+        feats = DAWG.vendor_features(vendor_id, exact=exact)
 
-    score = score_graph_snapshot_ml(snapshot)
-    save_graph(vendor_id, snapshot["nodes"], snapshot["edges"])
+    score = score_graph_snapshot_ml({}, features=feats)
+    if not GRAPH_WRITER.synced(vendor_id):
+        with METRICS.span("graph_store"):
+            save_graph(vendor_id, snapshot["nodes"], snapshot["edges"])
     return {"vendorId": vendor_id, "graph": snapshot, "score": score}
 
-@app.post("/train")
-def train_route():
+@app.post("/score_batch")
+def score_batch(req: ScoreBatchIn):
     """
-    Trigger model training on server (synthetic data trainer provided).
+    Score many snapshots and/or DAWG vendors with one feature matrix and one call per model.
+    Results come back in input order: `scores` matches `snapshots`, `vendors` matches `vendorIds`.
     """
-    try:
-        from train_model import train_and_save_models
-        clf_path, reg_path = train_and_save_models()
-        return {"trained": True, "clf": clf_path, "reg": reg_path}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    for vid in req.vendorIds:
+        WARMUP.ensure_vendor(vid)
+    with DAWG.lock, METRICS.span("vendor_features"):
+        vendor_feats = [DAWG.vendor_features(vid, exact=req.exact or EXACT_FEATURES) for vid in req.vendorIds]
+    scores = score_graph_snapshots_ml(req.snapshots + [{}] * len(vendor_feats), [None] * len(req.snapshots) + vendor_feats)
+    n = len(req.snapshots)
+    return {
+        "scores": scores[:n],
+        "vendors": [{"vendorId": vid, "score": sc} for vid, sc in zip(req.vendorIds, scores[n:])],
+    }
+
+def dawg_histories(vendor_ids):
+    # incremental embedding pass: each vendor's chain as the DAWG holds it now (locked per vendor)
+    for vid in vendor_ids:
+        with DAWG.lock:
+            nodes = DAWG.snapshot_for_vendor(vid)["nodes"]
+        yield vid, [{"eventType": n["label"]} for n in nodes]
+
+EMBEDDINGS.histories = dawg_histories
+
+def dawg_gauges(dawg):
+    """
+    Register the graph-size gauges; app_sharded registers per-shard ones instead.
+    """
+    def history():
+        with dawg.lock:
+            lengths = dawg.vendor_history_lengths()
+        return quantile_samples(lengths)
+    METRICS.gauge("ml_dawg_nodes", "Events (nodes) held in the DAWG", lambda: dawg.store.number_of_nodes())
+    METRICS.gauge("ml_dawg_edges", "Transitions (edges) held in the DAWG", lambda: dawg.store.number_of_edges())
+    METRICS.gauge("ml_dawg_vendors", "Vendors held in the DAWG", lambda: len(dawg.last_event_by_vendor))
+    METRICS.gauge("ml_dawg_vendor_history_events", "Events per vendor in the DAWG (quantile 1 = max)", history)
+
+dawg_gauges(DAWG)
+METRICS.gauge("ml_dawg_warmup_loaded", "Events streamed into the DAWG by the warm-up", lambda: WARMUP.status["loaded"])
 
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=int(os.getenv("PORT",8001)), reload=True)
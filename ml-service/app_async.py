@@ -0,0 +1,141 @@
+# ml-service/app_async.py
+"""
+Async variant of app.py: same DAWG, caches and routes, but /add_event and /vendor_graph are
+coroutines on the shared pooled async Mongo client (mongo.py) instead of blocking a threadpool
+slot per request. Run with: uvicorn app_async:app --port 8001
+
+Two clients, one per driver API, each pooled and shared process-wide: the async one for those two
+routes, and the sync one (created on first use) for the routes taken over from app.py and for
+the DAWG warm-up, which replays history on a background thread.
+
+/add_event runs its steps in sequence, not the insert and the graph persistence side by side:
+the graph persistence is only a queue append (graph_store.py writes it behind, off the request),
+so there is no second round trip to overlap, and the DAWG update waits for the insert because the
+DAWG cannot take an event back if the insert fails.
+"""
+from bson import ObjectId
+from datetime import datetime
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+import app as sync_app
+from app import (DAWG, WARMUP, EXACT_FEATURES, VENDOR_CACHE, GRAPH_WRITER, EMBEDDINGS, EventIn,
+                 vendor_cache_keys, vendor_cache_version, startup_event, shutdown_event)
+from bgac_model import score_graph_snapshot_ml
+from dawg_loader import load_vendor_async
+from graph_store import append_graph, save_graph
+from metrics import METRICS, MetricsMiddleware
+from mongo import get_async_db
+import os
+import uvicorn
+
+app = FastAPI(title="Vendor BGAC ML Service (async)")
+app.add_middleware(MetricsMiddleware, router=app.router)
+
+adb = get_async_db()
+events_collection = adb["events"]
+
+OVERRIDDEN = {"/add_event", "/vendor_graph/{vendor_id}"}
+for route in sync_app.app.routes:
+    if isinstance(route, APIRoute) and route.path not in OVERRIDDEN:
+        app.router.routes.append(route)
+
+app.on_event("startup")(startup_event)
+app.on_event("shutdown")(shutdown_event)
+
+async def ensure_vendor(vendor_id):
+    # only touches Mongo (on the sync client) while the warm-up is still running
+    if not WARMUP.has_vendor(vendor_id):
+        await run_in_threadpool(WARMUP.ensure_vendor, vendor_id)
+
+def apply_event(doc):
+    # the DAWG.lock section of /add_event; run on the threadpool, so a lock held by the warm-up
+    # or a checkpoint export blocks one worker thread instead of the event loop
+    with DAWG.lock:
+        with METRICS.span("dawg_update"):
+            delta = DAWG.add_event_incremental({"_id": str(doc["_id"]), "vendorId": doc["vendorId"], "eventType": doc["eventType"], "timestamp": doc["timestamp"]})
+        with METRICS.span("snapshot"):
+            snapshot = DAWG.snapshot_for_vendor(doc["vendorId"])
+        with METRICS.span("vendor_features"):
+            feats = DAWG.vendor_features(doc["vendorId"], exact=EXACT_FEATURES)
+    return delta, snapshot, feats
+
+@app.post("/add_event")
+async def add_event(event: EventIn):
+    """
+    Same contract as app.add_event, with the insert awaited on the async client. The event is
+    only applied to the DAWG (and from there to the stored graph, checkpoints, caches and
+    embeddings) once the insert succeeded, so a failed insert leaves no trace a retry could
+    double-count.
+    """
+    doc = {
+        "_id": ObjectId(),
+        "vendorId": event.vendorId,
+        "eventType": event.eventType,
+        "metadata": event.metadata,
+        "timestamp": event.timestamp or datetime.utcnow().isoformat()
+    }
+    await ensure_vendor(event.vendorId)
+    try:
+        with METRICS.span("mongo_insert"):
+            await events_collection.insert_one(doc)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"event insert failed: {e}")
+    delta, snapshot, feats = await run_in_threadpool(apply_event, doc)
+    score = score_graph_snapshot_ml({}, features=feats)
+    with METRICS.span("graph_store"):
+        append_graph(event.vendorId, delta, snapshot)
+    VENDOR_CACHE.invalidate(*vendor_cache_keys(event.vendorId))
+    EMBEDDINGS.mark((event.vendorId,))
+    return {"vendorId": event.vendorId, "snapshot": snapshot, "score": score}
+
+def last_event(vendor_id):
+    with DAWG.lock:
+        return DAWG.last_event_by_vendor.get(vendor_id)
+
+def vendor_snapshot(vendor_id):
+    with DAWG.lock, METRICS.span("snapshot"):
+        return DAWG.snapshot_for_vendor(vendor_id)
+
+def vendor_features(vendor_id, exact):
+    with DAWG.lock, METRICS.span("vendor_features"):
+        return DAWG.vendor_features(vendor_id, exact=exact)
+
+@app.get("/vendor_graph/{vendor_id}")
+async def vendor_graph(vendor_id: str, exact: bool = False):
+    exact = exact or EXACT_FEATURES
+    last = await run_in_threadpool(last_event, vendor_id)
+    key = vendor_cache_keys(vendor_id)[exact]
+    version = vendor_cache_version(last["_id"] if last else None)
+    cached = VENDOR_CACHE.get(key, version)
+    if cached is not None:
+        return cached
+    result = await build_vendor_graph(vendor_id, exact, in_dawg=last is not None)
+    VENDOR_CACHE.put(key, version, result)
+    return result
+
+async def build_vendor_graph(vendor_id, exact, in_dawg):
+    # DAWG.lock is only taken on the threadpool (see apply_event)
+    if not in_dawg:
+        with METRICS.span("graph_load"):
+            stored = await GRAPH_WRITER.load_async(adb, vendor_id)
+        if stored:
+            snapshot = {"nodes": stored.get("nodes", []), "edges": stored.get("edges", [])}
+            score = score_graph_snapshot_ml(snapshot)
+            return {"vendorId": vendor_id, "graph": snapshot, "score": score}
+    with METRICS.span("vendor_load"):
+        await ensure_vendor(vendor_id)
+    snapshot = await run_in_threadpool(vendor_snapshot, vendor_id)
+    if not snapshot["nodes"]:
+        with METRICS.span("vendor_load"):
+            await load_vendor_async(DAWG, events_collection, vendor_id)
+        snapshot = await run_in_threadpool(vendor_snapshot, vendor_id)
+    feats = await run_in_threadpool(vendor_features, vendor_id, exact)
+    score = score_graph_snapshot_ml({}, features=feats)
+    if not GRAPH_WRITER.synced(vendor_id):
+        with METRICS.span("graph_store"):
+            save_graph(vendor_id, snapshot["nodes"], snapshot["edges"])
+    return {"vendorId": vendor_id, "graph": snapshot, "score": score}
+
+if __name__ == "__main__":
+    uvicorn.run("app_async:app", host="0.0.0.0", port=int(os.getenv("PORT", 8001)), reload=False)
@@ -0,0 +1,343 @@
+# ml-service/app_common.py
+"""
+What app.py and app_sharded.py share: the events collection, the vendor_graph result cache and its
+keys, /add_events body handling and persistence, the background components (graph write-behind,
+model registry, metrics, embeddings) and the routes that do not touch the DAWG (`routes`, which
+each app includes). Importing this builds no DAWG; app.py owns that.
+"""
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Any, Dict, List
+import os
+from bgac_model import REGISTRY as MODELS, score_graph_snapshot_ml
+from mongo import LazyCollection
+from result_cache import ResultCache
+from train_model import TrainingJob
+from vendor_embeddings import EmbeddingJob
+from graph_store import WRITER as GRAPH_WRITER, store_stats
+from metrics import METRICS
+from startup import Readiness, add_health_routes
+from bson import ObjectId
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # stdlib json is several times slower on large event arrays
+    orjson = None
+
+def json_loads(body):
+    return orjson.loads(body) if orjson else json.loads(body)
+
+def json_dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY) if orjson else json.dumps(obj).encode()
+
+routes = APIRouter()
+
+# /healthz answers as soon as we serve; /readyz once the app's warm-up steps have run
+# (in the background with ML_LAZY_START=1, see startup.py)
+READINESS = Readiness()
+add_health_routes(routes, READINESS)
+
+# the Mongo client is created on the first request or warm-up step that touches the collection
+events_collection = LazyCollection("events")
+
+# Scoring features come from DAWG's running per-vendor stats in O(1); set DAWG_EXACT_FEATURES=1
+# (or ?exact=true per request) to recompute them from the full history instead.
+EXACT_FEATURES = os.getenv("DAWG_EXACT_FEATURES", "0") == "1"
+
+# Scored /vendor_graph results, keyed by vendor and its last event _id plus the model version;
+# /add_event invalidates and a model swap clears the local tier.
+# REDIS_URL (e.g. redis://redis:6379/0 under docker-compose) adds a tier shared by all workers.
+VENDOR_CACHE = ResultCache(maxsize=int(os.getenv("VENDOR_CACHE_SIZE", 10000)),
+                           ttl=float(os.getenv("VENDOR_CACHE_TTL", 30)),
+                           redis_url=os.getenv("REDIS_URL") or None)
+MODELS.on_swap = lambda version: VENDOR_CACHE.clear()
+
+def vendor_cache_keys(vendor_id):
+    return vendor_id, vendor_id + ":exact"
+
+def vendor_cache_version(last_event_id):
+    # a new event for the vendor or a new model version changes the version, so stale entries
+    # can never be served (also across workers sharing the Redis tier)
+    return f"{last_event_id or 'stored'}@{MODELS.version or 'legacy'}"
+
+class EventIn(BaseModel):
+    vendorId: str
+    eventType: str
+    timestamp: str = None
+    metadata: Dict[str, Any] = {}
+
+class ScoreBatchIn(BaseModel):
+    snapshots: List[Dict[str, Any]] = []
+    vendorIds: List[str] = []
+    exact: bool = False
+
+# /add_events: events per insert_many + DAWG batch (NDJSON bodies are cut into batches as they stream in)
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", 5000))
+
+def normalize_event(raw):
+    """
+    Event doc for an uploaded {vendorId, eventType, timestamp?, metadata?}; raises ValueError.
+    """
+    if not isinstance(raw, dict) or not isinstance(raw.get("vendorId"), str) or not isinstance(raw.get("eventType"), str):
+        raise ValueError("vendorId and eventType must be strings")
+    timestamp = raw.get("timestamp") or datetime.utcnow().isoformat()
+    if not isinstance(timestamp, str):
+        raise ValueError("timestamp must be an ISO string")
+    datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    metadata = raw.get("metadata") or {}
+    if not isinstance(metadata, dict):
+        raise ValueError("metadata must be an object")
+    return {"_id": ObjectId(), "vendorId": raw["vendorId"], "eventType": raw["eventType"], "metadata": metadata,
+            "timestamp": timestamp}
+
+def persist_batch(raw_events, report, warmup):
+    """
+    Validate a batch of uploaded events, load their vendors' history if the warm-up has not
+    reached them, and write them with one unordered insert_many. Returns the written events in
+    the shape DAWG.add_events_bulk takes; invalid or failed ones are counted in report["rejected"].
+    """
+    docs = []
+    for raw in raw_events:
+        try:
+            docs.append(normalize_event(raw))
+        except (ValueError, TypeError) as e:
+            report["rejected"] += 1
+            if len(report["errors"]) < 10:
+                report["errors"].append(str(e))
+    if not docs:
+        return []
+    for vid in {d["vendorId"] for d in docs}:
+        warmup.ensure_vendor(vid)
+    try:
+        with METRICS.span("mongo_insert"):
+            events_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # unordered: everything but the failed documents was written; keep the DAWG in step
+        write_errors = e.details.get("writeErrors", [])
+        failed = {err["index"] for err in write_errors}
+        report["rejected"] += len(failed)
+        report["errors"].extend(err.get("errmsg", "insert failed") for err in write_errors[:max(0, 10 - len(report["errors"]))])
+        docs = [d for i, d in enumerate(docs) if i not in failed]
+    return [{"_id": str(d["_id"]), "vendorId": d["vendorId"], "eventType": d["eventType"], "timestamp": d["timestamp"]}
+            for d in docs]
+
+def record_batch(report, n_events, n_inserted, t0):
+    elapsed = time.perf_counter() - t0
+    report["inserted"] += n_inserted
+    report["batches"].append({"events": n_events, "inserted": n_inserted, "seconds": round(elapsed, 4),
+                              "events_per_sec": round(n_inserted / elapsed, 1) if elapsed else None})
+
+def parse_events_body(body):
+    payload = json_loads(body)
+    events = payload.get("events") if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise ValueError("expected {events: [...]}, a JSON array, or NDJSON")
+    return events
+
+async def ingest_request(request, scores, ingest, score):
+    """
+    Body handling and reporting for /add_events; ingest(batch, touched, report) applies one batch
+    and score(vendor_ids) scores the touched vendors (each app passes its own).
+    """
+    t0 = time.perf_counter()
+    report = {"inserted": 0, "rejected": 0, "errors": [], "batches": []}
+    touched = set()
+    if "ndjson" in request.headers.get("content-type", ""):
+        pending, tail = [], b""
+        async for chunk in request.stream():
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                if line.strip():
+                    try:
+                        pending.append(json_loads(line))
+                    except ValueError as e:
+                        report["rejected"] += 1
+                        if len(report["errors"]) < 10:
+                            report["errors"].append(f"bad NDJSON line: {e}")
+            while len(pending) >= INGEST_BATCH:
+                batch, pending = pending[:INGEST_BATCH], pending[INGEST_BATCH:]
+                await run_in_threadpool(ingest, batch, touched, report)
+        if tail.strip():
+            try:
+                pending.append(json_loads(tail))
+            except ValueError as e:
+                report["rejected"] += 1
+                if len(report["errors"]) < 10:
+                    report["errors"].append(f"bad NDJSON line: {e}")
+        events = pending
+    else:
+        try:
+            events = await run_in_threadpool(parse_events_body, await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    for i in range(0, len(events), INGEST_BATCH):
+        await run_in_threadpool(ingest, events[i:i + INGEST_BATCH], touched, report)
+
+    vendor_ids = sorted(touched)
+    for vid in vendor_ids:
+        VENDOR_CACHE.invalidate(*vendor_cache_keys(vid))
+    report["vendors"] = len(vendor_ids)
+    if scores:
+        report["scores"] = await run_in_threadpool(score, vendor_ids)
+    elapsed = time.perf_counter() - t0
+    report["seconds"] = round(elapsed, 4)
+    report["events_per_sec"] = round(report["inserted"] / elapsed, 1) if elapsed else None
+    return Response(content=json_dumps(report), media_type="application/json")
+
+@routes.get("/graph_store_stats")
+def graph_store_stats():
+    """
+    Write-behind queue depth and flush latency of the vendor graph store (graph_store.py).
+    """
+    return store_stats()
+
+@routes.get("/cache_stats")
+def cache_stats():
+    return VENDOR_CACHE.stats()
+
+def score_events(body):
+    from feature_extractor import snapshot_from_events
+    with METRICS.span("parse"):
+        payload = json_loads(body)
+    if not isinstance(payload, dict) or not isinstance(payload.get("events", []), list):
+        raise ValueError("expected {events: [...], prev_engagement_prob, delay_seconds}")
+    with METRICS.span("snapshot"):
+        snapshot = snapshot_from_events(payload.get("events") or [])
+    snapshot["prev_engagement_prob"] = payload.get("prev_engagement_prob", 0.5)
+    snapshot["delay_seconds"] = payload.get("delay_seconds", 0.0)
+    return score_graph_snapshot_ml(snapshot)
+
+@routes.post("/score_snapshot")
+async def score_snapshot(request: Request):
+    """
+    Stateless scoring of a raw event list: {events: [{eventType, timestamp}], prev_engagement_prob,
+    delay_seconds}, as backend/routes/events.js posts it. Features come straight from the events
+    (no DAWG, no Mongo writes). The body is parsed with orjson instead of through pydantic
+    models, on the threadpool with the scoring, so a large payload does not stall the event loop.
+    """
+    body = await request.body()
+    try:
+        score = await run_in_threadpool(score_events, body)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"bad /score_snapshot payload: {e}")
+    return Response(content=json_dumps(score), media_type="application/json")
+
+def use_trained_models(version, clf, reg):
+    # load the published artifacts (memory-mapped) now instead of waiting for the next poll
+    MODELS.load()
+
+TRAIN_JOB = TrainingJob(on_done=use_trained_models)
+
+class TrainIn(BaseModel):
+    source: str = "synthetic"  # "synthetic" or "mongo" (features from the events collection)
+    n: int = 2000              # synthetic rows
+    maxVendors: int = 0        # mongo: 0 = every vendor
+    nEstimators: int = 100
+
+@routes.post("/train")
+def train_route(req: TrainIn = TrainIn()):
+    """
+    Start model training as a background job; poll /train_status for progress and the report.
+    """
+    if req.source not in ("synthetic", "mongo"):
+        raise HTTPException(status_code=400, detail="source must be 'synthetic' or 'mongo'")
+    started = TRAIN_JOB.start(source=req.source, n=req.n, collection=events_collection if req.source == "mongo" else None,
+                              max_vendors=req.maxVendors, n_estimators=req.nEstimators)
+    if not started:
+        raise HTTPException(status_code=409, detail="a training job is already running")
+    return TRAIN_JOB.status
+
+@routes.get("/train_status")
+def train_status():
+    return TRAIN_JOB.status
+
+@routes.get("/model_stats")
+def model_stats():
+    return MODELS.stats()
+
+# VendorGraphSAGE embeddings and the /similar_vendors index (vendor_embeddings.py): rebuilt from the
+# events collection by POST /embeddings/build in a child process, so this worker never imports torch.
+# EMBED_INTERVAL > 0 also re-embeds vendors with new events in-process every that many seconds (off by
+# default); each app sets EMBEDDINGS.histories to read those vendors from wherever its DAWG lives.
+EMBEDDINGS = EmbeddingJob(None,
+                          path=os.getenv("EMBEDDINGS_PATH", "vendor_embeddings.npz"),
+                          model_path=os.getenv("SAGE_MODEL_PATH", "vendor_sage.pt"),
+                          batch_size=int(os.getenv("EMBED_BATCH", 256)),
+                          max_nodes=int(os.getenv("EMBED_MAX_NODES", 50000)),
+                          interval=float(os.getenv("EMBED_INTERVAL", 0)))
+
+class EmbeddingsBuildIn(BaseModel):
+    maxVendors: int = 0  # 0 = every vendor
+
+@routes.post("/embeddings/build")
+def embeddings_build(req: EmbeddingsBuildIn = EmbeddingsBuildIn()):
+    """
+    Re-embed every vendor of the events collection as a background job; poll /embeddings/status.
+    """
+    if not EMBEDDINGS.start_rebuild(max_vendors=req.maxVendors):
+        raise HTTPException(status_code=409, detail="an embedding rebuild is already running")
+    return EMBEDDINGS.status
+
+@routes.get("/embeddings/status")
+def embeddings_status():
+    return {**EMBEDDINGS.status, "stats": EMBEDDINGS.stats()}
+
+@routes.get("/similar_vendors/{vendor_id}")
+def similar_vendors(vendor_id: str, k: int = 10):
+    """
+    The k vendors whose embeddings are closest to this vendor's by cosine similarity, best first.
+    404 until the vendor has been embedded (by a rebuild, or the incremental pass after its events).
+    """
+    if not 1 <= k <= 1000:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 1000")
+    with METRICS.span("similar_search"):
+        result = EMBEDDINGS.index.similar(vendor_id, k)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"no embedding for vendor {vendor_id}")
+    return {"vendorId": vendor_id, "similar": [{"vendorId": vid, "similarity": round(sim, 4)} for vid, sim in result]}
+
+# (name, start) of the background components; each app runs every one as a blocking warm-up step
+# of its own, so one failing neither skips the others nor goes unnoticed (it is reported by name in /readyz)
+COMPONENTS = [("graph_writer", GRAPH_WRITER.start), ("model_watcher", MODELS.start),
+              ("metrics", METRICS.start), ("embeddings", EMBEDDINGS.start)]
+
+def stop_components():
+    GRAPH_WRITER.stop()
+    MODELS.stop()
+    EMBEDDINGS.stop()
+
+# the DAWG size gauges are the app's own (app.dawg_gauges, or per shard in app_sharded)
+METRICS.gauge("ml_model_info", "Active model version (value is always 1)", lambda: [({"version": MODELS.version or "legacy"}, 1)])
+METRICS.gauge("ml_model_swaps", "Model versions swapped in since start", lambda: MODELS.metrics["swaps"])
+METRICS.gauge("ml_graph_store_pending", "Vendor graph items waiting for the write-behind flush",
+              lambda: store_stats()["queue"]["items"])
+METRICS.gauge("ml_vendor_cache_entries", "Entries in the local vendor_graph result cache", lambda: VENDOR_CACHE.stats()["size"])
+METRICS.gauge("ml_embedding_vendors", "Vendors in the similar-vendors embedding index", lambda: len(EMBEDDINGS.index))
+METRICS.gauge("ml_embedding_pending", "Vendors with new events waiting for the incremental embedding pass",
+              lambda: EMBEDDINGS.stats()["pending"])
+
+@routes.get("/metrics")
+def metrics():
+    """
+    Prometheus text format: ml_request_seconds per route, ml_stage_seconds per route and stage
+    (mongo_insert, dawg_update, snapshot, vendor_features, extract_features, model_engagement,
+    model_risk, graph_store, ...), graph size and model gauges.
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@routes.get("/metrics/profile")
+def metrics_profile():
+    """
+    Folded stacks of the slowest requests (METRICS_PROFILE=1), e.g.
+    curl :8001/metrics/profile | flamegraph.pl > slow.svg
+    """
+    if METRICS.profiler is None:
+        raise HTTPException(status_code=404, detail="profiler disabled; start with METRICS_PROFILE=1")
+    return PlainTextResponse(METRICS.profiler.folded())
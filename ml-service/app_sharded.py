@@ -0,0 +1,168 @@
+# ml-service/app_sharded.py
+"""
+Vendor-partitioned variant of app.py: the DAWG and its scoring live in DAWG_SHARDS shard
+processes (shards.py) and this process only routes. /add_event, /vendor_graph, /add_events,
+/score_batch and /dawg_status go to the owning shard (or scatter to all); every other route,
+the event store, graph write-behind and result cache come from app_common.py, as in app.py
+(which this process never imports, so it builds no DAWG of its own).
+Run with: DAWG_SHARDS=4 uvicorn app_sharded:app --port 8001
+DAWG checkpoints are not used in this mode; shards are filled by replaying the events collection.
+"""
+import os
+import time
+from datetime import datetime
+from fastapi import FastAPI, Request
+from app_common import (routes, EXACT_FEATURES, VENDOR_CACHE, READINESS, EMBEDDINGS, COMPONENTS, EventIn, ScoreBatchIn,
+                        events_collection, vendor_cache_keys, vendor_cache_version, persist_batch, record_batch,
+                        ingest_request, stop_components)
+from bgac_model import REGISTRY as MODELS, score_graph_snapshot_ml, score_graph_snapshots_ml
+from dawg_loader import DawgWarmup, load_vendor
+from graph_store import WRITER as GRAPH_WRITER, append_graph, save_graph, load_graph
+from metrics import METRICS, MetricsMiddleware
+from shards import ShardRouter
+import uvicorn
+
+app = FastAPI(title="Vendor BGAC ML Service (sharded)")
+app.add_middleware(MetricsMiddleware, router=app.router)
+app.include_router(routes)
+
+ROUTER = ShardRouter(int(os.getenv("DAWG_SHARDS", os.cpu_count() or 1)), backend=os.getenv("DAWG_BACKEND", "networkx"))
+# the warm-up reads the events collection once and scatters each batch to the owning shards
+WARMUP = DawgWarmup(ROUTER, events_collection,
+                    batch_size=int(os.getenv("DAWG_WARMUP_BATCH", 5000)),
+                    limit=int(os.getenv("DAWG_WARMUP_LIMIT", 0)))
+
+@app.on_event("startup")
+def startup_event():
+    # started one by one as blocking steps, as in app.py; the shards answer their first call
+    # (the "shards" step) once they have imported and loaded their models
+    READINESS.run_all([("router", ROUTER.start, True), ("dawg_warmup", WARMUP.start, True)] +
+                      [(name, start, True) for name, start in COMPONENTS] +
+                      [("models", MODELS.ensure_loaded), ("shards", ROUTER.stats)])
+
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_components()
+    ROUTER.stop()
+
+@app.get("/dawg_status")
+def dawg_status():
+    return {"warmup": WARMUP.status, **ROUTER.stats()}
+
+def shard_histories(vendor_ids):
+    # the incremental embedding pass reads each vendor's chain from its shard
+    for vid in vendor_ids:
+        snapshot = ROUTER.call_vendor(vid, "snapshot")
+        yield vid, [{"eventType": n["label"]} for n in snapshot["nodes"]]
+
+EMBEDDINGS.histories = shard_histories
+
+def shard_gauge(field):
+    return lambda: [({"shard": str(st["shard"])}, st[field]) for st in ROUTER.stats()["shards"]]
+
+def shard_history():
+    return [({"shard": str(st["shard"]), **labels}, v) for st in ROUTER.stats()["shards"] for labels, v in st["history"]]
+
+# the graph gauges of app.dawg_gauges, per shard
+METRICS.gauge("ml_dawg_nodes", "Events (nodes) held per DAWG shard", shard_gauge("nodes"))
+METRICS.gauge("ml_dawg_edges", "Transitions (edges) held per DAWG shard", shard_gauge("edges"))
+METRICS.gauge("ml_dawg_vendors", "Vendors held per DAWG shard", shard_gauge("vendors"))
+METRICS.gauge("ml_dawg_vendor_history_events", "Events per vendor in each DAWG shard (quantile 1 = max)", shard_history)
+METRICS.gauge("ml_dawg_warmup_loaded", "Events streamed into the DAWG shards by the warm-up", lambda: WARMUP.status["loaded"])
+
+@app.post("/add_event")
+def add_event(event: EventIn):
+    """
+    Same contract as app.add_event; the DAWG update and scoring run in the vendor's shard.
+    """
+    doc = {
+        "vendorId": event.vendorId,
+        "eventType": event.eventType,
+        "metadata": event.metadata,
+        "timestamp": event.timestamp or datetime.utcnow().isoformat()
+    }
+    WARMUP.ensure_vendor(event.vendorId)
+    with METRICS.span("mongo_insert"):
+        res = events_collection.insert_one(doc)
+    result = ROUTER.call(ROUTER.shard_for(event.vendorId), "add_event",
+                         {"_id": str(res.inserted_id), "vendorId": doc["vendorId"], "eventType": doc["eventType"],
+                          "timestamp": doc["timestamp"]}, EXACT_FEATURES)
+    with METRICS.span("graph_store"):
+        append_graph(event.vendorId, result["delta"], result["snapshot"])
+    VENDOR_CACHE.invalidate(*vendor_cache_keys(event.vendorId))
+    EMBEDDINGS.mark((event.vendorId,))
+    return {"vendorId": event.vendorId, "snapshot": result["snapshot"], "score": result["score"]}
+
+@app.get("/vendor_graph/{vendor_id}")
+def vendor_graph(vendor_id: str, exact: bool = False):
+    exact = exact or EXACT_FEATURES
+    last_id = ROUTER.call_vendor(vendor_id, "last_event_id")
+    key = vendor_cache_keys(vendor_id)[exact]
+    version = vendor_cache_version(last_id)
+    cached = VENDOR_CACHE.get(key, version)
+    if cached is not None:
+        return cached
+    result = build_vendor_graph(vendor_id, exact, in_dawg=last_id is not None)
+    VENDOR_CACHE.put(key, version, result)
+    return result
+
+def build_vendor_graph(vendor_id, exact, in_dawg):
+    stored = None if in_dawg else load_graph(vendor_id)
+    if stored:
+        snapshot = {"nodes": stored.get("nodes", []), "edges": stored.get("edges", [])}
+        return {"vendorId": vendor_id, "graph": snapshot, "score": score_graph_snapshot_ml(snapshot)}
+    WARMUP.ensure_vendor(vendor_id)
+    result = ROUTER.call_vendor(vendor_id, "vendor_graph", exact)
+    if result is None:
+        load_vendor(ROUTER, events_collection, vendor_id)
+        result = ROUTER.call_vendor(vendor_id, "vendor_graph", exact)
+    if result is None:
+        snapshot = {"nodes": [], "edges": []}
+        return {"vendorId": vendor_id, "graph": snapshot, "score": score_graph_snapshot_ml(snapshot)}
+    if not GRAPH_WRITER.synced(vendor_id):
+        save_graph(vendor_id, result["graph"]["nodes"], result["graph"]["edges"])
+    return {"vendorId": vendor_id, **result}
+
+def ingest_batch(raw_events, touched, report):
+    """
+    app.ingest_batch with the grouped DAWG update scattered to the shards.
+    """
+    t0 = time.perf_counter()
+    events = persist_batch(raw_events, report, WARMUP)
+    if events:
+        unsynced = [vid for vid in {e["vendorId"] for e in events} if not GRAPH_WRITER.synced(vid)]
+        deltas, snapshots = ROUTER.add_events(events, snapshot_for=unsynced)
+        with METRICS.span("graph_store"):
+            for vid, delta in deltas.items():
+                append_graph(vid, delta, snapshots.get(vid))
+        touched.update(deltas)
+        EMBEDDINGS.mark(deltas)
+    record_batch(report, len(raw_events), len(events), t0)
+
+def score_vendors(vendor_ids):
+    scores = ROUTER.score_vendors(vendor_ids, EXACT_FEATURES)
+    return [{"vendorId": vid, "score": sc} for vid, sc in zip(vendor_ids, scores)]
+
+@app.post("/add_events")
+async def add_events(request: Request, scores: bool = True):
+    """
+    Same contract as app.add_events; each batch is scattered to the shards owning its vendors.
+    """
+    return await ingest_request(request, scores, ingest_batch, score_vendors)
+
+@app.post("/score_batch")
+def score_batch(req: ScoreBatchIn):
+    """
+    Same contract as app.score_batch: snapshots are scored here, vendors by their shards.
+    """
+    for vid in req.vendorIds:
+        WARMUP.ensure_vendor(vid)
+    snapshot_scores = score_graph_snapshots_ml(req.snapshots)
+    vendor_scores = ROUTER.score_vendors(req.vendorIds, req.exact or EXACT_FEATURES) if req.vendorIds else []
+    return {
+        "scores": snapshot_scores,
+        "vendors": [{"vendorId": vid, "score": sc} for vid, sc in zip(req.vendorIds, vendor_scores)],
+    }
+
+if __name__ == "__main__":
+    uvicorn.run("app_sharded:app", host="0.0.0.0", port=int(os.getenv("PORT", 8001)))
@@ -1,9 +1,5 @@
-import math
-from collections import defaultdict
-
-# Prior probabilities (editable later)
-transition_counts = defaultdict(lambda: defaultdict(int))
-state_counts = defaultdict(int)
+import numpy as np
+from decay import BAYES_CONFIDENCE_RATE, factor
 
 # Initialize some dummy priors (can learn from data later)
 priors = {
@@ -13,22 +9,141 @@ priors = {
     "fill": 0.4,
     "sign": 0.2
 }
+DEFAULT_PRIOR = 0.01  # prior for labels not in `priors`
+
+class TransitionModel:
+    """
+    First-order Markov model over event labels backed by a dense count matrix
+    (counts[a, b] = number of a -> b transitions), Laplace-smoothed with `alpha`:
+    P(b | a) = (counts[a, b] + alpha) / (sum_b counts[a, b] + alpha * n_labels).
+    Paths are scored in log space, log P(b | a) + log prior(b) summed over transitions,
+    so long paths do not underflow; score_paths() does many paths in one gather-and-sum.
+    """
+    def __init__(self, labels=(), alpha=1.0, priors=None):
+        self.alpha = float(alpha)
+        self.priors = dict(priors or {})
+        self.labels = []
+        self.index = {}
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        self._log = None  # cached log(P(b|a) * prior(b)), rebuilt after updates
+        self.codes(labels)
+
+    @property
+    def n_labels(self):
+        return len(self.labels)
+
+    def codes(self, labels):
+        """
+        Label codes for a sequence of labels, adding unseen labels to the matrix.
+        """
+        index = self.index
+        for label in [l for l in dict.fromkeys(labels) if l not in index]:
+            index[label] = len(self.labels)
+            self.labels.append(label)
+        out = np.fromiter(map(index.__getitem__, labels), dtype=np.int64, count=len(labels))
+        k = len(self.labels)
+        if k > self.counts.shape[0]:
+            grown = np.zeros((k, k), dtype=np.int64)
+            grown[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+            self.counts = grown
+            self._log = None
+        return out
+
+    def update_transition(self, prev_state, next_state):
+        a, b = self.codes([prev_state, next_state])
+        self.counts[a, b] += 1
+        self._log = None
+
+    def update_transitions(self, sequences):
+        """
+        Ingest whole label sequences (e.g. every vendor's event path) with one bincount.
+        """
+        codes, first = self._concat(sequences)
+        k = self.n_labels
+        pair = codes[:-1] * k + codes[1:]
+        pair = pair[~first[1:]]  # drop the pairs that straddle two sequences
+        self.counts += np.bincount(pair, minlength=k * k).reshape(k, k)
+        self._log = None
+        return len(pair)
+
+    def _concat(self, paths):
+        """
+        All paths' codes back to back, plus a mask of the positions that start a path.
+        """
+        paths = [list(p) for p in paths]
+        lengths = np.array([len(p) for p in paths], dtype=np.int64)
+        codes = self.codes([label for p in paths for label in p])
+        first = np.zeros(len(codes), dtype=bool)
+        first[(np.cumsum(lengths) - lengths)[lengths > 0]] = True
+        return codes, first
+
+    def log_matrix(self):
+        if self._log is None:
+            k = self.n_labels
+            probs = (self.counts + self.alpha) / (self.counts.sum(axis=1, keepdims=True) + self.alpha * k)
+            prior = np.array([self.priors.get(label, DEFAULT_PRIOR) for label in self.labels])
+            self._log = np.log(probs) + np.log(prior)[None, :]
+        return self._log
+
+    def transition_prob(self, prev_state, next_state):
+        a, b = self.index.get(prev_state), self.index.get(next_state)
+        k = self.n_labels
+        if a is None or b is None:
+            return 1.0 / (k + 1)  # unseen label: uniform over the labels plus itself
+        return float((self.counts[a, b] + self.alpha) / (self.counts[a].sum() + self.alpha * k))
+
+    def score_paths(self, paths):
+        """
+        Log-likelihood of each path (a list of labels); paths shorter than two events score 0.
+        """
+        paths = list(paths)
+        lengths = np.array([len(p) for p in paths], dtype=np.int64)
+        codes, first = self._concat(paths)
+        steps = self.log_matrix()[codes[:-1], codes[1:]]
+        keep = ~first[1:]  # transition i -> i+1 stays inside one path
+        path_of = np.repeat(np.arange(len(paths)), lengths)[1:]
+        return np.bincount(path_of[keep], weights=steps[keep], minlength=len(paths))
+
+    def log_likelihood(self, path):
+        return float(self.score_paths([path])[0])
+
+    def save(self, path):
+        np.savez(path, labels=np.array(self.labels, dtype=object), counts=self.counts, alpha=self.alpha,
+                 prior_labels=np.array(list(self.priors), dtype=object),
+                 prior_values=np.array(list(self.priors.values()), dtype=np.float64))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as f:
+            model = cls(labels=f["labels"].tolist(), alpha=float(f["alpha"]),
+                        priors=dict(zip(f["prior_labels"].tolist(), f["prior_values"].tolist())))
+            model.counts = f["counts"].astype(np.int64)
+        return model
+
+def sequences_from_dawg(dawg, vendor_ids=None):
+    """
+    Every vendor's event labels in time order, read from the DAWG's per-vendor snapshots.
+    """
+    for vid in list(vendor_ids if vendor_ids is not None else dawg.last_event_by_vendor):
+        with dawg.lock:
+            snap = dawg.snapshot_for_vendor(vid)
+        yield [n["label"] for n in snap["nodes"]]
+
+# module-level model behind the original function API
+MODEL = TransitionModel(priors=priors)
 
 def update_transition(prev_state, next_state):
-    transition_counts[prev_state][next_state] += 1
-    state_counts[prev_state] += 1
+    MODEL.update_transition(prev_state, next_state)
+
+def update_transitions(sequences):
+    return MODEL.update_transitions(sequences)
 
 def transition_prob(prev_state, next_state):
-    if state_counts[prev_state] == 0: return 0.0001
-    return transition_counts[prev_state][next_state] / state_counts[prev_state]
+    return MODEL.transition_prob(prev_state, next_state)
 
 def bayesian_update(path):
-    prob = 1.0
-    for i in range(len(path)-1):
-        a, b = path[i], path[i+1]
-        prior = priors.get(b, 0.01)
-        likelihood = transition_prob(a, b)
-        prob *= (likelihood * prior)
-    return prob
-def confidence_decay(seconds, decay_rate=0.01):
-    return math.exp(-decay_rate * seconds)
+    # exp of the log-space score; use MODEL.log_likelihood for long paths, where this underflows to 0
+    return float(np.exp(MODEL.log_likelihood(path)))
+
+def confidence_decay(seconds, decay_rate=BAYES_CONFIDENCE_RATE):
+    return factor(seconds, decay_rate)
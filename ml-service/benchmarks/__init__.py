@@ -0,0 +1,4 @@
+# ml-service/benchmarks
+# Run from the ml-service directory, e.g. `python -m benchmarks.bench_snapshot`.
+# bench_micro (hot functions) and bench_load (HTTP load) write JSON with --out; compare two runs
+# with `python -m benchmarks.compare base.json new.json`.
@@ -0,0 +1,85 @@
+# ml-service/benchmarks/bench_add_events.py
+"""
+Ingest throughput: POST /add_event once per event versus POST /add_events with a JSON body and
+with a streamed NDJSON body (httpx in-process ASGI transport). Mongo is the mongomock stand-in
+from bench_async_load, sleeping --db-latency-ms per call. Each run ingests fresh vendors; the
+DAWG event counts are asserted afterwards.
+
+    python -m benchmarks.bench_add_events [--events 20000] [--vendors 500] [--single-events 2000] [--db-latency-ms 1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("DAWG_CHECKPOINT_PATH", "")
+from benchmarks.common import make_vendor_events
+from benchmarks.bench_async_load import install_stand_in
+import httpx
+
+def upload(n_events, n_vendors, prefix, rng):
+    per_vendor = max(1, n_events // n_vendors)
+    events = []
+    for v in range(n_vendors):
+        for e in make_vendor_events(f"{prefix}{v}", per_vendor, rng):
+            events.append({"vendorId": e["vendorId"], "eventType": e["eventType"], "timestamp": e["timestamp"],
+                           "metadata": {"source": "bench"}})
+    rng.shuffle(events)  # bursts interleave vendors
+    return events
+
+async def run(asgi_app, mode, events):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench", timeout=None) as http:
+        t0 = time.perf_counter()
+        if mode == "single":
+            for e in events:
+                r = await http.post("/add_event", json=e)
+                assert r.status_code == 200, r.text
+            report = None
+        elif mode == "json":
+            r = await http.post("/add_events", json={"events": events})
+            assert r.status_code == 200, r.text
+            report = r.json()
+        else:
+            async def lines():
+                for i in range(0, len(events), 1000):
+                    yield b"".join(json.dumps(e).encode() + b"\n" for e in events[i:i + 1000])
+            r = await http.post("/add_events", content=lines(), headers={"content-type": "application/x-ndjson"})
+            assert r.status_code == 200, r.text
+            report = r.json()
+        return time.perf_counter() - t0, report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--vendors", type=int, default=500)
+    ap.add_argument("--single-events", type=int, default=2000)
+    ap.add_argument("--db-latency-ms", type=float, default=1.0)
+    args = ap.parse_args()
+
+    install_stand_in(args.db_latency_ms / 1000)
+    import app as service
+    service.startup_event()
+    while not service.WARMUP.done:
+        time.sleep(0.05)
+
+    rng = random.Random(0)
+    print(f"db stand-in {args.db_latency_ms} ms/call, INGEST_BATCH={service.INGEST_BATCH}")
+    print(f"{'mode':>8} {'events':>7} {'vendors':>8} {'seconds':>8} {'events/s':>10} {'batches':>8}")
+    for mode, n, vendors in (("single", args.single_events, max(1, args.vendors * args.single_events // args.events)),
+                             ("json", args.events, args.vendors), ("ndjson", args.events, args.vendors)):
+        events = upload(n, vendors, f"{mode}-v", rng)
+        elapsed, report = asyncio.run(run(service.app, mode, events))
+        if report is not None:
+            assert report["inserted"] == len(events) and report["rejected"] == 0
+            assert len(report["scores"]) == vendors
+        with service.DAWG.lock:
+            in_dawg = sum(len(service.DAWG.snapshot_for_vendor(f"{mode}-v{v}")["nodes"]) for v in range(vendors))
+        assert in_dawg == len(events), (in_dawg, len(events))
+        batches = len(report["batches"]) if report else len(events)
+        print(f"{mode:>8} {len(events):>7} {vendors:>8} {elapsed:>8.2f} {len(events) / elapsed:>10,.0f} {batches:>8}")
+    service.shutdown_event()
+
+if __name__ == "__main__":
+    main()
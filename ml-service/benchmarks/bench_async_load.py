@@ -0,0 +1,137 @@
+# ml-service/benchmarks/bench_async_load.py
+"""
+Load test of the sync service (app.py) versus the async one (app_async.py): p50/p99 latency and
+requests/s at several concurrency levels, each client alternating POST /add_event and
+GET /vendor_graph. Requests go through httpx's in-process ASGI transport, so the sync handlers
+still queue on Starlette's threadpool exactly as under uvicorn.
+
+By default Mongo is a mongomock stand-in that sleeps --db-latency-ms per call (time.sleep on the
+sync client, asyncio.sleep on the async one) to model a network round trip; --mongo uses the real
+server at MONGO_URI instead (it writes events there, so point it at a scratch database).
+
+    python -m benchmarks.bench_async_load [--clients 50,200,1000] [--requests-per-client 4] [--db-latency-ms 2] [--mongo]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DAWG_CHECKPOINT_PATH", "")
+from benchmarks import common  # noqa: F401  (sys.path setup)
+import mongo
+
+class _StandInCursor:
+    def __init__(self, cursor, latency):
+        self.cursor = cursor
+        self.latency = latency
+
+    def sort(self, *a, **k):
+        self.cursor = self.cursor.sort(*a, **k)
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self.latency)
+        return list(self.cursor)
+
+class _StandInCollection:
+    def __init__(self, coll, latency, is_async):
+        self.coll = coll
+        self.latency = latency
+        self.is_async = is_async
+        self.name = coll.name
+
+    def __getattr__(self, attr):
+        fn = getattr(self.coll, attr)
+        if self.is_async:
+            if attr == "find":
+                return lambda *a, **k: _StandInCursor(fn(*a, **k), self.latency)
+            async def call(*a, **k):
+                await asyncio.sleep(self.latency)
+                return fn(*a, **k)
+        else:
+            def call(*a, **k):
+                time.sleep(self.latency)
+                return fn(*a, **k)
+        return call
+
+class _StandInDatabase:
+    def __init__(self, db, latency, is_async):
+        self.db = db
+        self.latency = latency
+        self.is_async = is_async
+
+    def __getitem__(self, name):
+        return _StandInCollection(self.db[name], self.latency, self.is_async)
+
+    __getattr__ = __getitem__
+
+class _StandInClient:
+    def __init__(self, client, latency, is_async):
+        self.client = client
+        self.latency = latency
+        self.is_async = is_async
+
+    def get_default_database(self, default=None):
+        return _StandInDatabase(self.client.get_default_database(default), self.latency, self.is_async)
+
+def install_stand_in(latency):
+    import mongomock
+    client = mongomock.MongoClient(mongo.MONGO_URI)
+    mongo._client = _StandInClient(client, latency, is_async=False)
+    mongo._async_client = _StandInClient(client, latency, is_async=True)
+
+async def run_level(asgi_app, n_clients, per_client, vendors, seed):
+    import httpx
+    rng = random.Random(seed)
+    latencies = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async def client_loop(http, k):
+        for i in range(per_client):
+            vid = vendors[rng.randrange(len(vendors))]
+            t0 = time.perf_counter()
+            if (i + k) % 2 == 0:
+                r = await http.post("/add_event", json={"vendorId": vid, "eventType": rng.choice(common.EVENT_TYPES)})
+            else:
+                r = await http.get(f"/vendor_graph/{vid}")
+            latencies.append(time.perf_counter() - t0)
+            assert r.status_code == 200, r.text
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench",
+                                 limits=limits, timeout=None) as http:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client_loop(http, k) for k in range(n_clients)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return pct(0.50), pct(0.99), len(latencies) / elapsed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", default="50,200,1000")
+    ap.add_argument("--requests-per-client", type=int, default=4)
+    ap.add_argument("--vendors", type=int, default=500)
+    ap.add_argument("--db-latency-ms", type=float, default=2.0)
+    ap.add_argument("--mongo", action="store_true", help="use the server at MONGO_URI instead of the stand-in")
+    args = ap.parse_args()
+
+    if not args.mongo:
+        install_stand_in(args.db_latency_ms / 1000)
+    import app as sync_app
+    import app_async
+
+    sync_app.startup_event()
+    while not sync_app.WARMUP.done:
+        time.sleep(0.05)
+    vendors = [f"load-v{i}" for i in range(args.vendors)]
+    print(f"db={'MONGO_URI' if args.mongo else f'stand-in ({args.db_latency_ms} ms/call)'} vendors={args.vendors}")
+    print(f"{'clients':>8} {'service':>8} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for n in [int(x) for x in args.clients.split(",")]:
+        for name, asgi_app in (("sync", sync_app.app), ("async", app_async.app)):
+            p50, p99, rps = asyncio.run(run_level(asgi_app, n, args.requests_per_client, vendors, seed=n))
+            print(f"{n:>8} {name:>8} {p50:9.2f} {p99:9.2f} {rps:9.1f}")
+    sync_app.shutdown_event()
+
+if __name__ == "__main__":
+    main()
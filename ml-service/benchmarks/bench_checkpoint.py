@@ -0,0 +1,59 @@
+# ml-service/benchmarks/bench_checkpoint.py
+"""
+Restart cost: restoring a DAWG checkpoint (mmap) + replaying the newest events,
+versus rebuilding the graph by replaying every event. That the two give the same graph is
+tests/test_graph_checkpoint.py's job.
+
+    python -m benchmarks.bench_checkpoint [--events 1000000] [--vendors 20000] [--backend array]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import make_population
+from graph_builder import DynamicAdaptiveWeightedGraph
+from graph_checkpoint import restore_checkpoint, save_checkpoint
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--vendors", type=int, default=20_000)
+    ap.add_argument("--tail", type=int, default=1000, help="events newer than the checkpoint to replay")
+    ap.add_argument("--backend", default="array")
+    args = ap.parse_args()
+
+    per_vendor = max(1, args.events // args.vendors)
+    events = make_population(args.vendors, per_vendor)
+    # the last --tail events (by timestamp) play the role of "written after the checkpoint"
+    events.sort(key=lambda e: e["timestamp"])
+    head, tail = events[:-args.tail], events[-args.tail:]
+
+    t0 = time.perf_counter()
+    full = DynamicAdaptiveWeightedGraph(backend=args.backend)
+    full.add_events_bulk(events, presorted=True)
+    replay_s = time.perf_counter() - t0
+
+    base = DynamicAdaptiveWeightedGraph(backend=args.backend)
+    base.add_events_bulk(head, presorted=True)
+    path = os.path.join(tempfile.mkdtemp(), "dawg.ckpt")
+    t0 = time.perf_counter()
+    save_checkpoint(base, path)
+    save_s = time.perf_counter() - t0
+    del base
+
+    t0 = time.perf_counter()
+    restored = DynamicAdaptiveWeightedGraph(backend=args.backend)
+    restore_checkpoint(restored, path)
+    restore_s = time.perf_counter() - t0
+    restored.add_events_bulk(tail, presorted=True)
+    restart_s = time.perf_counter() - t0
+
+    print(f"events={len(events)} backend={args.backend} checkpoint={os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"full replay          {replay_s:8.3f} s")
+    print(f"checkpoint save      {save_s:8.3f} s")
+    print(f"checkpoint restore   {restore_s:8.3f} s  (snapshots servable)")
+    print(f"restore + tail({args.tail}) {restart_s:8.3f} s  ({replay_s / restart_s:.1f}x faster than full replay; includes the lazy id index build)")
+
+if __name__ == "__main__":
+    main()
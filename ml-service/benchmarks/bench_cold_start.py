@@ -0,0 +1,137 @@
+# ml-service/benchmarks/bench_cold_start.py
+"""
+Cold start of the ml-service workers, eager vs ML_LAZY_START=1, each in fresh interpreters:
+
+  import    - `python -X importtime -c "import <app>"`: total import time and the slowest
+              top-level imports (cumulative, the same column as `python -X importtime`)
+  serve     - `uvicorn <app>:app` started on a free port; seconds until the first 200 from
+              /healthz (liveness) and from /readyz (every warm-up step done)
+
+app.py needs the Mongo at MONGO_URI for its DAWG restore (it only reads there); server.py needs
+torch / torch_geometric and uses an in-memory GNN state DB. --budget fails the run (exit 1) when any
+lazy-mode worker takes longer than that to its first healthy response; --out writes JSON for
+benchmarks.compare.
+
+    python -m benchmarks.bench_cold_start [--apps app,server] [--runs 3] [--top 10] [--budget 2.0] [--timeout 120] [--out FILE]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import write_results
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def env_for(lazy):
+    env = dict(os.environ, ML_LAZY_START="1" if lazy else "0")
+    env.setdefault("DAWG_CHECKPOINT_PATH", "")
+    env.setdefault("GNN_STATE_DB", ":memory:")
+    return env
+
+def import_profile(module, lazy, top):
+    """
+    (seconds to import `module`, [(cumulative seconds, top-level package)] slowest first).
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SERVICE_DIR,
+                          env=env_for(lazy), capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"; nesting is shown by indentation
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith(" ") or name.startswith("  "):
+            continue  # only top-level imports, so nothing is counted twice
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    total = next((s for s, name in rows if name == module), sum(s for s, _ in rows))
+    rows.sort(reverse=True)
+    return total, [r for r in rows if r[1] != module][:top]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+def serve_once(module, lazy, timeout):
+    """
+    Start one uvicorn worker and time its first 200 from /healthz and /readyz (None = timed out).
+    """
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=SERVICE_DIR, env=env_for(lazy), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    timings = {"healthz_seconds": None, "readyz_seconds": None}
+    try:
+        while time.perf_counter() - t0 < timeout and proc.poll() is None:
+            for key, path in (("healthz_seconds", "/healthz"), ("readyz_seconds", "/readyz")):
+                if timings[key] is None and get_status(f"http://127.0.0.1:{port}{path}") == 200:
+                    timings[key] = round(time.perf_counter() - t0, 3)
+            if timings["readyz_seconds"] is not None:
+                break
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        try:
+            _, err = proc.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            _, err = proc.communicate()
+    if timings["healthz_seconds"] is None:
+        print(f"  {module} never became healthy; last stderr:\n{err[-2000:]}")
+    return timings
+
+def median_or_none(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 3) if values else None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--apps", default="app,server")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--budget", type=float, default=None, help="max seconds to the first healthy response (lazy mode)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    results, over_budget = [], []
+    for module in args.apps.split(","):
+        for lazy in (False, True):
+            mode = "lazy" if lazy else "eager"
+            import_s, slowest = import_profile(module, lazy, args.top)
+            runs = [serve_once(module, lazy, args.timeout) for _ in range(args.runs)]
+            row = {"name": f"{module}[{mode}]", "import_seconds": round(import_s, 3),
+                   "startup_seconds": median_or_none([r["healthz_seconds"] for r in runs]),
+                   "ready_seconds": median_or_none([r["readyz_seconds"] for r in runs])}
+            results.append(row)
+            print(f"{row['name']}: import {row['import_seconds']:.3f}s, healthy after {row['startup_seconds']}s, "
+                  f"ready after {row['ready_seconds']}s (median of {args.runs})")
+            for seconds, name in slowest:
+                print(f"    {seconds:>8.3f}s  {name}")
+            if lazy and args.budget is not None and (row["startup_seconds"] is None or row["startup_seconds"] > args.budget):
+                over_budget.append(row["name"])
+
+    write_results(args.out, "cold_start", vars(args), results)
+    if over_budget:
+        print(f"over the {args.budget}s budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
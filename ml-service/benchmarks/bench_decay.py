@@ -0,0 +1,47 @@
+# ml-service/benchmarks/bench_decay.py
+"""
+"Top-N most engaged vendors right now" over many vendors with DecayedScores (one vectorized
+decay over all (value, last_update_ts) rows), against a per-vendor Python loop with pow() as the
+old engagement formula did it. That both rank the same vendors is tested in tests/test_decay.py.
+
+    python -m benchmarks.bench_decay [--vendors 1000000] [--top 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import timeit
+from decay import ENGAGEMENT_RATE, DecayedScores
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", type=int, default=1000000)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    now = time.time()
+    values = rng.random(args.vendors)
+    last_ts = now - rng.exponential(600.0, args.vendors)
+    scores = DecayedScores(ENGAGEMENT_RATE, capacity=args.vendors)
+    t0 = time.perf_counter()
+    scores.set_many([f"v{i}" for i in range(args.vendors)], values.tolist(), last_ts.tolist())
+    load_s = time.perf_counter() - t0
+
+    best, median = timeit(lambda: scores.top(args.top, now), args.repeat)
+
+    def legacy_top():
+        cur = [(scores.keys[i], v * 0.99 ** (now - t)) for i, (v, t) in enumerate(zip(values.tolist(), last_ts.tolist()))]
+        return sorted(cur, key=lambda kv: -kv[1])[:args.top]
+    t0 = time.perf_counter()
+    legacy_top()
+    legacy_s = time.perf_counter() - t0
+
+    print(f"vendors={args.vendors} top={args.top} (loaded in {load_s:.2f} s)")
+    print(f"DecayedScores.top   best {best * 1000:8.2f} ms  median {median * 1000:8.2f} ms")
+    print(f"pow() loop + sort        {legacy_s * 1000:8.2f} ms  ({legacy_s / median:.0f}x)")
+
+if __name__ == "__main__":
+    main()
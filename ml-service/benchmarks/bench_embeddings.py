@@ -0,0 +1,108 @@
+# ml-service/benchmarks/bench_embeddings.py
+"""
+Throughput of the vendor embedding job and the similar-vendors index (vendor_embeddings.py) on
+CPU, for a seeded Zipf population (default 100k vendors, 1M events):
+
+  build_graph        gnn_utils.build_graph for every vendor
+  forward[per-vendor] one VendorGraphSAGE forward per vendor (what batching replaces), on
+                     --baseline vendors
+  forward[batch=B]   disjoint mini-batches of B vendors, one forward each, for every vendor
+  job                EmbeddingJob.embed_items end to end (graphs, batches, pooling, index upserts)
+  similar[k]         EmbeddingIndex.similar latency over the full index
+
+Batching parity and the index against a brute-force search are tested in
+tests/test_vendor_embeddings.py.
+
+Reports vendors/s (ops/s for queries) and p50/p95/p99; --out writes JSON for benchmarks.compare.
+
+    python -m benchmarks.bench_embeddings [--vendors 100000] [--events 1000000] [--batch-sizes 64,256,1024] [--baseline 2000] [--threads 0] [--queries 500] [--k 10] [--out FILE]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import make_zipf_population, peak_rss_mb, percentiles, sample, write_results
+from vendor_embeddings import EmbeddingJob, VendorEmbedder, pack_batches
+
+def histories_of(events):
+    by_vendor = {}
+    for e in events:
+        by_vendor.setdefault(e["vendorId"], []).append(e)
+    return list(by_vendor.items())
+
+def throughput(name, n, elapsed, **extra):
+    return {"name": name, "vendors": n, "ops_per_sec": round(n / elapsed, 1), "seconds": round(elapsed, 3), **extra}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", type=int, default=100000)
+    ap.add_argument("--events", type=int, default=1000000)
+    ap.add_argument("--zipf", type=float, default=1.1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--batch-sizes", default="64,256,1024")
+    ap.add_argument("--max-nodes", type=int, default=50000)
+    ap.add_argument("--baseline", type=int, default=2000, help="vendors for the one-forward-per-vendor baseline")
+    ap.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch's default)")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    import torch
+    from gnn_utils import build_graph
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    histories = histories_of(make_zipf_population(args.vendors, args.events, s=args.zipf, seed=args.seed, prefix="emb-z"))
+    longest = max(len(h) for _, h in histories)
+    print(f"{args.events} events, {len(histories)} vendors (zipf s={args.zipf}, longest {longest}); "
+          f"torch threads {torch.get_num_threads()}")
+    embedder = VendorEmbedder()
+    results = []
+
+    t0 = time.perf_counter()
+    graphs = [build_graph(h) for _, h in histories]
+    results.append(throughput("build_graph", len(graphs), time.perf_counter() - t0))
+
+    per_vendor = sample(lambda g=iter(graphs * 2): embedder.embed_graphs([next(g)]), repeat=min(args.baseline, len(graphs)))
+    results.append({"name": "forward[per-vendor]", "vendors": len(per_vendor),
+                    "ops_per_sec": round(len(per_vendor) / sum(per_vendor), 1), **percentiles(per_vendor)})
+
+    for size in [int(b) for b in args.batch_sizes.split(",")]:
+        batches = list(pack_batches(((i, h) for i, (_, h) in enumerate(histories)), batch_size=size, max_nodes=args.max_nodes))
+        per_batch, out = [], []
+        t0 = time.perf_counter()
+        for batch in batches:
+            t1 = time.perf_counter()
+            out.append(embedder.embed_graphs([graphs[i] for i, _ in batch]))
+            per_batch.append(time.perf_counter() - t1)
+        elapsed = time.perf_counter() - t0
+        vectors = np.concatenate(out)
+        results.append(throughput(f"forward[batch={size}]", len(vectors), elapsed, batches=len(batches),
+                                  **percentiles(per_batch)))
+
+    job = EmbeddingJob(histories=None, batch_size=int(args.batch_sizes.split(",")[-1]), max_nodes=args.max_nodes, interval=0)
+    job._embedder = embedder
+    t0 = time.perf_counter()
+    n = job.embed_items(histories)
+    results.append(throughput("job.embed_items", n, time.perf_counter() - t0, index_mb=round(job.index.stats()["bytes"] / 2 ** 20, 1)))
+
+    index = job.index
+    rng = random.Random(args.seed)
+    ids = [vid for vid, _ in histories]
+    queries = iter([rng.choice(ids) for _ in range(args.queries + 3)])
+    latencies = sample(lambda: index.similar(next(queries), args.k), repeat=args.queries)
+    results.append({"name": f"similar[k={args.k}]", "vendors": len(index),
+                    "ops_per_sec": round(len(latencies) / sum(latencies), 1), **percentiles(latencies)})
+
+    print(f"{'case':<24} {'vendors':>9} {'vendors/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        cols = " ".join(f"{r[k]:>9.3f}" if r.get(k) is not None else f"{'-':>9}" for k in ("p50", "p95", "p99"))
+        print(f"{r['name']:<24} {r['vendors']:>9} {r['ops_per_sec']:>12,.1f} {cols}")
+    rss = peak_rss_mb()
+    print(f"index {index.stats()}, peak RSS {rss} MiB")
+    write_results(args.out, "embeddings", vars(args), results + [{"name": "process", "peak_rss_mb": rss}])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# ml-service/benchmarks/bench_features.py
+"""
+Feature extraction per snapshot size: the original per-node ISO/Python-loop extractor versus the
+vectorized ISO path, the numeric fast path (DAWG timeline) and the O(1) running vendor stats.
+Their parity is tested by tests/test_feature_extractor.py and tests/test_vendor_stats.py.
+
+    python -m benchmarks.bench_features [--sizes 10,1000,100000]
+"""
+import argparse
+import random
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import make_vendor_events, snapshot_from_events, timeit
+from feature_extractor import extract_features_from_snapshot
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def legacy_extract(snapshot):
+    # the original implementation, kept here as the speed baseline
+    nodes = snapshot.get("nodes", [])
+    edges = snapshot.get("edges", [])
+    ts = [datetime.fromisoformat(n["timestamp"]) for n in nodes]
+    diffs = []
+    for i in range(1, len(ts)):
+        diffs.append((ts[i] - ts[i-1]).total_seconds())
+    if not diffs:
+        diffs = [0.0]
+    return {
+        "n_events": len(nodes),
+        "avg_wait": float(np.mean(diffs)),
+        "median_wait": float(np.median(diffs)),
+        "std_wait": float(np.std(diffs)),
+        "unique_actions": len(set([n.get("label") for n in nodes])),
+        "edge_count": len(edges),
+        "avg_edge_count": float(np.mean([e.get("count", 1) for e in edges])) if edges else 0.0,
+        "last_event_age": (datetime.utcnow() - ts[-1]).total_seconds(),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,1000,100000")
+    args = ap.parse_args()
+
+    print(f"{'nodes':>8} {'legacy ms':>10} {'iso ms':>9} {'numeric ms':>11} {'speedup':>8} {'stats us':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        events = make_vendor_events("v", size, random.Random(size))
+        snapshot = snapshot_from_events(events)
+        dawg = DynamicAdaptiveWeightedGraph(backend="array")
+        dawg.add_events_bulk(events)
+        timeline = dawg.timeline_for_vendor("v")
+
+        repeat = max(3, min(200, 200_000 // size))
+        legacy = timeit(lambda: legacy_extract(snapshot), repeat)[1]
+        iso = timeit(lambda: extract_features_from_snapshot(snapshot), repeat)[1]
+        numeric = timeit(lambda: extract_features_from_snapshot(timeline), repeat)[1]
+        stats = timeit(lambda: dawg.vendor_features("v"), 200)[1]
+        print(f"{size:>8} {legacy * 1e3:10.3f} {iso * 1e3:9.3f} {numeric * 1e3:11.3f} {legacy / numeric:7.1f}x {stats * 1e6:9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# ml-service/benchmarks/bench_flat_forest.py
+"""
+FlatForest versus sklearn for both service models: the max difference on held-out rows (the parity
+test is tests/test_flat_forest.py), single-row latency, throughput per batch size, and the
+per-process private memory of loading the published version with and without the sklearn
+artifacts (MODEL_LOAD_SKLEARN).
+Models are written to a temporary MODEL_DIR.
+
+    python -m benchmarks.bench_flat_forest [--rows 20000] [--estimators 100]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="bench-flat-")
+from benchmarks.common import timeit
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from train_model import export_flat_models, synthesize_training_data
+import model_store
+
+RSS_PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+def private_kb():
+    # anonymous (unshared) memory; mmapped artifact pages are file-backed and shared
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("RssAnon"))
+import model_store
+before = private_kb(); t0 = time.perf_counter()
+m = model_store.load_model_set(sklearn={sklearn})
+load_s = time.perf_counter() - t0
+m.flat_clf.predict_proba(np.random.rand(256, 8)); m.flat_reg.predict(np.random.rand(256, 8))
+print(load_s, private_kb() - before)
+"""
+
+def probe(sklearn):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", RSS_PROBE.format(root=root, sklearn=sklearn)], capture_output=True,
+                         text=True, check=True, env=os.environ).stdout.split()
+    return float(out[0]), int(out[1])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--estimators", type=int, default=100)
+    args = ap.parse_args()
+
+    X, y_engage, y_risk = synthesize_training_data(args.rows, seed=0)
+    n_train = int(len(X) * 0.8)
+    clf = RandomForestClassifier(n_estimators=args.estimators, random_state=42).fit(X[:n_train], y_engage[:n_train])
+    reg = RandomForestRegressor(n_estimators=args.estimators, random_state=42).fit(X[:n_train], y_risk[:n_train])
+    flat_clf, flat_reg = export_flat_models(clf, reg)
+    held_out = X[n_train:]
+
+    # parity on held-out rows: identical leaves, so only float summation order can differ
+    d_clf = np.abs(flat_clf.predict_proba(held_out) - clf.predict_proba(held_out)).max()
+    d_reg = np.abs(flat_reg.predict(held_out) - reg.predict(held_out)).max()
+    print(f"parity on {len(held_out)} held-out rows: max |diff| clf {d_clf:.1e}  reg {d_reg:.1e}")
+    print(f"trees={args.estimators} nodes clf {len(flat_clf.feature):,} (depth {flat_clf.depth})  "
+          f"reg {len(flat_reg.feature):,} (depth {flat_reg.depth})  flat bytes {(flat_clf.nbytes + flat_reg.nbytes) / 2**20:.1f} MiB")
+
+    print(f"{'batch':>6} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8} {'flat rows/s':>12}")
+    for n in (1, 8, 32, 128, 256, 512, 1024, len(held_out)):
+        rows = held_out[:n]
+        repeat = 200 if n <= 32 else 20
+        _, skl = timeit(lambda: (clf.predict_proba(rows), reg.predict(rows)), repeat=repeat)
+        _, flat = timeit(lambda: (flat_clf.predict_proba(rows), flat_reg.predict(rows)), repeat=repeat)
+        print(f"{n:>6} {skl * 1e3:>11.3f} {flat * 1e3:>9.3f} {skl / flat:>7.1f}x {n / flat:>12,.0f}")
+
+    model_store.publish_models(clf, reg, flat=(flat_clf, flat_reg))
+    for sklearn in (True, False):
+        seconds, private_kb = probe(sklearn)
+        print(f"load sklearn={str(sklearn):<5}  {seconds:6.3f} s   private memory +{private_kb / 1024:6.1f} MiB per process after scoring")
+
+if __name__ == "__main__":
+    main()
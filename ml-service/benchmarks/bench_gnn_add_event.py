@@ -0,0 +1,129 @@
+# ml-service/benchmarks/bench_gnn_add_event.py
+"""
+server.py /add_event latency and events/s with training inside the request (the previous
+handler, reproduced below) versus inference-only requests plus the background trainer, and the
+trainer's own throughput draining the queued samples.
+
+A third run repeats the background-trainer case under a small --state-budget-kb so that cold
+vendors keep spilling to the state DB and being rehydrated.
+
+    python -m benchmarks.bench_gnn_add_event [--events 3000] [--vendors 50] [--state-budget-kb 64]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import time
+
+os.environ.setdefault("GNN_STATE_DB", ":memory:")
+
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Data
+
+from benchmarks.common import timeit  # noqa: F401  (sys.path setup)
+from gnn_tensors import VendorTensorStore
+from storage import VendorStateDB
+from vendor_state import VendorStateStore
+import server
+
+def legacy_build_graph(events, engagement):
+    # the previous build_graph: whole history rebuilt into fresh tensors on every event
+    x, edges = [], []
+    for i, evt in enumerate(events):
+        x.append([server.EVENT_MAP.get(evt, 0), engagement])
+        if i > 0:
+            edges.append([i - 1, i])
+    x = torch.tensor(x, dtype=torch.float32)
+    edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous() if edges else torch.tensor([[0], [0]])
+    return Data(x=x, edge_index=edge_index)
+
+def legacy_add_event(events, engagement, event):
+    # the old handler body after the engagement update: forward + backward + step per request
+    data = legacy_build_graph(events, engagement)
+    server.model.train()
+    server.optimizer.zero_grad()
+    out = server.model(data.x, data.edge_index)
+    score = out[-1].item()
+    label = 0.0 if event.eventType == "fraud_alert" else 1.0
+    loss = F.binary_cross_entropy(out[-1], torch.tensor([label]))
+    loss.backward()
+    server.optimizer.step()
+    return score
+
+def make_events(n, n_vendors, seed):
+    rng = random.Random(seed)
+    types = list(server.EVENT_MAP)
+    return [server.Event(vendorId=f"v{rng.randrange(n_vendors)}", eventType=rng.choice(types)) for _ in range(n)]
+
+def reset(memory_budget=0):
+    server.vendor_tensors = VendorTensorStore(num_layers=2, max_history=server.vendor_tensors.max_history)
+    server.vendor_state = VendorStateStore(VendorStateDB(":memory:"), server.vendor_tensors, server.EVENT_MAP,
+                                           memory_budget=memory_budget)
+
+def run(events, handler):
+    latencies = []
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for e in events:
+            t = time.perf_counter()
+            handler(e)
+            latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(0.99 * len(latencies))] * 1000, len(events) / elapsed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=3000)
+    ap.add_argument("--vendors", type=int, default=50)
+    ap.add_argument("--state-budget-kb", type=int, default=64)
+    args = ap.parse_args()
+    torch.set_num_threads(1)
+    events = make_events(args.events, args.vendors, seed=0)
+
+    legacy_events, legacy_engagement = {}, {}
+
+    def legacy(e):
+        # same bookkeeping as the handler, then the in-request training step
+        legacy_events.setdefault(e.vendorId, []).append(e.eventType)
+        legacy_add_event(legacy_events[e.vendorId], legacy_engagement.setdefault(e.vendorId, 0.1), e)
+
+    before = run(events, legacy)
+
+    trainer = server.trainer
+
+    def background(memory_budget):
+        reset(memory_budget)
+        trainer.stats.update(submitted=0, steps=0, samples=0, train_seconds=0.0)
+        # the trainer runs concurrently, as in the service, so requests pay for GIL contention
+        trainer.start()
+        result = run(events, lambda e: asyncio.run(server.log_event(e)))
+        queued = trainer.queue.qsize()
+        t0 = time.perf_counter()
+        while trainer.stats["samples"] < trainer.stats["submitted"]:
+            time.sleep(0.01)
+        trainer.stop()
+        return result, queued, time.perf_counter() - t0
+
+    after, queued, drain_s = background(0)
+    stats = dict(trainer.stats)
+    spilled, _, _ = background(args.state_budget_kb * 1024)
+    gauges = server.vendor_state.gauges()
+
+    print(f"events={args.events} vendors={args.vendors}")
+    print(f"{'':30} {'p50 ms':>8} {'p99 ms':>8} {'events/s':>10}")
+    print(f"{'train in request':30} {before[0]:8.3f} {before[1]:8.3f} {before[2]:10.1f}")
+    print(f"{'background trainer':30} {after[0]:8.3f} {after[1]:8.3f} {after[2]:10.1f}")
+    print(f"{'  + ' + str(args.state_budget_kb) + ' KiB state budget':30} {spilled[0]:8.3f} {spilled[1]:8.3f} {spilled[2]:10.1f}")
+    print(f"trainer: {stats['samples']} samples in {stats['steps']} steps "
+          f"({stats['samples_per_sec']} samples/s of training time, batch<={trainer.batch_size}), "
+          f"{queued} still queued after the last request, drained in {drain_s:.2f} s, "
+          f"{stats['published_version']} weight publishes")
+    print(f"state budget run: {gauges['resident_vendors']} resident vendors, {gauges['bytes_per_vendor']} B/vendor, "
+          f"{gauges['evictions']} evictions, {gauges['rehydrations']} rehydrations")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# ml-service/benchmarks/bench_gnn_window.py
+"""
+Per-event GNN scoring cost in server.py as a vendor's history grows: the previous full rebuild
+(legacy_build_graph + forward over the whole chain) versus an in-place append to the vendor's
+tensor buffers + forward over the last k hops. Asserts both give the same score for the newest event.
+
+    python -m benchmarks.bench_gnn_window [--lengths 10,100,1000,10000] [--max-history 0]
+"""
+import argparse
+import os
+import random
+
+import torch
+
+os.environ.setdefault("GNN_STATE_DB", ":memory:")
+from benchmarks.common import timeit
+from benchmarks.bench_gnn_add_event import legacy_build_graph
+from gnn_tensors import VendorTensorStore
+import server
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lengths", default="10,100,1000,10000")
+    ap.add_argument("--max-history", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    torch.set_num_threads(1)
+    model = server.model.eval()
+    rng = random.Random(0)
+    types = list(server.EVENT_MAP)
+
+    print(f"{'history':>8} {'full ms':>9} {'window ms':>10} {'speedup':>8} {'buffer KiB':>11}")
+    for length in (int(s) for s in args.lengths.split(",")):
+        vid = f"v{length}"
+        store = VendorTensorStore(num_layers=2, max_history=args.max_history)
+        history = []
+        eng = rng.random()
+        for _ in range(length):
+            t = rng.choice(types)
+            history.append(t)
+            store.append(vid, server.EVENT_MAP[t])
+        with torch.no_grad():
+            if not args.max_history:
+                full = legacy_build_graph(history, eng)
+                win = store.window(vid, eng)
+                a = model(full.x, full.edge_index)[-1].item()
+                b = model(win.x, win.edge_index)[-1].item()
+                assert abs(a - b) < 1e-6, f"window score {b} != full-history score {a} at length {length}"
+
+            def legacy_step():
+                history.append("send")
+                d = legacy_build_graph(history, eng)
+                return model(d.x, d.edge_index)[-1].item()
+
+            def window_step():
+                store.append(vid, 0)
+                d = store.window(vid, eng)
+                return model(d.x, d.edge_index)[-1].item()
+
+            _, full_ms = timeit(legacy_step, args.repeat)
+            _, win_ms = timeit(window_step, args.repeat)
+        print(f"{length:>8} {full_ms * 1000:9.3f} {win_ms * 1000:10.3f} {full_ms / win_ms:7.1f}x {store.nbytes() / 1024:11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# ml-service/benchmarks/bench_load.py
+"""
+End-to-end HTTP load driver for the ml-service apps, in process (httpx ASGI transport, so sync
+handlers still queue on Starlette's threadpool as under uvicorn). Closed-loop clients pick vendors
+with Zipf popularity and send a weighted mix of requests:
+
+    app / app_async   POST /add_event, GET /vendor_graph/{id}; --train-at adds one POST /train
+                      (synthetic data) part-way through and waits for the job via /train_status
+    server            POST /add_event, GET /top_engaged  (the GNN service)
+
+Before the run the events collection is seeded with --preload events of a Zipf population (the
+warm-up streams them into the DAWG) or, for server, the same population is appended to the GNN
+state. /train publishes into a copy of MODEL_DIR. Mongo is the mongomock stand-in from
+bench_async_load sleeping --db-latency-ms per call; --mongo uses MONGO_URI instead (it writes
+there, so point it at a scratch database).
+
+Reports per-endpoint req/s and p50/p95/p99, the training job's duration and the process's peak
+RSS; --out writes them as JSON for benchmarks.compare.
+
+    python -m benchmarks.bench_load [--app app] [--clients 50] [--requests 5000] [--mix add_event=1,vendor_graph=1]
+        [--vendors 2000] [--preload 100000] [--zipf 1.1] [--train-at 0.5] [--db-latency-ms 1] [--mongo] [--out FILE]
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("DAWG_CHECKPOINT_PATH", "")
+os.environ.setdefault("GNN_STATE_DB", ":memory:")
+if "MODEL_DIR" not in os.environ:
+    # start from the current models, but publish /train's version into a copy
+    _models = os.path.join(tempfile.mkdtemp(prefix="bench-load-"), "models")
+    if os.path.isdir("models"):
+        shutil.copytree("models", _models)
+    os.environ["MODEL_DIR"] = _models
+from benchmarks.common import (EVENT_TYPES, ZipfVendorPicker, make_zipf_population, peak_rss_mb, percentiles,
+                               write_results)
+
+DEFAULT_MIX = {"app": "add_event=1,vendor_graph=1", "app_async": "add_event=1,vendor_graph=1",
+               "server": "add_event=4,top_engaged=1"}
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def preload(app_name, events):
+    if app_name == "server":
+        import server
+        for e in events:
+            st = server.vendor_state.get(e["vendorId"]) or server.vendor_state.create(e["vendorId"], 0.1, time.time())
+            server.vendor_state.append_event(e["vendorId"], st, e["eventType"])
+        return
+    import mongo
+    from pymongo.errors import BulkWriteError
+    collection = mongo.get_db()["events"]
+    docs = [{**e, "metadata": {"source": "bench_load"}} for e in events]
+    for i in range(0, len(docs), 10000):
+        try:
+            collection.insert_many(docs[i:i + 10000], ordered=False)
+        except BulkWriteError:
+            pass  # already seeded by an earlier run against the same database
+
+def request_for(kind, vid, rng):
+    if kind == "add_event":
+        return "POST", "/add_event", {"vendorId": vid, "eventType": rng.choice(EVENT_TYPES), "metadata": {"source": "bench_load"}}
+    if kind == "vendor_graph":
+        return "GET", f"/vendor_graph/{vid}", None
+    if kind == "top_engaged":
+        return "GET", "/top_engaged?n=10", None
+    raise ValueError(f"unknown request kind {kind!r}")
+
+async def train(http, out):
+    t0 = time.perf_counter()
+    r = await http.post("/train", json={"source": "synthetic", "n": 2000, "nEstimators": 50})
+    out["train_request_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    if r.status_code != 200:
+        out["train_error"] = r.text
+        return
+    while True:
+        await asyncio.sleep(0.1)
+        status = (await http.get("/train_status")).json()
+        if status["state"] != "running":
+            break
+    out["train_job_seconds"] = round(time.perf_counter() - t0, 3)
+    out["train_state"] = status["state"]
+
+async def drive(asgi_app, args, mix, picker):
+    import httpx
+    rng = random.Random(args.seed)
+    kinds, weights = list(mix), list(mix.values())
+    latencies = {k: [] for k in kinds}
+    errors = {k: 0 for k in kinds}
+    issued = [0]
+    train_info = {}
+    train_at = int(args.train_at * args.requests) if args.train_at is not None and args.app != "server" else None
+    train_task = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async def client_loop(http):
+        while issued[0] < args.requests:
+            issued[0] += 1
+            if train_at is not None and issued[0] == train_at:
+                train_task.append(asyncio.ensure_future(train(http, train_info)))
+            kind = rng.choices(kinds, weights)[0]
+            method, path, body = request_for(kind, picker(), rng)
+            t0 = time.perf_counter()
+            r = await http.request(method, path, json=body)
+            latencies[kind].append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors[kind] += 1
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench",
+                                 limits=limits, timeout=None) as http:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client_loop(http) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - t0
+        if train_task:
+            await train_task[0]
+    return elapsed, latencies, errors, train_info
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--app", default="app", choices=("app", "app_async", "server"))
+    ap.add_argument("--clients", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--mix", default=None, help="kind=weight,... (default depends on --app)")
+    ap.add_argument("--vendors", type=int, default=2000)
+    ap.add_argument("--preload", type=int, default=100000)
+    ap.add_argument("--zipf", type=float, default=1.1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--train-at", type=float, default=0.5, help="fraction of requests after which /train is posted; -1 = never")
+    ap.add_argument("--db-latency-ms", type=float, default=1.0)
+    ap.add_argument("--mongo", action="store_true", help="use the server at MONGO_URI instead of the stand-in")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    if args.train_at is not None and args.train_at < 0:
+        args.train_at = None
+    mix = parse_mix(args.mix or DEFAULT_MIX[args.app])
+
+    if not args.mongo and args.app != "server":
+        from benchmarks.bench_async_load import install_stand_in
+        install_stand_in(args.db_latency_ms / 1000)
+    events = make_zipf_population(args.vendors, args.preload, s=args.zipf, seed=args.seed, prefix="load-z")
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        preload(args.app, events)
+    seed_s = time.perf_counter() - t0
+
+    service = importlib.import_module(args.app)
+    t0 = time.perf_counter()
+    if args.app == "server":
+        service.start_trainer()
+    else:
+        service.startup_event()
+        while not service.WARMUP.done and service.WARMUP.status["state"] != "error":
+            time.sleep(0.05)
+    startup_s = time.perf_counter() - t0
+    print(f"{args.app}: seeded {len(events)} events in {seed_s:.1f}s, started in {startup_s:.1f}s; "
+          f"db={'MONGO_URI' if args.mongo else f'stand-in ({args.db_latency_ms} ms/call)'}")
+
+    picker = ZipfVendorPicker([f"load-z{k}" for k in range(args.vendors)], s=args.zipf, seed=args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):  # handlers log every event
+        elapsed, latencies, errors, train_info = asyncio.run(drive(service.app, args, mix, picker))
+
+    results = []
+    total = sum(len(v) for v in latencies.values())
+    all_samples = [x for v in latencies.values() for x in v]
+    results.append({"name": "all", "requests": total, "errors": sum(errors.values()),
+                    "req_per_sec": round(total / elapsed, 1), **percentiles(all_samples)})
+    for kind in mix:
+        results.append({"name": kind, "requests": len(latencies[kind]), "errors": errors[kind],
+                        "req_per_sec": round(len(latencies[kind]) / elapsed, 1), **percentiles(latencies[kind])})
+    rss = peak_rss_mb()
+    results.append({"name": "process", "peak_rss_mb": rss, "startup_seconds": round(startup_s, 3), **train_info})
+
+    print(f"{args.clients} clients, {total} requests in {elapsed:.2f}s")
+    print(f"{'endpoint':>14} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results[:-1]:
+        print(f"{r['name']:>14} {r['requests']:>9} {r['errors']:>7} {r['req_per_sec']:>9.1f} "
+              f"{r['p50'] or 0:>9.2f} {r['p95'] or 0:>9.2f} {r['p99'] or 0:>9.2f}")
+    if train_info:
+        print("train:", train_info)
+    print(f"peak RSS {rss} MiB")
+
+    if args.app == "server":
+        service.stop_trainer()
+    else:
+        service.shutdown_event()
+    write_results(args.out, f"load:{args.app}", vars(args), results)
+
+if __name__ == "__main__":
+    main()
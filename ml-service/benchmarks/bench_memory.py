@@ -0,0 +1,41 @@
+# ml-service/benchmarks/bench_memory.py
+"""
+Bytes per event held by each DAWG backend (traced Python + NumPy allocations). That both
+backends produce identical snapshots is tests/test_graph_builder.py's job.
+
+    python -m benchmarks.bench_memory [--vendors 2000] [--events-per-vendor 50]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.common import make_population
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def build(backend, events):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+    dawg.add_events_bulk(events)
+    elapsed = time.perf_counter() - t0
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dawg, size, elapsed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", type=int, default=2000)
+    ap.add_argument("--events-per-vendor", type=int, default=50)
+    args = ap.parse_args()
+
+    events = make_population(args.vendors, args.events_per_vendor)
+    n = len(events)
+    print(f"{'backend':>9} {'events':>9} {'bytes/event':>12} {'build s':>8}")
+    for backend in ("networkx", "array"):
+        _dawg, size, elapsed = build(backend, events)
+        print(f"{backend:>9} {n:>9} {size / n:12.1f} {elapsed:8.2f}")
+
+if __name__ == "__main__":
+    main()
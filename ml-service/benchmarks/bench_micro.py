@@ -0,0 +1,155 @@
+# ml-service/benchmarks/bench_micro.py
+"""
+Micro-benchmarks of the hot functions, on a seeded Zipf vendor population (a few vendors with
+long histories, a long tail of short ones): DAWG updates, snapshots and features
+(graph_builder.py), feature extraction (feature_extractor.py), scoring (bgac_model.py) and,
+when torch is installed, server.py's GNN inference and training step.
+
+Every case reports ops/s and p50/p95/p99 per call; --out writes them as JSON for
+benchmarks.compare, e.g.
+
+    python -m benchmarks.bench_micro --out base.json
+    (change something)
+    python -m benchmarks.bench_micro --out new.json && python -m benchmarks.compare base.json new.json
+
+    python -m benchmarks.bench_micro [--vendors 5000] [--events 200000] [--zipf 1.1] [--repeat 200] [--only dawg,features] [--out FILE]
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import make_zipf_population, peak_rss_mb, percentiles, sample, write_results
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def case(name, fn, repeat, items=1):
+    samples = sample(fn, repeat)
+    total = sum(samples)
+    return {"name": name, "items_per_call": items, "ops_per_sec": round(items * len(samples) / total, 1) if total else None,
+            **percentiles(samples)}
+
+def dawg_cases(events, hot, median, args):
+    results = []
+    t0 = time.perf_counter()
+    dawg = DynamicAdaptiveWeightedGraph(backend=args.backend)
+    dawg.add_events_bulk(events, presorted=False)
+    elapsed = time.perf_counter() - t0
+    results.append({"name": "dawg.add_events_bulk", "items_per_call": len(events),
+                    "ops_per_sec": round(len(events) / elapsed, 1), "p50": round(elapsed * 1000, 4), "p95": None, "p99": None})
+
+    # one new event per call on the hottest vendor, continuing its chain
+    last = dawg.last_event_by_vendor[hot]
+    seq = iter(range(10 ** 9))
+
+    def add_one():
+        i = next(seq)
+        dawg.add_event_incremental({"_id": f"{hot}-new-{i}", "vendorId": hot, "eventType": "open",
+                                    "timestamp": last["timestamp"]})
+    results.append(case("dawg.add_event_incremental", add_one, args.repeat))
+    results.append(case("dawg.snapshot_for_vendor[hot]", lambda: dawg.snapshot_for_vendor(hot), args.repeat))
+    results.append(case("dawg.snapshot_for_vendor[median]", lambda: dawg.snapshot_for_vendor(median), args.repeat))
+    results.append(case("dawg.vendor_features[hot]", lambda: dawg.vendor_features(hot), args.repeat))
+    results.append(case("dawg.vendor_features[hot,exact]", lambda: dawg.vendor_features(hot, exact=True), args.repeat))
+    return dawg, results
+
+def feature_cases(dawg, events, hot, args):
+    from feature_extractor import extract_features_batch, extract_features_from_snapshot, snapshot_from_events
+    hot_events = [e for e in events if e["vendorId"] == hot]
+    snapshot = dawg.snapshot_for_vendor(hot)
+    timeline = dawg.timeline_for_vendor(hot)
+    vendors = list(dawg.last_event_by_vendor)[:args.batch]
+    snapshots = [dawg.snapshot_for_vendor(v) for v in vendors]
+    return [
+        case("features.snapshot_from_events[hot]", lambda: snapshot_from_events(hot_events), args.repeat),
+        case("features.extract[hot,snapshot]", lambda: extract_features_from_snapshot(snapshot), args.repeat),
+        case("features.extract[hot,timeline]", lambda: extract_features_from_snapshot(timeline), args.repeat),
+        case(f"features.extract_batch[{len(snapshots)}]", lambda: extract_features_batch(snapshots), args.repeat,
+             items=len(snapshots)),
+    ]
+
+def scoring_cases(dawg, hot, args):
+    import bgac_model
+    feats = dawg.vendor_features(hot)
+    vendors = list(dawg.last_event_by_vendor)[:args.batch]
+    batch_feats = [dawg.vendor_features(v) for v in vendors]
+    version = bgac_model.REGISTRY.version or ("legacy" if bgac_model.REGISTRY.active.clf is not None else "heuristic")
+    print(f"scoring with model version: {version}")
+    return [
+        case("score.snapshot[1]", lambda: bgac_model.score_graph_snapshot_ml({}, features=feats), args.repeat),
+        case(f"score.snapshots[{len(batch_feats)}]",
+             lambda: bgac_model.score_graph_snapshots_ml([{}] * len(batch_feats), batch_feats), args.repeat,
+             items=len(batch_feats)),
+    ]
+
+def gnn_cases(events, hot, args):
+    try:
+        import torch
+    except ImportError:
+        print("torch is not installed; skipping the GNN cases")
+        return []
+    os.environ.setdefault("GNN_STATE_DB", ":memory:")
+    torch.set_num_threads(1)
+    import server
+    for e in events:
+        vid = e["vendorId"]
+        st = server.vendor_state.get(vid) or server.vendor_state.create(vid, 0.1, 0.0)
+        server.vendor_state.append_event(vid, st, e["eventType"])
+    window = server.vendor_tensors.window(hot, 0.5)
+    model = server.trainer.inference_model
+    vendors = list(dict.fromkeys(e["vendorId"] for e in events))[:server.trainer.batch_size]
+    items = [(server.vendor_tensors.window(v, 0.5), 1.0) for v in vendors]
+
+    def forward():
+        with torch.no_grad():
+            model(window.x, window.edge_index)
+    return [
+        case("gnn.window[hot]", lambda: server.vendor_tensors.window(hot, 0.5), args.repeat),
+        case("gnn.forward[window]", forward, args.repeat),
+        case("gnn.build_graph[hot,full]", lambda: server.build_graph(hot), args.repeat),
+        case(f"gnn.trainer.step[{len(items)}]", lambda: server.trainer.step(items), max(10, args.repeat // 10),
+             items=len(items)),
+    ]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", type=int, default=5000)
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--zipf", type=float, default=1.1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=256)
+    ap.add_argument("--backend", default="networkx")
+    ap.add_argument("--only", default="dawg,features,score,gnn")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    groups = set(args.only.split(","))
+
+    events = make_zipf_population(args.vendors, args.events, s=args.zipf, seed=args.seed)
+    lengths = {}
+    for e in events:
+        lengths[e["vendorId"]] = lengths.get(e["vendorId"], 0) + 1
+    ranked = sorted(lengths, key=lengths.get, reverse=True)
+    hot, median = ranked[0], ranked[len(ranked) // 2]
+    print(f"{len(events)} events, {len(lengths)} vendors (zipf s={args.zipf}); hot vendor {lengths[hot]} events, "
+          f"median vendor {lengths[median]}")
+
+    results = []
+    dawg, dawg_results = dawg_cases(events, hot, median, args)
+    if "dawg" in groups:
+        results += dawg_results
+    if "features" in groups:
+        results += feature_cases(dawg, events, hot, args)
+    if "score" in groups:
+        results += scoring_cases(dawg, hot, args)
+    if "gnn" in groups:
+        results += gnn_cases(events, hot, args)
+
+    print(f"{'case':<40} {'ops/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        cols = " ".join(f"{r[k]:>9.3f}" if r[k] is not None else f"{'-':>9}" for k in ("p50", "p95", "p99"))
+        print(f"{r['name']:<40} {r['ops_per_sec']:>12,.1f} {cols}")
+    rss = peak_rss_mb()
+    print(f"peak RSS {rss} MiB")
+    write_results(args.out, "micro", vars(args), results + [{"name": "process", "peak_rss_mb": rss}])
+
+if __name__ == "__main__":
+    main()
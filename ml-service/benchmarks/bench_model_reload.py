@@ -0,0 +1,104 @@
+# ml-service/benchmarks/bench_model_reload.py
+"""
+Hot model reload: scoring threads run continuously while new versions are published and the
+registry watcher swaps them in. Reports scoring latency before/while swapping, swap count and
+errors (a request must never see a mismatched or missing pair), plus per-process load time and
+RSS growth for a plain joblib.load versus mmap_mode='r'.
+Models are written to a temporary MODEL_DIR.
+
+    python -m benchmarks.bench_model_reload [--versions 3] [--threads 4] [--estimators 100]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="bench-reload-")
+from benchmarks.common import fit_demo_models, make_vendor_events, snapshot_from_events
+import random
+import model_store
+import bgac_model
+
+RSS_PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmRSS"))
+import model_store
+before = rss_kb(); t0 = time.perf_counter()
+clf, reg = model_store.load_models(mmap={mmap})
+print(time.perf_counter() - t0, rss_kb() - before)
+"""
+
+def probe(mmap):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", RSS_PROBE.format(root=root, mmap=mmap)], capture_output=True,
+                         text=True, check=True, env=os.environ).stdout.split()
+    return float(out[0]), int(out[1])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--versions", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--estimators", type=int, default=100)
+    args = ap.parse_args()
+
+    registry = bgac_model.REGISTRY
+    registry.interval = 0.05
+    models = [fit_demo_models(n_estimators=args.estimators) for _ in range(2)]
+    model_store.publish_models(*models[0])
+    registry.load()
+    registry.start()
+
+    rng = random.Random(0)
+    snapshots = [snapshot_from_events(make_vendor_events(f"v{i}", 20, rng)) for i in range(32)]
+    stop = threading.Event()
+    phase = {"name": "steady"}
+    latencies = {"steady": [], "swapping": []}
+    errors = []
+
+    def score_loop():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                clf, reg = registry.models
+                assert clf is not None and reg is not None
+                bgac_model.score_graph_snapshots_ml(snapshots)
+            except Exception as e:
+                errors.append(repr(e))
+            latencies[phase["name"]].append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=score_loop) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    time.sleep(1.0)
+    phase["name"] = "swapping"
+    swaps0 = registry.metrics["swaps"]
+    for i in range(args.versions):
+        version = model_store.publish_models(*models[(i + 1) % 2])
+        while registry.version != version:
+            time.sleep(0.01)
+    stop.set()
+    for t in threads:
+        t.join()
+    registry.stop()
+
+    assert not errors, errors[:3]
+    assert registry.metrics["swaps"] - swaps0 == args.versions
+    for name, xs in latencies.items():
+        xs.sort()
+        print(f"{name:<9} calls={len(xs):<6} p50 {xs[len(xs) // 2] * 1e3:7.2f} ms   p99 {xs[int(len(xs) * 0.99)] * 1e3:7.2f} ms   "
+              f"max {xs[-1] * 1e3:7.2f} ms")
+    print(f"swaps={registry.metrics['swaps'] - swaps0} errors={len(errors)} last load {registry.metrics['load_seconds_last']} s "
+          f"versions kept={len(model_store.list_versions())}")
+
+    for mmap in (False, True):
+        seconds, rss_kb = probe(mmap)
+        print(f"load mmap={str(mmap):<5}  {seconds:6.3f} s   RSS +{rss_kb / 1024:6.1f} MiB per process")
+
+if __name__ == "__main__":
+    main()
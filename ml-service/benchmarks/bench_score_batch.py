@@ -0,0 +1,38 @@
+# ml-service/benchmarks/bench_score_batch.py
+"""
+N calls of score_graph_snapshot_ml versus one score_graph_snapshots_ml call over the same snapshots,
+with in-memory demo forests (their parity is tests/test_scoring.py's job).
+
+    python -m benchmarks.bench_score_batch [--vendors 1000] [--events-per-vendor 30]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import fit_demo_models, make_vendor_events, snapshot_from_events
+import bgac_model
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", type=int, default=1000)
+    ap.add_argument("--events-per-vendor", type=int, default=30)
+    args = ap.parse_args()
+
+    bgac_model.REGISTRY.activate("bench", *fit_demo_models())
+    rng = random.Random(0)
+    snapshots = [snapshot_from_events(make_vendor_events(f"v{i}", rng.randint(1, 2 * args.events_per_vendor), rng))
+                 for i in range(args.vendors)]
+
+    t0 = time.perf_counter()
+    [bgac_model.score_graph_snapshot_ml(s) for s in snapshots]
+    single_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bgac_model.score_graph_snapshots_ml(snapshots)
+    batch_s = time.perf_counter() - t0
+
+    print(f"snapshots={len(snapshots)}")
+    print(f"single calls  {single_s:8.3f} s  ({len(snapshots) / single_s:10.1f} snapshots/s)")
+    print(f"one batch     {batch_s:8.3f} s  ({len(snapshots) / batch_s:10.1f} snapshots/s, {single_s / batch_s:.1f}x)")
+
+if __name__ == "__main__":
+    main()
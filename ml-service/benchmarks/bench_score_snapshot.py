@@ -0,0 +1,100 @@
+# ml-service/benchmarks/bench_score_snapshot.py
+"""
+POST /score_snapshot at 10, 1k and 50k events per request, with the payload backend/routes/events.js
+sends (lean Mongo docs: ISO "Z" timestamps, _id, vendorId, metadata). Compared against a
+straightforward route: a pydantic Dict body (stdlib json + validation) turned into a nodes/edges
+snapshot for score_graph_snapshot_ml. Both go through httpx's in-process ASGI transport; parse
+and feature stages are also timed on their own. Scores are asserted equal.
+
+    python -m benchmarks.bench_score_snapshot [--sizes 10,1000,50000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict
+
+os.environ.setdefault("DAWG_CHECKPOINT_PATH", "")
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="bench-snapshot-")
+from benchmarks.common import fit_demo_models, make_vendor_events, timeit
+from benchmarks.bench_async_load import install_stand_in
+from fastapi import FastAPI
+import httpx
+
+def backend_payload(n, rng):
+    events = make_vendor_events("bench-v", n, rng)
+    for e in events:
+        e["timestamp"] = e["timestamp"][:23] + "Z" if "." in e["timestamp"] else e["timestamp"] + ".000Z"
+        e["metadata"] = {"source": "bench", "ip": "10.0.0.1"}
+        e["__v"] = 0
+    return {"events": events, "prev_engagement_prob": 0.5, "delay_seconds": 120.0}
+
+def baseline_app(score_graph_snapshot_ml):
+    base = FastAPI()
+
+    @base.post("/score_snapshot")
+    def score_snapshot(payload: Dict[str, Any]):
+        events = payload.get("events", [])
+        nodes = [{"id": e["_id"], "label": e["eventType"], "timestamp": e["timestamp"]} for e in events]
+        edges = [{"from": a["id"], "to": b["id"], "count": 1} for a, b in zip(nodes, nodes[1:])]
+        return score_graph_snapshot_ml({"nodes": nodes, "edges": edges,
+                                        "prev_engagement_prob": payload.get("prev_engagement_prob", 0.5),
+                                        "delay_seconds": payload.get("delay_seconds", 0.0)})
+    return base
+
+async def post_many(asgi_app, body, repeat):
+    samples, result = [], None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench") as http:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            r = await http.post("/score_snapshot", content=body, headers={"content-type": "application/json"})
+            samples.append(time.perf_counter() - t0)
+            assert r.status_code == 200, r.text
+            result = r.json()
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,1000,50000")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    install_stand_in(0)
+    import model_store
+    model_store.publish_models(*fit_demo_models())
+    import app as service
+    import orjson
+    from feature_extractor import snapshot_from_events, extract_features_batch
+
+    base = baseline_app(service.score_graph_snapshot_ml)
+    rng = random.Random(0)
+    print(f"{'events':>7} {'body KiB':>9} {'parse json':>11} {'orjson':>8} {'feat nodes':>11} {'events':>8} "
+          f"{'request before':>15} {'after':>9} {'speedup':>8}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        payload = backend_payload(n, rng)
+        body = json.dumps(payload).encode()
+        repeat = max(3, args.repeat if n <= 1000 else args.repeat // 4)
+
+        _, t_json = timeit(lambda: json.loads(body), repeat=repeat)
+        _, t_orjson = timeit(lambda: orjson.loads(body), repeat=repeat)
+        parsed = orjson.loads(body)
+        nodes = [{"id": e["_id"], "label": e["eventType"], "timestamp": e["timestamp"]} for e in parsed["events"]]
+        snap = {"nodes": nodes, "edges": [{"count": 1}] * (n - 1)}
+        _, t_nodes = timeit(lambda: extract_features_batch([snap]), repeat=repeat)
+        _, t_events = timeit(lambda: extract_features_batch([snapshot_from_events(parsed["events"])]), repeat=repeat)
+
+        before, r_before = asyncio.run(post_many(base, body, repeat))
+        after, r_after = asyncio.run(post_many(service.app, body, repeat))
+        for k in ("engagement_prob", "risk_score", "compliant", "anomaly", "churn-risk"):
+            assert abs(r_before[k] - r_after[k]) < 1e-9, (k, r_before[k], r_after[k])
+        assert {k: v for k, v in r_before["features"].items() if k != "last_event_age"} == \
+               {k: v for k, v in r_after["features"].items() if k != "last_event_age"}
+        print(f"{n:>7} {len(body) / 1024:>9.1f} {t_json * 1e3:>9.2f}ms {t_orjson * 1e3:>6.2f}ms {t_nodes * 1e3:>9.2f}ms "
+              f"{t_events * 1e3:>6.2f}ms {before * 1e3:>13.2f}ms {after * 1e3:>7.2f}ms {before / after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# ml-service/benchmarks/bench_shards.py
+"""
+Events/s of the vendor-partitioned DAWG (shards.py) from 1 to 8 shard processes on one machine,
+against the in-process DAWG of app.py. Two workloads per shard count:
+  bulk    - /add_events style: batches of --batch events scattered to the owning shards
+  single  - /add_event style: one event (update + snapshot + score) per call, issued by
+            --clients threads, so calls for different shards overlap
+Each shard count gets fresh shards; per-vendor event counts are asserted afterwards.
+Scaling needs as many free cores as shards.
+
+    python -m benchmarks.bench_shards [--shards 1,2,4,8] [--vendors 2000] [--events-per-vendor 20] [--batch 5000] [--single-events 4000] [--clients 16]
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import make_vendor_events
+from graph_builder import DynamicAdaptiveWeightedGraph
+from shards import ShardRouter
+
+def population(n_vendors, per_vendor, prefix, rng):
+    events = []
+    for v in range(n_vendors):
+        events.extend(make_vendor_events(f"{prefix}{v}", per_vendor, rng))
+    # interleave vendors but keep each vendor's events in time order, as a live stream would
+    events.sort(key=lambda e: e["timestamp"])
+    return events
+
+def run_bulk(dawg_or_router, events, batch):
+    t0 = time.perf_counter()
+    for i in range(0, len(events), batch):
+        dawg_or_router.add_events_bulk(events[i:i + batch], presorted=True)
+    return time.perf_counter() - t0
+
+def run_single(add_one, events, clients):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(add_one, events))
+    return time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shards", default="1,2,4,8")
+    ap.add_argument("--vendors", type=int, default=2000)
+    ap.add_argument("--events-per-vendor", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=5000)
+    ap.add_argument("--single-events", type=int, default=4000)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--backend", default="networkx")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    bulk = population(args.vendors, args.events_per_vendor, "b", rng)
+    single_vendors = max(1, args.single_events // args.events_per_vendor)
+    single = population(single_vendors, args.events_per_vendor, "s", rng)
+    print(f"{len(bulk)} bulk events over {args.vendors} vendors, {len(single)} single events, "
+          f"{args.clients} clients, {args.backend} backend")
+    print(f"{'shards':>8} {'bulk ev/s':>10} {'x':>6} {'single ev/s':>12} {'x':>6} {'rtt ms':>7}")
+
+    # in-process baseline: app.py's DAWG behind one lock
+    import bgac_model
+    dawg = DynamicAdaptiveWeightedGraph(backend=args.backend)
+    bulk_s = run_bulk(dawg, bulk, args.batch)
+
+    def add_local(e):
+        with dawg.lock:
+            dawg.add_event_incremental(e)
+            dawg.snapshot_for_vendor(e["vendorId"])
+            feats = dawg.vendor_features(e["vendorId"])
+        return bgac_model.score_graph_snapshot_ml({}, features=feats)
+
+    single_s = run_single(add_local, single, args.clients)
+    base_bulk, base_single = len(bulk) / bulk_s, len(single) / single_s
+    print(f"{'in-proc':>8} {base_bulk:>10,.0f} {1.0:>6.2f} {base_single:>12,.0f} {1.0:>6.2f} {'-':>7}")
+
+    for n in (int(s) for s in args.shards.split(",")):
+        router = ShardRouter(n, backend=args.backend)
+        router.start()
+        try:
+            router.stats()  # waits until every shard has imported its models
+            bulk_s = run_bulk(router, bulk, args.batch)
+            single_s = run_single(lambda e: router.call(router.shard_for(e["vendorId"]), "add_event", e, False), single, args.clients)
+            stats = router.stats()
+            assert sum(s["nodes"] for s in stats["shards"]) == len(bulk) + len(single), stats
+            for vid in ("b0", f"b{args.vendors - 1}", "s0"):
+                assert len(router.call_vendor(vid, "snapshot")["nodes"]) == args.events_per_vendor, vid
+            print(f"{n:>8} {len(bulk) / bulk_s:>10,.0f} {len(bulk) / bulk_s / base_bulk:>6.2f} "
+                  f"{len(single) / single_s:>12,.0f} {len(single) / single_s / base_single:>6.2f} {stats['round_trip_ms']:>7.2f}")
+        finally:
+            router.stop()
+
+if __name__ == "__main__":
+    main()
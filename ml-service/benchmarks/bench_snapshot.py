@@ -0,0 +1,47 @@
+# ml-service/benchmarks/bench_snapshot.py
+"""
+snapshot_for_vendor latency for one vendor while the number of *other* vendors grows.
+With the per-vendor index the latency should stay flat from 1k to 100k other vendors.
+
+    python -m benchmarks.bench_snapshot [--sizes 1000,10000,100000] [--target-events 200]
+"""
+import argparse
+import random
+
+from benchmarks.common import make_population, make_vendor_events, timeit
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def legacy_snapshot(dawg, vendor_id):
+    # the pre-index full scan, timed at the smallest size (tests/test_graph_builder.py checks parity)
+    nodes = []
+    edges = []
+    for n, data in dawg.G.nodes(data=True):
+        if data.get("vendorId") == vendor_id:
+            nodes.append({"id": str(n), "label": data.get("label"), "timestamp": data.get("timestamp")})
+    for u, v, data in dawg.G.edges(data=True):
+        if u in [n['id'] for n in nodes] and v in [n['id'] for n in nodes]:
+            edges.append({"from": str(u), "to": str(v), "weight": float(data.get("weight", 0.0)), "count": int(data.get("count", 1))})
+    return {"nodes": sorted(nodes, key=lambda x: x.get("timestamp")), "edges": edges}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--events-per-vendor", type=int, default=3)
+    ap.add_argument("--target-events", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    target = make_vendor_events("target", args.target_events, random.Random(1))
+    print(f"{'other vendors':>14} {'graph nodes':>12} {'best ms':>9} {'median ms':>10} {'legacy ms':>10}")
+    for i, size in enumerate(int(s) for s in args.sizes.split(",")):
+        dawg = DynamicAdaptiveWeightedGraph()
+        dawg.add_events_bulk(make_population(size, args.events_per_vendor))
+        dawg.add_events_bulk(target)
+        best, median = timeit(lambda: dawg.snapshot_for_vendor("target"), args.repeat)
+        legacy = ""
+        if i == 0:
+            legacy = f"{timeit(lambda: legacy_snapshot(dawg, 'target'), 3)[1] * 1e3:10.2f}"
+        print(f"{size:>14} {dawg.G.number_of_nodes():>12} {best * 1e3:9.3f} {median * 1e3:10.3f} {legacy:>10}")
+
+if __name__ == "__main__":
+    main()
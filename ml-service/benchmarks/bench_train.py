@@ -0,0 +1,86 @@
+# ml-service/benchmarks/bench_train.py
+"""
+Training pipeline timings: the previous trainer (Python-loop synthetic rows, two splits, forests
+fitted one after the other with n_jobs=None) versus train_and_save_models, plus the Mongo-history
+feature stage (histories read from a mongomock collection, featurized in the process pool) at
+1 worker and at every core.
+Models are written to a temporary MODEL_DIR.
+
+    python -m benchmarks.bench_train [--rows 20000] [--vendors 2000] [--events-per-vendor 30]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ["MODEL_DIR"] = tempfile.mkdtemp(prefix="bench-train-")
+from benchmarks.common import make_population
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from feature_extractor import features_to_vector
+import train_model
+
+def legacy_synthesize(n):
+    # the previous per-row loop
+    X, y_engage, y_risk = [], [], []
+    for _ in range(n):
+        n_events = random.choice([1, 2, 3, 4, 5, 6, 7, 8, 10])
+        avg_wait = max(1.0, random.expovariate(1 / 300.0)) * (5.0 if n_events <= 2 else 1.0)
+        unique_actions = min(n_events, random.randint(1, 4))
+        feats = {"n_events": n_events, "avg_wait": avg_wait, "median_wait": avg_wait * (0.9 + random.random() * 0.4),
+                 "std_wait": avg_wait * 0.3 * random.random(), "unique_actions": unique_actions,
+                 "edge_count": n_events - 1, "avg_edge_count": 1 + random.random() * 2,
+                 "last_event_age": random.random() * 86400}
+        X.append(features_to_vector(feats))
+        y_engage.append(1 if (n_events >= 3 and avg_wait < 1800) else 0)
+        y_risk.append(min(1.0, max(0.0, (avg_wait / 3600.0) * 0.5 + (1.0 if unique_actions <= 1 else 0.0) * 0.3 + random.random() * 0.2)))
+    return np.vstack(X), np.array(y_engage), np.array(y_risk)
+
+def legacy_train(n):
+    t0 = time.perf_counter()
+    X, y_engage, y_risk = legacy_synthesize(n)
+    features_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    X_train, _, y_train, _ = train_test_split(X, y_engage, test_size=0.2, random_state=42)
+    RandomForestClassifier(n_estimators=100, random_state=42).fit(X_train, y_train)
+    X_train_r, _, y_train_r, _ = train_test_split(X, y_risk, test_size=0.2, random_state=42)
+    RandomForestRegressor(n_estimators=100, random_state=42).fit(X_train_r, y_train_r)
+    return features_s, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--vendors", type=int, default=2000)
+    ap.add_argument("--events-per-vendor", type=int, default=30)
+    args = ap.parse_args()
+    cores = os.cpu_count() or 1
+
+    legacy_features_s, legacy_fit_s = legacy_train(args.rows)
+    report = {}
+    train_model.train_and_save_models(n=args.rows, report=report)
+    st = report["stages"]
+    print(f"synthetic rows={args.rows} cores={cores}")
+    print(f"features  legacy {legacy_features_s:7.3f} s   now {st['features']['seconds']:7.3f} s  ({st['features']['rows_per_sec']:,.0f} rows/s)")
+    print(f"fit       legacy {legacy_fit_s:7.3f} s   now {st['fit']['seconds']:7.3f} s  "
+          f"(clf {st['fit']['clf_seconds']} s, reg {st['fit']['reg_seconds']} s side by side)")
+
+    import mongomock
+    events = mongomock.MongoClient().db.events
+    events.insert_many([{k: v for k, v in e.items() if k != "_id"}
+                        for e in make_population(args.vendors, args.events_per_vendor)])
+    t0 = time.perf_counter()
+    histories = list(train_model.iter_vendor_histories(events))
+    read_s = time.perf_counter() - t0
+    print(f"mongo history features: vendors={args.vendors} events={args.vendors * args.events_per_vendor} "
+          f"(streaming from mongomock: {read_s:.2f} s, not representative of an indexed mongod)")
+    for workers in sorted({1, cores}):
+        t0 = time.perf_counter()
+        X = train_model.featurize_histories(histories, workers=workers)
+        elapsed = time.perf_counter() - t0
+        note = "pool start-up included" if workers > 1 else "in-process"
+        print(f"  featurize workers={workers:<3} {elapsed:7.3f} s  ({len(X) / elapsed:,.0f} vendors/s, {note})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# ml-service/benchmarks/common.py
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+# make the flat ml-service modules importable when run as `python -m benchmarks.<name>`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EVENT_TYPES = ["send", "open", "view", "fill", "sign"]
+BASE_TIME = datetime(2024, 1, 1)
+
+def make_vendor_events(vendor_id, n, rng, start=BASE_TIME, id_prefix=None):
+    """
+    Build n time-ordered events for one vendor in the shape the DAWG consumes.
+    """
+    prefix = id_prefix or vendor_id
+    ts = start
+    events = []
+    for i in range(n):
+        ts = ts + timedelta(seconds=rng.expovariate(1 / 300.0))
+        events.append({
+            "_id": f"{prefix}-{i}",
+            "vendorId": vendor_id,
+            "eventType": rng.choice(EVENT_TYPES),
+            "timestamp": ts.isoformat(),
+        })
+    return events
+
+def make_population(n_vendors, events_per_vendor, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for v in range(n_vendors):
+        events.extend(make_vendor_events(f"v{v}", events_per_vendor, rng))
+    return events
+
+def zipf_weights(n, s=1.1):
+    w = [1.0 / (k + 1) ** s for k in range(n)]
+    total = sum(w)
+    return [x / total for x in w]
+
+def make_zipf_population(n_vendors, n_events, s=1.1, seed=0, prefix="z", start=BASE_TIME, span_days=30):
+    """
+    A realistic vendor population: vendor k (0 = hottest) gets a share of n_events proportional to
+    1/(k+1)^s, so a few hot vendors have long histories and most have a handful of events. Events
+    are spread uniformly over `span_days` and returned interleaved in global time order, as a live
+    stream would deliver them. Same seed, same population.
+    """
+    rng = random.Random(seed)
+    weights = zipf_weights(n_vendors, s)
+    counts = [0] * n_vendors
+    for k in rng.choices(range(n_vendors), weights=weights, k=n_events):
+        counts[k] += 1
+    span = span_days * 86400.0
+    events = []
+    for k, n in enumerate(counts):
+        offsets = sorted(rng.random() * span for _ in range(n))
+        vid = f"{prefix}{k}"
+        for i, off in enumerate(offsets):
+            events.append({"_id": f"{vid}-{i}", "vendorId": vid, "eventType": rng.choice(EVENT_TYPES),
+                           "timestamp": (start + timedelta(seconds=off)).isoformat()})
+    events.sort(key=lambda e: e["timestamp"])
+    return events
+
+class ZipfVendorPicker:
+    """
+    Draws vendor ids with Zipf-distributed popularity for load drivers (seeded, so runs repeat).
+    """
+    def __init__(self, vendor_ids, s=1.1, seed=0):
+        self.vendor_ids = list(vendor_ids)
+        self.cum = []
+        acc = 0.0
+        for w in zipf_weights(len(self.vendor_ids), s):
+            acc += w
+            self.cum.append(acc)
+        self.rng = random.Random(seed)
+
+    def __call__(self):
+        return self.rng.choices(self.vendor_ids, cum_weights=self.cum)[0]
+
+def percentiles(samples, qs=(0.5, 0.95, 0.99)):
+    """
+    {"p50": ms, "p95": ms, "p99": ms} of samples in seconds.
+    """
+    if not samples:
+        return {f"p{int(q * 100)}": None for q in qs}
+    s = sorted(samples)
+    return {f"p{int(q * 100)}": round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 4) for q in qs}
+
+def peak_rss_mb():
+    # high-water resident set of this process (ru_maxrss is KiB on Linux, bytes on macOS)
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+def run_info(params):
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = None
+    return {"git": rev or None, "python": platform.python_version(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "time": datetime.utcnow().isoformat(), "params": params}
+
+def write_results(path, suite, params, results):
+    """
+    Write {suite, info, results} as JSON for benchmarks.compare; results is a list of
+    {"name": ..., metric: value, ...} dicts. No-op without a path.
+    """
+    if not path:
+        return
+    with open(path, "w") as f:
+        json.dump({"suite": suite, "info": run_info(params), "results": results}, f, indent=2)
+    print(f"results written to {path}")
+
+def sample(fn, repeat=50, warmup=3):
+    """
+    Per-call wall times in seconds of `repeat` calls, after `warmup` untimed ones.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+def timeit(fn, repeat=50):
+    """
+    Returns (best, median) seconds per call over `repeat` calls.
+    """
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[0], samples[len(samples) // 2]
+
+def snapshot_from_events(events, edge_count=1):
+    """
+    Snapshot dict in the shape DAWG.snapshot_for_vendor returns, for a time-ordered event list.
+    """
+    nodes = [{"id": e["_id"], "label": e["eventType"], "timestamp": e["timestamp"]} for e in events]
+    edges = [{"from": a["id"], "to": b["id"], "weight": 0.0, "count": edge_count} for a, b in zip(nodes, nodes[1:])]
+    return {"nodes": nodes, "edges": edges}
+
+def fit_demo_models(n=2000, n_estimators=100):
+    """
+    Fit both forests on the synthetic trainer's data in memory (nothing written to MODEL_DIR).
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from train_model import synthesize_training_data
+    X, y_engage, y_risk = synthesize_training_data(n, seed=0)
+    clf = RandomForestClassifier(n_estimators=n_estimators, random_state=42).fit(X, y_engage)
+    reg = RandomForestRegressor(n_estimators=n_estimators, random_state=42).fit(X, y_risk)
+    return clf, reg
@@ -0,0 +1,71 @@
+# ml-service/benchmarks/compare.py
+"""
+Compare two result files written with --out by bench_micro / bench_load (same suite) and flag
+regressions: a throughput metric that dropped, or a latency / memory / duration metric that grew,
+by more than --threshold (relative). Exits 1 when anything regressed, so it can gate CI.
+
+    python -m benchmarks.compare base.json new.json [--threshold 0.10] [--min-ms 0.05]
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("ops_per_sec", "req_per_sec")
+LOWER_IS_BETTER = ("p50", "p95", "p99", "peak_rss_mb", "startup_seconds", "ready_seconds", "import_seconds",
+                   "train_job_seconds")
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data, {r["name"]: r for r in data["results"]}
+
+def compare(base, new, threshold, min_ms):
+    """
+    [(case, metric, base, new, relative change, regressed)] for every metric in both files.
+    Latencies below min_ms in both runs are reported but never flagged (timer noise).
+    """
+    rows = []
+    for name, b in base.items():
+        n = new.get(name)
+        if n is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            bv, nv = b.get(metric), n.get(metric)
+            if bv is None or nv is None or bv == 0:
+                continue
+            change = (nv - bv) / bv
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            noise = metric.startswith("p") and metric[1:].isdigit() and max(bv, nv) < min_ms
+            rows.append((name, metric, bv, nv, change, worse > threshold and not noise))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    ap.add_argument("--min-ms", type=float, default=0.05)
+    args = ap.parse_args()
+
+    base_data, base = load(args.base)
+    new_data, new = load(args.new)
+    if base_data["suite"] != new_data["suite"]:
+        sys.exit(f"different suites: {base_data['suite']} vs {new_data['suite']}")
+    print(f"{base_data['suite']}: {base_data['info'].get('git')} -> {new_data['info'].get('git')} "
+          f"(threshold {args.threshold:.0%})")
+    params = [{k: v for k, v in (d["info"].get("params") or {}).items() if k != "out"} for d in (base_data, new_data)]
+    if params[0] != params[1]:
+        print("warning: the runs used different parameters")
+    rows = compare(base, new, args.threshold, args.min_ms)
+    print(f"{'case':<40} {'metric':>16} {'base':>12} {'new':>12} {'change':>8}")
+    for name, metric, bv, nv, change, regressed in rows:
+        print(f"{name:<40} {metric:>16} {bv:>12.4g} {nv:>12.4g} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    missing = sorted(set(base) - set(new))
+    if missing:
+        print("missing from new run:", ", ".join(missing))
+    regressions = sum(r[-1] for r in rows)
+    print(f"{regressions} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
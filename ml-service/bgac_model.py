@@ -1,76 +1,124 @@
 # ml-service/bgac_model.py
-from feature_extractor import extract_features_from_snapshot, features_to_vector
-from model_store import load_models
-import numpy as np
+from model_store import ModelRegistry
+from metrics import METRICS
+from startup import LAZY_START
+import os
 
-# Load models once if available
-clf, reg = load_models()
+# Active models; the registry's watcher (started by the app) swaps in newly published versions
+REGISTRY = ModelRegistry()
+if not LAZY_START:
+    REGISTRY.load()  # otherwise the app's warm-up (or the first score) loads them
 
-def score_graph_snapshot_ml(snapshot):
+# batches up to this many rows go through FlatForest; above it sklearn's compiled traversal is
+# faster (crossover ~400-500 rows for 100 trees on one core, see benchmarks/bench_flat_forest.py)
+FLAT_MAX_BATCH = int(os.getenv("FLAT_MAX_BATCH", 256))
+
+def predict_models(X):
+    """
+    (engagement_prob, risk_score) arrays from the active models, or None if none are loaded.
+    """
+    REGISTRY.ensure_loaded()
+    m = REGISTRY.active  # one read, so every model comes from the same version
+    if m.flat_clf is not None and m.flat_reg is not None and (len(X) <= FLAT_MAX_BATCH or m.clf is None or m.reg is None):
+        clf, reg = m.flat_clf, m.flat_reg
+    elif m.clf is not None and m.reg is not None:
+        clf, reg = m.clf, m.reg
+    else:
+        return None
+    with METRICS.span("model_engagement"):
+        engage_prob = clf.predict_proba(X)[:, 1].astype(float)
+    with METRICS.span("model_risk"):
+        risk_score = reg.predict(X).astype(float)
+    return engage_prob, risk_score
+
+def score_graph_snapshot_ml(snapshot, features=None):
     """
     Use trained models if available, otherwise fallback to heuristic.
     Returns dict with engagement probability, risk score, legacy fields.
+    features: optional precomputed feature dict (e.g. DAWG.vendor_features); the snapshot is then
+    only read for prev_engagement_prob / delay_seconds.
+    """
+    return score_graph_snapshots_ml([snapshot], None if features is None else [features])[0]
+
+def score_graph_snapshots_ml(snapshots, features=None):
+    """
+    Batch version of score_graph_snapshot_ml: one (N, 8) feature matrix, one call per model,
+    results in input order. The single-snapshot path goes through here, so both agree exactly.
     """
+    if not snapshots:
+        return []
+    # numpy and the extractor are imported on the first score (the warm-up's "scorer" step), not with the app
+    import numpy as np
+    from decay import CONFIDENCE_RATE, factors
+    from feature_extractor import FEATURE_ORDER, extract_features_batch, features_from_matrix, features_to_vector
 
     # ---- Feature extraction ----
-    feats = extract_features_from_snapshot(snapshot)
-    vec = features_to_vector(feats).reshape(1, -1)
+    # features[i] (if given and not None) replaces extraction for snapshots[i]
+    with METRICS.span("extract_features"):
+        if features is None:
+            X = extract_features_batch(snapshots)
+        else:
+            missing = [i for i, f in enumerate(features) if f is None]
+            X = np.zeros((len(snapshots), len(FEATURE_ORDER)))
+            if missing:
+                X[missing] = extract_features_batch([snapshots[i] for i in missing])
+            for i, f in enumerate(features):
+                if f is not None:
+                    X[i] = features_to_vector(f)
 
     # ---- Base prediction from ML or fallback ----
-    if clf is not None and reg is not None:
-        try:
-            engage_prob = float(clf.predict_proba(vec)[:, 1][0])
-            risk_score = float(reg.predict(vec)[0])
-        except Exception:
-            engage_prob = 0.5
-            risk_score = 0.5
+    try:
+        predicted = predict_models(X)
+    except Exception:
+        predicted = (np.full(len(X), 0.5), np.full(len(X), 0.5))
+    if predicted is not None:
+        engage_prob, risk_score = predicted
     else:
         # Simple heuristic fallback
-        avg_wait = feats.get("avg_wait", 0.0)
-        n_events = feats.get("n_events", 0)
+        avg_wait = X[:, 1]
+        n_events = X[:, 0]
         normalized_wait = 1.0 - (1.0 / (1.0 + avg_wait / 3600.0))
 
-        engage_prob = max(0.0, min(1.0, 1.0 - normalized_wait * 0.9 + (n_events * 0.02)))
-        risk_score = max(0.0, min(1.0, normalized_wait * 0.8 - (n_events * 0.015)))
+        engage_prob = np.clip(1.0 - normalized_wait * 0.9 + (n_events * 0.02), 0.0, 1.0)
+        risk_score = np.clip(normalized_wait * 0.8 - (n_events * 0.015), 0.0, 1.0)
 
     # ============================================================
     # ✅ Bayesian Update + Confidence Decay Module
     # ============================================================
 
     # previous belief provided by backend (or default to current estimate)
-    prev_prob = float(snapshot.get("prev_engagement_prob", engage_prob))
+    prev_prob = np.array([float(s.get("prev_engagement_prob", p)) for s, p in zip(snapshots, engage_prob.tolist())])
 
     # time delay between actions (in seconds) passed from backend
-    delay = float(snapshot.get("delay_seconds", 0.0))
+    delay = np.array([float(s.get("delay_seconds", 0.0)) for s in snapshots])
 
     # Bayesian trust factor for historical signal
     decay_strength = 0.85  # tune 0.7–0.95
 
     # confidence decay over time (half-life ~2 hours)
-    decay_factor = np.exp(-delay / 7200.0) if delay > 0 else 1.0
+    decay_factor = factors(delay, CONFIDENCE_RATE)
 
     # Updated posterior belief
     updated_prob = (prev_prob * decay_strength * decay_factor) + (engage_prob * (1 - decay_strength))
-    updated_prob = float(max(0, min(1, updated_prob)))
+    updated_prob = np.clip(updated_prob, 0, 1)
 
     # replace engagement prob with Bayesian updated value
     engage_prob = updated_prob
 
     # Risk is opposite of engagement probability
-    risk_score = float(max(0, min(1, 1.0 - engage_prob)))
+    risk_score = np.clip(1.0 - engage_prob, 0, 1)
 
     # ============================================================
 
     # ---- Compatibility Mapping for UI ----
-    compliant = round(float(engage_prob), 4)
-    anomaly = round(float(risk_score), 4)
-    churn = round(max(0.0, min(1.0, 1.0 - engage_prob)), 4)
-
-    return {
-        "features": feats,
-        "engagement_prob": engage_prob,
-        "risk_score": risk_score,
-        "compliant": compliant,
-        "anomaly": anomaly,
-        "churn-risk": churn
-    }
+    results = []
+    for feats, p, r in zip(features_from_matrix(X), engage_prob.tolist(), risk_score.tolist()):
+        results.append({
+            "features": feats,
+            "engagement_prob": p,
+            "risk_score": r,
+            "compliant": round(float(p), 4),
+            "anomaly": round(float(r), 4),
+            "churn-risk": round(max(0.0, min(1.0, 1.0 - p)), 4)
+        })
+    return results
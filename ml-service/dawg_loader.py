@@ -0,0 +1,121 @@
+# ml-service/dawg_loader.py
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from itertools import islice
+from bson import ObjectId
+
+EVENT_FIELDS = {"_id": 1, "vendorId": 1, "eventType": 1, "timestamp": 1}
+
+def replay_filter(high_water_id, margin_seconds=60):
+    """
+    Mongo filter for events newer than a checkpoint's high-water _id. ObjectIds are generated
+    client-side, so we go back `margin_seconds` and let the DAWG skip events it already has.
+    """
+    if not high_water_id or not ObjectId.is_valid(high_water_id):
+        return {}
+    since = ObjectId(high_water_id).generation_time - timedelta(seconds=margin_seconds)
+    return {"_id": {"$gte": ObjectId.from_datetime(since)}}
+
+def normalize_event(d, vendor_id=None):
+    return {"_id": str(d.get("_id")), "vendorId": vendor_id or d.get("vendorId"),
+            "eventType": d.get("eventType"), "timestamp": d.get("timestamp")}
+
+class DawgWarmup:
+    """
+    Streams the events collection into a DAWG in bounded batches on a background thread,
+    so the service can take traffic while history loads. Vendors requested before the
+    warm-up reaches them are loaded on demand with ensure_vendor().
+    """
+    def __init__(self, dawg, collection, batch_size=5000, limit=0, query=None):
+        self.dawg = dawg
+        self.collection = collection
+        self.query = query or {}  # e.g. replay_filter(...) after restoring a checkpoint
+        self.batch_size = max(1, int(batch_size))
+        self.limit = int(limit or 0)  # 0 = whole collection
+        self.on_demand = set()  # vendors fully loaded ahead of the warm-up
+        self._on_demand_lock = threading.Lock()
+        self._thread = None
+        self.status = {"state": "idle", "loaded": 0, "batches": 0, "elapsed": 0.0,
+                       "events_per_sec": 0.0, "on_demand_vendors": 0, "error": None}
+
+    @property
+    def done(self):
+        return self.status["state"] == "done"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="dawg-warmup", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def run(self):
+        self.status["state"] = "running"
+        t0 = time.perf_counter()
+        try:
+            cursor = self.collection.find(self.query, EVENT_FIELDS).sort("timestamp", 1).batch_size(self.batch_size)
+            if self.limit:
+                cursor = cursor.limit(self.limit)
+            while True:
+                batch = [normalize_event(d) for d in islice(cursor, self.batch_size)]
+                if not batch:
+                    break
+                with self.dawg.lock:
+                    # cursor is already in timestamp order, so no re-sort
+                    self.dawg.add_events_bulk(batch, presorted=True)
+                elapsed = time.perf_counter() - t0
+                self.status.update(loaded=self.status["loaded"] + len(batch), batches=self.status["batches"] + 1,
+                                   elapsed=round(elapsed, 3),
+                                   events_per_sec=round((self.status["loaded"] + len(batch)) / elapsed, 1) if elapsed else 0.0)
+                print(f"DAWG warm-up: {self.status['loaded']} events ({self.status['events_per_sec']} ev/s)")
+            self.status["state"] = "done"
+            print("DAWG initialized from DB with", self.status["loaded"], "events in", self.status["elapsed"], "s")
+        except Exception as e:
+            self.status.update(state="error", error=str(e))
+            print("DAWG init error:", e)
+
+    def has_vendor(self, vendor_id):
+        """
+        True when vendor_id's history is known to be in the DAWG (ensure_vendor would not load).
+        """
+        return self.done or vendor_id in self.on_demand
+
+    def ensure_vendor(self, vendor_id):
+        """
+        Make sure vendor_id's full history is in the DAWG, loading it from Mongo if the
+        warm-up has not finished. Returns True if a load was performed.
+        """
+        if self.has_vendor(vendor_id):
+            return False
+        with self._on_demand_lock:
+            if vendor_id in self.on_demand:
+                return False
+            load_vendor(self.dawg, self.collection, vendor_id)
+            self.on_demand.add(vendor_id)
+            self.status["on_demand_vendors"] = len(self.on_demand)
+        return True
+
+def load_vendor(dawg, collection, vendor_id):
+    """
+    Load one vendor's events from Mongo into the DAWG (already-known events are skipped).
+    """
+    docs = collection.find({"vendorId": vendor_id}, {"_id": 1, "eventType": 1, "timestamp": 1}).sort("timestamp", 1)
+    normalized = [normalize_event(d, vendor_id) for d in docs]
+    with dawg.lock:
+        dawg.add_events_bulk(normalized, presorted=True)
+    return len(normalized)
+
+async def load_vendor_async(dawg, collection, vendor_id):
+    """
+    load_vendor() over an async collection.
+    """
+    cursor = collection.find({"vendorId": vendor_id}, {"_id": 1, "eventType": 1, "timestamp": 1}).sort("timestamp", 1)
+    normalized = [normalize_event(d, vendor_id) for d in await cursor.to_list(None)]
+
+    def apply():
+        with dawg.lock:
+            dawg.add_events_bulk(normalized, presorted=True)
+    # dawg.lock is a blocking lock: wait for it on a worker thread, not on the event loop
+    await asyncio.to_thread(apply)
+    return len(normalized)
@@ -0,0 +1,94 @@
+# ml-service/decay.py
+import math
+import numpy as np
+
+# Every time decay in the services is exp(-rate * seconds) with the rate precomputed here, so
+# no call site needs pow() or its own constants.
+
+def rate_from_factor(per_second):
+    """
+    Rate for "multiply by `per_second` every second" (e.g. 0.99 -> 1% per second).
+    """
+    return -math.log(per_second)
+
+def rate_from_time_constant(seconds):
+    return 1.0 / seconds
+
+ENGAGEMENT_RATE = rate_from_factor(0.99)         # server.py engagement: x0.99 per second
+CONFIDENCE_RATE = rate_from_time_constant(7200)  # bgac_model.py Bayesian prior: exp(-delay / 2h)
+BAYES_CONFIDENCE_RATE = 0.01                     # bayes_model.confidence_decay default
+
+def factor(seconds, rate):
+    """
+    Decay multiplier after `seconds` (negative elapsed time counts as zero).
+    """
+    return math.exp(-rate * seconds) if seconds > 0 else 1.0
+
+def factors(seconds, rate):
+    """
+    Vectorized factor() over an array of elapsed times.
+    """
+    return np.exp(-rate * np.maximum(np.asarray(seconds, dtype=np.float64), 0.0))
+
+def decayed(value, last_ts, now, rate):
+    return value * factor(now - last_ts, rate)
+
+class DecayedScores:
+    """
+    Columnar (value, last_update_ts) per key for a decaying score such as vendor engagement.
+    Values are only written when an event changes them; the current value is computed at read
+    time, for one key (get) or all keys in one NumPy call (current, top).
+    """
+    def __init__(self, rate, capacity=1024):
+        self.rate = rate
+        self.keys = []
+        self.index = {}
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.last_ts = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, key):
+        row = self.index.get(key)
+        if row is None:
+            row = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            if row >= len(self.values):
+                self.values = np.resize(self.values, 2 * len(self.values))
+                self.last_ts = np.resize(self.last_ts, 2 * len(self.last_ts))
+        return row
+
+    def set(self, key, value, ts):
+        row = self._row(key)
+        self.values[row] = value
+        self.last_ts[row] = ts
+
+    def set_many(self, keys, values, ts):
+        for key, value, t in zip(keys, values, ts):
+            self.set(key, value, t)
+
+    def get(self, key, now):
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return decayed(float(self.values[row]), float(self.last_ts[row]), now, self.rate)
+
+    def current(self, now):
+        """
+        Decayed value of every key at `now`, in insertion order of the keys.
+        """
+        n = len(self.keys)
+        return self.values[:n] * factors(now - self.last_ts[:n], self.rate)
+
+    def top(self, n, now):
+        """
+        The n highest current values as [(key, value)], highest first.
+        """
+        cur = self.current(now)
+        n = min(n, len(cur))
+        if n <= 0:
+            return []
+        idx = np.argpartition(-cur, n - 1)[:n] if n < len(cur) else np.arange(len(cur))
+        idx = idx[np.argsort(-cur[idx], kind="stable")]
+        return [(self.keys[i], float(cur[i])) for i in idx.tolist()]
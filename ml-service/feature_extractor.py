@@ -1,63 +1,178 @@
 # ml-service/feature_extractor.py
+import warnings
 import numpy as np
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+FEATURE_ORDER = ["n_events","avg_wait","median_wait","std_wait","unique_actions","edge_count","avg_edge_count","last_event_age"]
+INT_FEATURES = ("n_events", "unique_actions", "edge_count")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+def _iso_to_us(ts):
+    # epoch microseconds as an exact int, so diffs match timedelta.total_seconds()
+    dt = ts if isinstance(ts, datetime) else datetime.fromisoformat(ts)
+    if dt.tzinfo is None:
+        return (dt - _EPOCH) // _US
+    return (dt - _EPOCH_UTC) // _US
+
+def _parse_iso_us(values):
+    """
+    ISO strings -> int64 epoch microseconds. NumPy's C parser handles the naive timestamps the
+    service writes; anything it rejects or would reinterpret (tz offsets) goes through fromisoformat.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            return np.array(values, dtype="datetime64[us]").astype(np.int64)
+    except (ValueError, TypeError, UserWarning, DeprecationWarning):
+        pass
+    # JavaScript's toISOString / Mongo dates ("...T12:00:00.000Z") are UTC; without the Z they
+    # are naive timestamps, which the C parser takes and which are also treated as UTC
+    if values and all(isinstance(v, str) and v.endswith("Z") for v in values):
+        try:
+            return _parse_iso_us([v[:-1] for v in values])
+        except (ValueError, TypeError):
+            pass
+    return np.fromiter((_iso_to_us(v) for v in values), dtype=np.int64, count=len(values))
+
+def _snapshot_arrays(snapshot, label_codes):
+    """
+    (timestamps in epoch microseconds, label codes, edge counts) for one snapshot.
+    Fast path: columnar snapshots ({"timestamps": epoch seconds, "labels": int codes, "edge_counts"})
+    or nodes whose timestamps are already numeric. Legacy payloads with ISO strings are parsed.
+    """
+    if "timestamps" in snapshot:
+        ts = np.rint(np.asarray(snapshot["timestamps"], dtype=np.float64) * 1e6).astype(np.int64)
+        labels = np.asarray(snapshot.get("labels", np.zeros(len(ts))), dtype=np.int64)
+        edge_counts = np.asarray(snapshot.get("edge_counts", ()), dtype=float)
+        return ts, labels, edge_counts
+
+    nodes = snapshot.get("nodes", [])
+    edges = snapshot.get("edges", [])
+    n = len(nodes)
+    if n and isinstance(nodes[0].get("timestamp"), (int, float)):
+        ts = np.rint(np.fromiter((x["timestamp"] for x in nodes), dtype=np.float64, count=n) * 1e6).astype(np.int64)
+    else:
+        ts = _parse_iso_us([x["timestamp"] for x in nodes])
+    labels = np.fromiter((label_codes.setdefault(x.get("label"), len(label_codes)) for x in nodes), dtype=np.int64, count=n)
+    edge_counts = np.fromiter((e.get("count", 1) for e in edges), dtype=float, count=len(edges))
+    return ts, labels, edge_counts
+
+def snapshot_from_events(events):
+    """
+    Columnar snapshot for a raw event list as the backend sends it ([{eventType, timestamp}],
+    timestamps ISO strings or epoch seconds), without going through the DAWG: events in time
+    order, one count-1 edge between consecutive events. Events without a timestamp are skipped.
+    """
+    events = [e for e in events if e.get("timestamp") is not None]
+    n = len(events)
+    stamps = [e["timestamp"] for e in events]
+    if n and all(isinstance(t, (int, float)) for t in stamps):
+        ts = np.rint(np.asarray(stamps, dtype=np.float64) * 1e6).astype(np.int64)
+    else:
+        ts = _parse_iso_us(stamps)
+    label_codes = {}
+    labels = np.fromiter((label_codes.setdefault(e.get("eventType", e.get("label")), len(label_codes)) for e in events),
+                         dtype=np.int64, count=n)
+    if n > 1 and (np.diff(ts) < 0).any():
+        order = np.argsort(ts, kind="stable")
+        ts, labels = ts[order], labels[order]
+    return {"timestamps": ts / 1e6, "labels": labels, "edge_counts": np.ones(max(n - 1, 0))}
 
 def extract_features_from_snapshot(snapshot):
     """
     snapshot: {"nodes":[{id,label,timestamp}], "edges":[{from,to,weight,count}]}
+              or columnar {"timestamps": [...epoch s], "labels": [...codes], "edge_counts": [...]}
     returns: dict of features
     """
-    nodes = snapshot.get("nodes", [])
-    edges = snapshot.get("edges", [])
+    return features_from_matrix(extract_features_batch([snapshot]))[0]
+
+def extract_features_batch(snapshots):
+    """
+    Features for many snapshots at once. Returns an (N, len(FEATURE_ORDER)) float matrix.
+    All snapshots' timestamps are concatenated; one np.diff gives every inter-event wait and the
+    per-snapshot statistics are segment reductions (bincount / lexsort), with no per-node arithmetic.
+    """
+    N = len(snapshots)
+    X = np.zeros((N, len(FEATURE_ORDER)), dtype=float)
+    if N == 0:
+        return X
+    label_codes = {}
+    parts = [_snapshot_arrays(s, label_codes) for s in snapshots]
+    n_nodes = np.fromiter((len(p[0]) for p in parts), dtype=np.int64, count=N)
+    n_edges = np.fromiter((len(p[2]) for p in parts), dtype=np.int64, count=N)
+    ts = np.concatenate([p[0] for p in parts])
+    labels = np.concatenate([p[1] for p in parts])
+    edge_counts = np.concatenate([p[2] for p in parts])
+    seg = np.repeat(np.arange(N), n_nodes)
+
+    # inter-event diffs inside each snapshot (drop the diffs that straddle two snapshots)
+    within = seg[1:] == seg[:-1]
+    diffs = np.diff(ts)[within] / 1e6
+    dseg = seg[1:][within]
+    n_diffs = np.bincount(dseg, minlength=N)
+    # snapshots with a single node use diffs = [0.0], which zeroes all three wait features
+    denom = np.maximum(n_diffs, 1)
+    avg_wait = np.bincount(dseg, weights=diffs, minlength=N) / denom
+    dev = diffs - avg_wait[dseg]
+    std_wait = np.sqrt(np.bincount(dseg, weights=dev * dev, minlength=N) / denom)
+    median_wait = np.zeros(N)
+    if len(diffs):
+        # sort diffs within each snapshot, then average the two middle elements (same as np.median);
+        # dseg is already non-decreasing, so a stable sort by value then by segment groups them
+        if N == 1:
+            sorted_diffs = np.sort(diffs)
+        else:
+            by_value = np.argsort(diffs, kind="stable")
+            sorted_diffs = diffs[by_value[np.argsort(dseg[by_value], kind="stable")]]
+        m = n_diffs > 0
+        starts = (np.cumsum(n_diffs) - n_diffs)[m]
+        median_wait[m] = (sorted_diffs[starts + (n_diffs[m] - 1) // 2] + sorted_diffs[starts + n_diffs[m] // 2]) / 2
 
-    n_events = len(nodes)
-    if n_events == 0:
-        return {
-            "n_events": 0,
-            "avg_wait": 0.0,
-            "median_wait": 0.0,
-            "std_wait": 0.0,
-            "unique_actions": 0,
-            "edge_count": 0,
-            "avg_edge_count": 0.0,
-            "last_event_age": 0.0
-        }
-
-    # compute inter-event times (some edges may not be contiguous; fallback to timestamp diffs)
-    ts = [datetime.fromisoformat(n["timestamp"]) for n in nodes]
-    diffs = []
-    for i in range(1, len(ts)):
-        diffs.append((ts[i] - ts[i-1]).total_seconds())
-    if not diffs:
-        diffs = [0.0]
-    avg_wait = float(np.mean(diffs))
-    median_wait = float(np.median(diffs))
-    std_wait = float(np.std(diffs))
-
-    unique_actions = len(set([n.get("label") for n in nodes]))
-    edge_count = len(edges)
-    # average edge 'count' (how many times transition occurred) - robust
-    avg_edge_count = float(np.mean([e.get("count",1) for e in edges])) if edges else 0.0
-
-    # age since last event in seconds
-    last_event_age = (datetime.utcnow() - ts[-1]).total_seconds()
-
-    feats = {
-        "n_events": n_events,
-        "avg_wait": avg_wait,
-        "median_wait": median_wait,
-        "std_wait": std_wait,
-        "unique_actions": unique_actions,
-        "edge_count": edge_count,
-        "avg_edge_count": avg_edge_count,
-        "last_event_age": last_event_age
-    }
-    return feats
+    # distinct labels per snapshot: unique (snapshot, label code) pairs
+    K = int(labels.max()) + 1 if len(labels) else 1
+    if N * K <= 1 << 22:
+        present = np.zeros(N * K, dtype=bool)
+        present[seg * K + labels] = True
+        unique_actions = present.reshape(N, K).sum(axis=1)
+    else:
+        unique_actions = np.bincount(np.unique(seg * K + labels) // K, minlength=N)
+
+    edge_seg = np.repeat(np.arange(N), n_edges)
+    avg_edge_count = np.bincount(edge_seg, weights=edge_counts, minlength=N) / np.maximum(n_edges, 1)
+
+    # age since last event in seconds (last node in each snapshot's order)
+    now_us = (datetime.utcnow() - _EPOCH) // _US
+    last_ts = ts[np.maximum(np.cumsum(n_nodes) - 1, 0)] if len(ts) else np.zeros(N, dtype=np.int64)
+    last_event_age = (now_us - last_ts) / 1e6
+
+    X[:, 0] = n_nodes
+    X[:, 1] = avg_wait
+    X[:, 2] = median_wait
+    X[:, 3] = std_wait
+    X[:, 4] = unique_actions
+    X[:, 5] = n_edges
+    X[:, 6] = avg_edge_count
+    X[:, 7] = last_event_age
+    X[n_nodes == 0] = 0.0
+    return X
+
+def features_from_matrix(X):
+    """
+    Inverse of features_to_vector for each row: list of feature dicts (count features as ints).
+    """
+    out = []
+    for row in X.tolist():
+        feats = dict(zip(FEATURE_ORDER, row))
+        for k in INT_FEATURES:
+            feats[k] = int(feats[k])
+        out.append(feats)
+    return out
 
 def features_to_vector(feats):
     """
     Convert dict to array (order is fixed). Returns numpy array shape (n_features,)
     """
-    order = ["n_events","avg_wait","median_wait","std_wait","unique_actions","edge_count","avg_edge_count","last_event_age"]
-    return np.array([feats.get(k,0.0) for k in order], dtype=float)
+    return np.array([feats.get(k,0.0) for k in FEATURE_ORDER], dtype=float)
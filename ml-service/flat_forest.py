@@ -0,0 +1,118 @@
+# ml-service/flat_forest.py
+"""
+RandomForest inference without sklearn: every tree of a fitted forest is flattened into shared
+contiguous node arrays and a batch of rows is pushed through all trees at once, one tree level
+per NumPy step.
+"""
+import numpy as np
+
+class FlatForest:
+    """
+    Node arrays for all trees of a forest, concatenated:
+        feature   (n_nodes,) int32    split feature; 0 for leaves
+        threshold (n_nodes,) float64  go left if x[feature] <= threshold; +inf for leaves
+        children  (n_nodes, 2) int32  global [left, right] index; leaves point at themselves
+        value     (n_nodes, k) float64 class fractions (classifier) or the mean (regressor)
+        roots     (n_trees,) int32
+    Leaves point at themselves, which is how traversal detects that a path has finished.
+    Exposes predict_proba / predict / classes_ like the sklearn estimator it came from, so it
+    can stand in for it. The attributes are plain arrays, so joblib.load(mmap_mode='r') maps them.
+    """
+    def __init__(self, feature, threshold, children, value, roots, depth, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.classes_ = classes
+        self.n_features_in_ = None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flatten a fitted RandomForestClassifier / RandomForestRegressor (single output).
+        """
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset, depth = 0, 0
+        is_clf = hasattr(model, "classes_")
+        for est in model.estimators_:
+            t = est.tree_
+            n = t.node_count
+            leaf = t.children_left == -1
+            idx = np.arange(offset, offset + n)
+            left = np.where(leaf, idx, t.children_left + offset)
+            right = np.where(leaf, idx, t.children_right + offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(np.where(leaf, np.inf, t.threshold))
+            children.append(np.stack([left, right], axis=1))
+            v = t.value[:, 0, :]
+            if is_clf:
+                # sklearn averages per-tree class fractions; older pickles hold raw counts
+                v = v / np.maximum(v.sum(axis=1, keepdims=True), 1e-300)
+            values.append(v)
+            roots.append(offset)
+            depth = max(depth, t.max_depth)
+            offset += n
+        flat = cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.int32),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            depth=depth,
+            classes=np.asarray(model.classes_) if is_clf else None,
+        )
+        flat.n_features_in_ = getattr(model, "n_features_in_", None)
+        return flat
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def leaves(self, X):
+        """
+        (n_rows, n_trees) leaf index reached by each row in each tree.
+        """
+        # sklearn compares float32 features against float64 thresholds; do the same for parity
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, n_features = X.shape
+        xs, children = X.ravel(), self.children.ravel()
+        # one (row, tree) pair per slot. Finished pairs just loop on their leaf; they are dropped
+        # once they make up more than 1/8 of the active set, so deep levels only touch paths
+        # that are still descending without paying for a compaction on every level
+        node = np.tile(self.roots, n)
+        base = np.repeat(np.arange(n, dtype=np.int64) * n_features, self.n_trees)
+        slot = np.arange(node.size)
+        out = np.empty(node.size, dtype=np.int32)
+        while True:
+            go_right = xs[base + self.feature[node]] > self.threshold[node]
+            nxt = children[2 * node + go_right]
+            done = nxt == node
+            n_done = np.count_nonzero(done)
+            if n_done == node.size:
+                out[slot] = node
+                break
+            if n_done * 8 > node.size:
+                out[slot[done]] = node[done]
+                keep = ~done
+                node, base, slot = nxt[keep], base[keep], slot[keep]
+            else:
+                node = nxt
+        return out.reshape(n, self.n_trees)
+
+    def _mean_value(self, X):
+        return self.value[self.leaves(X)].mean(axis=1)
+
+    def predict_proba(self, X):
+        return self._mean_value(X)
+
+    def predict(self, X):
+        out = self._mean_value(X)
+        if self.classes_ is not None:
+            return self.classes_[out.argmax(axis=1)]
+        return out[:, 0]
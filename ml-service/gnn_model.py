@@ -1,6 +1,22 @@
 import torch
 import torch.nn as nn
-from torch_geometric.nn import SAGEConv
+from torch_geometric.nn import GCNConv, SAGEConv
+
+class FraudGNN(torch.nn.Module):
+    """
+    server.py's online model: two GCN layers over a vendor's event chain, one score per event.
+    Input features are (event_type, engagement_score).
+    """
+    def __init__(self):
+        super(FraudGNN, self).__init__()
+        self.conv1 = GCNConv(2, 8)
+        self.conv2 = GCNConv(8, 1)
+
+    def forward(self, x, edge_index):
+        x = self.conv1(x, edge_index)
+        x = torch.relu(x)
+        x = self.conv2(x, edge_index)
+        return torch.sigmoid(x)
 
 class VendorGraphSAGE(nn.Module):
     def __init__(self, in_channels=4, hidden_channels=32):
@@ -10,8 +26,13 @@ class VendorGraphSAGE(nn.Module):
         self.lin = nn.Linear(hidden_channels, 1)
         self.sigmoid = nn.Sigmoid()
 
-    def forward(self, x, edge_index):
+    def embed(self, x, edge_index):
+        """
+        Per-node hidden_channels outputs of the two SAGE layers (vendor_embeddings.py pools them).
+        """
         x = self.conv1(x, edge_index).relu()
-        x = self.conv2(x, edge_index).relu()
-        x = self.lin(x)
+        return self.conv2(x, edge_index).relu()
+
+    def forward(self, x, edge_index):
+        x = self.lin(self.embed(x, edge_index))
         return self.sigmoid(x)
@@ -0,0 +1,118 @@
+# ml-service/gnn_tensors.py
+import torch
+from torch_geometric.data import Data
+
+class VendorTensorStore:
+    """
+    Per-vendor node features and path edges for gnn_model.FraudGNN, kept in preallocated torch
+    buffers that double in capacity and are appended in place (no per-event rebuild).
+
+    Column 1 of x (engagement) is the vendor's *current* engagement for every node, so it is not
+    stored; window() fills it in. Only the newest node's output is read, and on a path graph an
+    L-layer GCN's output at node n depends on nodes n-L..n plus the in-degree of n-L, i.e. on the
+    last L+2 nodes: window() runs the model over just those and matches the full-history result.
+    max_history > 0 keeps at most that many events per vendor (oldest dropped in halves).
+    """
+    def __init__(self, num_layers=2, initial_capacity=16, max_history=0):
+        self.receptive_field = num_layers + 2
+        self.initial_capacity = max(self.receptive_field, int(initial_capacity))
+        self.max_history = int(max_history or 0)
+        if self.max_history:
+            self.max_history = max(self.max_history, self.receptive_field)
+        self._x = {}       # vendorId -> float32 [capacity, 2] (event code, engagement placeholder)
+        self._edges = {}   # vendorId -> long [2, capacity] with column j = edge j -> j+1
+        self._n = {}       # vendorId -> number of stored events
+
+    def __len__(self):
+        return len(self._n)
+
+    def __contains__(self, vendor):
+        return vendor in self._n
+
+    def count(self, vendor):
+        return self._n.get(vendor, 0)
+
+    def history_lengths(self):
+        # stored events of every resident vendor
+        return list(self._n.values())
+
+    def _grow(self, vendor, need):
+        x = self._x.get(vendor)
+        cap = 0 if x is None else x.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(self.initial_capacity, cap * 2)
+        while new_cap < need:
+            new_cap *= 2
+        if self.max_history:
+            new_cap = min(new_cap, self.max_history)
+        nx = torch.zeros((new_cap, 2), dtype=torch.float32)
+        ar = torch.arange(new_cap, dtype=torch.long)
+        ne = torch.stack([ar, ar + 1])
+        if x is not None:
+            nx[:cap] = x
+        self._x[vendor], self._edges[vendor] = nx, ne
+
+    def append(self, vendor, event_code):
+        """
+        Add one event for the vendor. Returns the number of events stored for it.
+        """
+        n = self._n.get(vendor, 0)
+        if self.max_history and n >= self.max_history:
+            # drop the oldest half in one copy; path edges are position-relative, so they stay valid
+            keep = self.max_history // 2
+            x = self._x[vendor]
+            x[:keep] = x[n - keep:n].clone()
+            n = keep
+        self._grow(vendor, n + 1)
+        self._x[vendor][n, 0] = float(event_code)
+        self._n[vendor] = n + 1
+        return n + 1
+
+    def load(self, vendor, codes):
+        """
+        Replace the vendor's history with `codes` (event feature codes, oldest first) in one copy.
+        """
+        codes = list(codes)[-self.max_history:] if self.max_history else list(codes)
+        self._x.pop(vendor, None)
+        self._edges.pop(vendor, None)
+        self._grow(vendor, max(1, len(codes)))
+        if codes:
+            self._x[vendor][:len(codes), 0] = torch.tensor(codes, dtype=torch.float32)
+        self._n[vendor] = len(codes)
+
+    def drop(self, vendor):
+        self._x.pop(vendor, None)
+        self._edges.pop(vendor, None)
+        self._n.pop(vendor, None)
+
+    def vendor_nbytes(self, vendor):
+        x, e = self._x.get(vendor), self._edges.get(vendor)
+        if x is None:
+            return 0
+        return x.element_size() * x.nelement() + e.element_size() * e.nelement()
+
+    def _graph(self, vendor, engagement, start):
+        n = self._n[vendor]
+        x = self._x[vendor][start:n].clone()
+        x[:, 1] = engagement
+        if n - start > 1:
+            edge_index = self._edges[vendor][:, start:n - 1] - start
+        else:
+            edge_index = torch.tensor([[0], [0]])
+        return Data(x=x, edge_index=edge_index)
+
+    def window(self, vendor, engagement):
+        """
+        The last receptive_field nodes as a standalone Data, enough to score the newest node exactly.
+        """
+        return self._graph(vendor, engagement, max(0, self._n[vendor] - self.receptive_field))
+
+    def full(self, vendor, engagement):
+        """
+        Every stored node (what build_graph used to materialize).
+        """
+        return self._graph(vendor, engagement, 0)
+
+    def nbytes(self):
+        return sum(t.element_size() * t.nelement() for d in (self._x, self._edges) for t in d.values())
@@ -0,0 +1,116 @@
+# ml-service/gnn_trainer.py
+import copy
+import queue
+import threading
+import time
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Batch
+from metrics import METRICS
+
+class BackgroundTrainer:
+    """
+    Online training for gnn_model.FraudGNN off the request path. Requests submit (graph, label)
+    onto a bounded queue; a daemon thread drains it in mini-batches (several vendor graphs merged
+    into one disjoint Batch), steps the optimizer on the score of each graph's last node, and every
+    `publish_every` steps swaps in a fresh eval-mode copy as `inference_model`. Request handlers only
+    ever read `inference_model`, so scoring never sees a half-updated model.
+    """
+    def __init__(self, model, optimizer, batch_size=32, max_queue=10000, publish_every=10, linger=0.05):
+        self.model = model
+        self.optimizer = optimizer
+        self.batch_size = max(1, int(batch_size))
+        self.linger = float(linger)  # seconds to wait for a batch to fill before training on a partial one
+        self.publish_every = max(1, int(publish_every))
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self.inference_model = self._frozen_copy()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"submitted": 0, "dropped": 0, "steps": 0, "samples": 0, "published_version": 0,
+                      "last_loss": None, "train_seconds": 0.0, "samples_per_sec": 0.0}
+
+    def _frozen_copy(self):
+        m = copy.deepcopy(self.model).eval()
+        for p in m.parameters():
+            p.requires_grad_(False)
+        return m
+
+    def submit(self, data, label):
+        """
+        Queue one labelled graph (label applies to its last node). Never blocks: when the queue is
+        full the sample is dropped and counted.
+        """
+        try:
+            self.queue.put_nowait((data, float(label)))
+            self.stats["submitted"] += 1
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def _drain(self, timeout):
+        try:
+            items = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def step(self, items):
+        """
+        One optimizer step over a mini-batch of (graph, label) pairs. Returns the loss.
+        """
+        t0 = time.perf_counter()
+        with METRICS.span("build_graph", endpoint="gnn-trainer"):
+            batch = Batch.from_data_list([d for d, _ in items])
+            labels = torch.tensor([y for _, y in items], dtype=torch.float32)
+        self.model.train()
+        self.optimizer.zero_grad()
+        with METRICS.span("forward", endpoint="gnn-trainer"):
+            out = self.model(batch.x, batch.edge_index).view(-1)
+            last = batch.ptr[1:] - 1  # each graph's newest event
+            loss = F.binary_cross_entropy(out[last], labels)
+        with METRICS.span("backward", endpoint="gnn-trainer"):
+            loss.backward()
+        with METRICS.span("optimizer", endpoint="gnn-trainer"):
+            self.optimizer.step()
+        s = self.stats
+        s["steps"] += 1
+        s["samples"] += len(items)
+        s["last_loss"] = float(loss.item())
+        s["train_seconds"] += time.perf_counter() - t0
+        s["samples_per_sec"] = round(s["samples"] / s["train_seconds"], 1) if s["train_seconds"] else 0.0
+        if s["steps"] % self.publish_every == 0:
+            self.publish()
+        return s["last_loss"]
+
+    def publish(self):
+        self.inference_model = self._frozen_copy()  # single reference swap
+        self.stats["published_version"] += 1
+
+    def run(self):
+        while not self._stop.is_set():
+            items = self._drain(timeout=0.5)
+            if items:
+                try:
+                    self.step(items)
+                except Exception as e:
+                    print("GNN trainer step failed:", e)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="gnn-trainer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
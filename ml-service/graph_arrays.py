@@ -0,0 +1,260 @@
+# ml-service/graph_arrays.py
+from array import array
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+CHUNK_BITS = 16
+CHUNK = 1 << CHUNK_BITS  # elements per column chunk
+CHUNK_MASK = CHUNK - 1
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_TZ = -32768  # tz column sentinel for naive timestamps (treated as UTC)
+
+def dt_to_epoch(dt):
+    """
+    datetime -> (epoch seconds, utc offset in minutes or NAIVE_TZ)
+    """
+    if dt.tzinfo is None:
+        return (dt - EPOCH).total_seconds(), NAIVE_TZ
+    return (dt - EPOCH_UTC).total_seconds(), int(dt.utcoffset().total_seconds() // 60)
+
+def epoch_to_iso(ts, tz):
+    """
+    Inverse of dt_to_epoch, rendered the way datetime.isoformat() renders the original value.
+    """
+    delta = timedelta(microseconds=round(ts * 1e6))
+    if tz == NAIVE_TZ:
+        return (EPOCH + delta).isoformat()
+    return (EPOCH_UTC + delta).astimezone(timezone(timedelta(minutes=tz))).isoformat()
+
+class Column:
+    """
+    Append-only typed column stored as fixed-size NumPy chunks, so growth never copies old data.
+    """
+    __slots__ = ("dtype", "chunks", "n")
+
+    def __init__(self, dtype):
+        self.dtype = np.dtype(dtype)
+        self.chunks = []
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, value):
+        i = self.n
+        if (i >> CHUNK_BITS) == len(self.chunks):
+            self.chunks.append(np.zeros(CHUNK, dtype=self.dtype))
+        self.chunks[i >> CHUNK_BITS][i & CHUNK_MASK] = value
+        self.n = i + 1
+        return i
+
+    def __getitem__(self, i):
+        return self.chunks[i >> CHUNK_BITS][i & CHUNK_MASK]
+
+    def __setitem__(self, i, value):
+        self.chunks[i >> CHUNK_BITS][i & CHUNK_MASK] = value
+
+    def take(self, idx):
+        """
+        Gather values at the given row indices into a new array.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        out = np.empty(len(idx), dtype=self.dtype)
+        if len(idx) == 0:
+            return out
+        which = idx >> CHUNK_BITS
+        offs = idx & CHUNK_MASK
+        lo, hi = int(which.min()), int(which.max())
+        if lo == hi:
+            out[:] = self.chunks[lo][offs]
+            return out
+        for c in np.unique(which):
+            m = which == c
+            out[m] = self.chunks[c][offs[m]]
+        return out
+
+    def to_numpy(self):
+        if not self.chunks:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(self.chunks)[:self.n]
+
+    @classmethod
+    def from_padded(cls, data, n):
+        """
+        Wrap an array whose length is a multiple of CHUNK (e.g. a checkpoint memmap) without copying;
+        each chunk is a view, and appends continue in the last partially filled chunk.
+        """
+        col = cls(data.dtype)
+        col.chunks = [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+        col.n = int(n)
+        return col
+
+    def nbytes(self):
+        return sum(c.nbytes for c in self.chunks)
+
+class ArrayGraphStore:
+    """
+    Compact DAWG storage: one row per event in typed columns instead of a networkx node/edge dict.
+      nodes: vendor code, label code, epoch-second timestamp, utc offset, head of out-edge list
+      edges: src row, dst row, weight, count, next out-edge of src
+    Vendor ids and labels are interned to small ints; per-vendor row lists are array('q').
+    """
+    # chunked columns, in checkpoint order (see graph_checkpoint.py)
+    COLUMNS = ("node_vendor", "node_label", "node_ts", "node_tz", "node_first_out",
+               "edge_src", "edge_dst", "edge_weight", "edge_count", "edge_next_out")
+
+    def __init__(self):
+        self.node_ids = []   # row -> original node id
+        self._node_index = {} # node id -> row (None until first use after a checkpoint restore)
+        self.node_vendor = Column(np.int32)
+        self.node_label = Column(np.int32)
+        self.node_ts = Column(np.float64)
+        self.node_tz = Column(np.int16)
+        self.node_first_out = Column(np.int64)
+        self.edge_src = Column(np.int64)
+        self.edge_dst = Column(np.int64)
+        self.edge_weight = Column(np.float64)
+        self.edge_count = Column(np.int64)
+        self.edge_next_out = Column(np.int64)
+        self.vendor_codes = {}  # vendorId -> code
+        self.vendors = []       # code -> vendorId
+        self.label_codes = {}   # label -> code
+        self.labels = []        # code -> label
+        self.vendor_nodes = []  # vendor code -> array('q') of node rows
+        self.vendor_edges = []  # vendor code -> array('q') of edge rows
+
+    def _vendor_code(self, vid):
+        code = self.vendor_codes.get(vid)
+        if code is None:
+            code = self.vendor_codes[vid] = len(self.vendors)
+            self.vendors.append(vid)
+            self.vendor_nodes.append(array("q"))
+            self.vendor_edges.append(array("q"))
+        return code
+
+    def _label_code(self, label):
+        code = self.label_codes.get(label)
+        if code is None:
+            code = self.label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    @property
+    def node_index(self):
+        if self._node_index is None:
+            self._node_index = dict(zip(self.node_ids, range(len(self.node_ids))))
+        return self._node_index
+
+    @node_index.setter
+    def node_index(self, value):
+        self._node_index = value
+
+    def has_node(self, node_id):
+        return node_id in self.node_index
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.edge_src)
+
+    def add_node(self, vid, node_id, label, ts):
+        if node_id in self.node_index:
+            return
+        code = self._vendor_code(vid)
+        epoch, tz = dt_to_epoch(ts)
+        row = self.node_vendor.append(code)
+        self.node_label.append(self._label_code(label))
+        self.node_ts.append(epoch)
+        self.node_tz.append(tz)
+        self.node_first_out.append(-1)
+        self.node_ids.append(node_id)
+        self.node_index[node_id] = row
+        self.vendor_nodes[code].append(row)
+
+    def _append_edge(self, u, v, weight, count, code=None):
+        e = self.edge_src.append(u)
+        self.edge_dst.append(v)
+        self.edge_weight.append(weight)
+        self.edge_count.append(count)
+        self.edge_next_out.append(self.node_first_out[u])
+        self.node_first_out[u] = e
+        if code is not None:
+            self.vendor_edges[code].append(e)
+        return e
+
+    def _find_edge(self, u, v):
+        e = int(self.node_first_out[u])
+        while e != -1:
+            if self.edge_dst[e] == v:
+                return e
+            e = int(self.edge_next_out[e])
+        return -1
+
+    def add_transition(self, vid, u_id, v_id, weight):
+        """
+        Same contract as NetworkxGraphStore.add_transition ("new" / "bump" / None).
+        """
+        u = self.node_index[u_id]
+        v = self.node_index[v_id]
+        code = self.vendor_codes.get(vid)
+        if code is None or self.node_vendor[u] != code or self.node_vendor[v] != code:
+            code = None  # cross-vendor edge: stored, but not part of any vendor snapshot
+        e = self._find_edge(u, v)
+        if e != -1:
+            # adaptively update average weight and count
+            cnt = int(self.edge_count[e])
+            self.edge_weight[e] = (float(self.edge_weight[e]) * cnt + weight) / (cnt + 1)
+            self.edge_count[e] = cnt + 1
+            return "bump" if code is not None else None
+        self._append_edge(u, v, weight, 1, code)
+        return "new" if code is not None else None
+
+    def node_info(self, node_id):
+        r = self.node_index[node_id]
+        return {"id": str(node_id), "label": self.labels[int(self.node_label[r])],
+                "timestamp": epoch_to_iso(float(self.node_ts[r]), int(self.node_tz[r]))}
+
+    def edge_info(self, u_id, v_id):
+        e = self._find_edge(self.node_index[u_id], self.node_index[v_id])
+        return {"from": str(u_id), "to": str(v_id), "weight": float(self.edge_weight[e]), "count": int(self.edge_count[e])}
+
+    def history_lengths(self):
+        return [len(rows) for rows in self.vendor_nodes]
+
+    def snapshot(self, vendor_id):
+        code = self.vendor_codes.get(vendor_id)
+        if code is None:
+            return {"nodes": [], "edges": []}
+        rows = np.array(self.vendor_nodes[code], dtype=np.int64)
+        labels, ids = self.labels, self.node_ids
+        nodes = [
+            {"id": str(ids[r]), "label": labels[lab], "timestamp": epoch_to_iso(ts, tz)}
+            for r, lab, ts, tz in zip(rows.tolist(), self.node_label.take(rows).tolist(),
+                                      self.node_ts.take(rows).tolist(), self.node_tz.take(rows).tolist())
+        ]
+        erows = np.array(self.vendor_edges[code], dtype=np.int64)
+        edges = [
+            {"from": str(ids[u]), "to": str(ids[v]), "weight": w, "count": c}
+            for u, v, w, c in zip(self.edge_src.take(erows).tolist(), self.edge_dst.take(erows).tolist(),
+                                  self.edge_weight.take(erows).tolist(), self.edge_count.take(erows).tolist())
+        ]
+        nodes.sort(key=lambda x: x.get("timestamp"))
+        return {"nodes": nodes, "edges": edges}
+
+    def timeline(self, vendor_id):
+        """
+        Columnar view of one vendor for feature extraction: epoch-second timestamps (sorted),
+        label codes and edge counts, read straight from the columns.
+        """
+        code = self.vendor_codes.get(vendor_id)
+        if code is None:
+            return {"timestamps": np.empty(0), "labels": np.empty(0, dtype=np.int64), "edge_counts": np.empty(0)}
+        rows = np.array(self.vendor_nodes[code], dtype=np.int64)
+        ts = self.node_ts.take(rows)
+        order = np.argsort(ts, kind="stable")
+        erows = np.array(self.vendor_edges[code], dtype=np.int64)
+        return {"timestamps": ts[order], "labels": self.node_label.take(rows)[order].astype(np.int64),
+                "edge_counts": self.edge_count.take(erows).astype(float)}
@@ -1,6 +1,9 @@
 # ml-service/graph_builder.py
 from datetime import datetime
-import networkx as nx
+import threading
+import numpy as np
+from vendor_stats import VendorStats
+from graph_arrays import dt_to_epoch
 
 def iso_to_dt(ts):
     if ts is None:
@@ -12,84 +15,254 @@ def iso_to_dt(ts):
             return datetime.utcnow()
     return ts
 
+class NetworkxGraphStore:
+    """
+    Default DAWG storage: a networkx DiGraph with attribute dicts per node/edge, plus a per-vendor
+    index (vendor -> ordered node ids, vendor -> edge keys) so a snapshot never scans other vendors.
+    """
+    def __init__(self):
+        import networkx as nx  # only this backend needs it; DAWG_BACKEND=array never imports it
+        self.G = nx.DiGraph()
+        self.vendor_nodes = {}  # vendorId -> [node_id, ...] in insertion order
+        self.vendor_edges = {}  # vendorId -> {(u, v): None} in insertion order (dict used as ordered set)
+
+    def has_node(self, node_id):
+        return node_id in self.G
+
+    def number_of_nodes(self):
+        return self.G.number_of_nodes()
+
+    def number_of_edges(self):
+        return self.G.number_of_edges()
+
+    def add_node(self, vid, node_id, label, ts):
+        if node_id not in self.G:
+            self.G.add_node(node_id, vendorId=vid, label=label, timestamp=ts.isoformat())
+            self.vendor_nodes.setdefault(vid, []).append(node_id)
+
+    def add_transition(self, vid, u, v, weight):
+        """
+        Returns "new" / "bump" for a created / re-counted edge of this vendor's snapshot,
+        None for an edge between different vendors' nodes.
+        """
+        nodes = self.G.nodes
+        # only index edges whose endpoints both belong to this vendor (same rule the snapshot applies)
+        local = nodes[u].get("vendorId") == vid and nodes[v].get("vendorId") == vid
+        # if edge exists, adaptively update average weight and count
+        if self.G.has_edge(u, v):
+            data = self.G[u][v]
+            # maintain count & avg
+            cnt = data.get("count", 1)
+            avg = data.get("weight", weight)
+            new_avg = (avg * cnt + weight) / (cnt + 1)
+            self.G[u][v].update({"weight": new_avg, "count": cnt + 1})
+            return "bump" if local else None
+        self.G.add_edge(u, v, weight=weight, count=1)
+        if local:
+            self.vendor_edges.setdefault(vid, {})[(u, v)] = None
+            return "new"
+        return None
+
+    def node_info(self, node_id):
+        data = self.G.nodes[node_id]
+        return {"id": str(node_id), "label": data.get("label"), "timestamp": data.get("timestamp")}
+
+    def edge_info(self, u, v):
+        data = self.G[u][v]
+        return {"from": str(u), "to": str(v), "weight": float(data.get("weight", 0.0)), "count": int(data.get("count", 1))}
+
+    def history_lengths(self):
+        return [len(nodes) for nodes in self.vendor_nodes.values()]
+
+    def snapshot(self, vendor_id):
+        G = self.G
+        nodes = []
+        edges = []
+        for n in self.vendor_nodes.get(vendor_id, ()):
+            data = G.nodes[n]
+            nodes.append({"id": str(n), "label": data.get("label"), "timestamp": data.get("timestamp")})
+        for u, v in self.vendor_edges.get(vendor_id, ()):
+            data = G[u][v]
+            edges.append({"from": str(u), "to": str(v), "weight": float(data.get("weight", 0.0)), "count": int(data.get("count", 1))})
+        # sort nodes by timestamp
+        nodes_sorted = sorted(nodes, key=lambda x: x.get("timestamp"))
+        return {"nodes": nodes_sorted, "edges": edges}
+
+    def timeline(self, vendor_id):
+        """
+        Columnar view of one vendor for feature extraction (see ArrayGraphStore.timeline).
+        """
+        G = self.G
+        codes = {}
+        ts, labels = [], []
+        for n in self.vendor_nodes.get(vendor_id, ()):
+            data = G.nodes[n]
+            ts.append(dt_to_epoch(datetime.fromisoformat(data.get("timestamp")))[0])
+            labels.append(codes.setdefault(data.get("label"), len(codes)))
+        ts = np.array(ts, dtype=np.float64)
+        order = np.argsort(ts, kind="stable")
+        edge_counts = [G[u][v].get("count", 1) for u, v in self.vendor_edges.get(vendor_id, ())]
+        return {"timestamps": ts[order], "labels": np.array(labels, dtype=np.int64)[order],
+                "edge_counts": np.array(edge_counts, dtype=float)}
+
+def make_store(backend):
+    if backend == "networkx":
+        return NetworkxGraphStore()
+    if backend == "array":
+        from graph_arrays import ArrayGraphStore
+        return ArrayGraphStore()
+    raise ValueError(f"unknown DAWG backend: {backend!r} (expected 'networkx' or 'array')")
+
 class DynamicAdaptiveWeightedGraph:
     """
     DAWG: dynamic graph representation. Nodes = events; edges = temporal transitions with weight=seconds.
     This object can be used to incrementally add events.
+    backend: "networkx" (default) or "array" (compact columnar storage, see graph_arrays.py);
+    both produce identical snapshots.
+    Callers that mutate/read from several threads (warm-up loader + request handlers) hold `lock`.
     """
-    def __init__(self):
-        self.G = nx.DiGraph()
+    def __init__(self, backend="networkx"):
+        self.backend = backend
+        self._store = None  # built on first use, so constructing a DAWG does not import networkx
         self.last_event_by_vendor = {}  # vendorId -> last event dict
+        self.lock = threading.RLock()
+        self.version = 0  # bumped on every applied event (checkpoint writer uses it as a dirty flag)
+        self.high_water_id = None  # largest event _id seen, used to resume from a checkpoint
+        self.vendor_stats = {}  # vendorId -> VendorStats (running feature inputs, see vendor_features)
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self.lock:
+                if self._store is None:
+                    self._store = make_store(self.backend)
+        return self._store
+
+    @store.setter
+    def store(self, store):
+        self._store = store
 
-    def add_events_bulk(self, events):
+    @property
+    def G(self):
+        return getattr(self.store, "G", None)  # networkx backend only
+
+    def _seen(self, node_id):
+        self.version += 1
+        sid = str(node_id)
+        if self.high_water_id is None or sid > self.high_water_id:
+            self.high_water_id = sid
+
+    def _apply(self, vid, node_id, label, ts, event):
+        """
+        Add one event: node, transition from the vendor's previous event, running stats.
+        Returns what changed in the vendor's snapshot as {"nodes", "edges", "bumps"} (new nodes,
+        new edges, re-counted edges with their current weight/count) for write-behind persistence.
+        """
+        store = self.store
+        is_new = not store.has_node(node_id)
+        store.add_node(vid, node_id, label, ts)
+        self._seen(node_id)
+        prev = self.last_event_by_vendor.get(vid)
+        st = self.vendor_stats.get(vid)
+        if st is None and prev is None:
+            # brand-new vendor; vendors restored without stats get them rebuilt lazily in vendor_features
+            st = self.vendor_stats[vid] = VendorStats()
+        delta = {"nodes": [store.node_info(node_id)] if is_new else [], "edges": [], "bumps": []}
+        newest = True
+        if prev:
+            wait = (ts - iso_to_dt(prev.get("timestamp"))).total_seconds()
+            newest = wait >= 0
+            edge = store.add_transition(vid, prev['_id'], node_id, max(0.0, wait))
+            if edge is not None:
+                delta["edges" if edge == "new" else "bumps"].append(store.edge_info(prev['_id'], node_id))
+                if st is not None:
+                    st.add_edge(edge == "new")
+        if st is not None and is_new:
+            epoch = dt_to_epoch(ts)[0]
+            if st.last_ts is not None and epoch < st.last_ts:
+                # out of order (backfill, bulk batch, warm-up vs live): the running waits only take
+                # events at the end of the timeline, so drop the stats; vendor_features rebuilds
+                # them from the sorted timeline
+                del self.vendor_stats[vid]
+            else:
+                st.add_event(label, epoch, None if st.last_ts is None else epoch - st.last_ts)
+        # the vendor's chain continues from its latest event, not from the latest to arrive
+        if newest:
+            self.last_event_by_vendor[vid] = event
+        return delta
+
+    def add_events_bulk(self, events, presorted=False):
         """
         events: list of {"_id":str, "vendorId":str, "eventType":str, "timestamp":str}
-        Builds/updates graph for multiple events (assumes sorted by timestamp per vendor)
+        Builds/updates graph for multiple events (assumes sorted by timestamp per vendor).
+        Each vendor's chain continues from its last known event, and events whose _id is already
+        in the graph are skipped, so overlapping batches (warm-up vs on-demand loads) are idempotent.
+        presorted=True skips the sort when events already arrive in timestamp order.
+        Returns {vendorId: delta} with each touched vendor's snapshot changes merged in event order
+        (see _apply); bumps of an edge created in the same batch follow its entry in "edges".
         """
         # group by vendor to do per-vendor sequences
-        events_sorted = sorted(events, key=lambda e: (e.get("vendorId"), e.get("timestamp")))
-        prev_by_vendor = {}
-        for e in events_sorted:
-            vid = e.get("vendorId")
+        if not presorted:
+            events = sorted(events, key=lambda e: (e.get("vendorId"), e.get("timestamp")))
+        store = self.store
+        deltas = {}
+        for e in events:
             node_id = e.get("_id")
-            ts = iso_to_dt(e.get("timestamp"))
-            label = e.get("eventType", "EVENT")
-            if node_id not in self.G:
-                self.G.add_node(node_id, vendorId=vid, label=label, timestamp=ts.isoformat())
-            if vid in prev_by_vendor:
-                prev = prev_by_vendor[vid]
-                prev_ts = iso_to_dt(prev.get("timestamp"))
-                weight = max(0.0, (ts - prev_ts).total_seconds())
-                # if edge exists, adaptively update average weight and count
-                if self.G.has_edge(prev['_id'], node_id):
-                    data = self.G[prev['_id']][node_id]
-                    # maintain count & avg
-                    cnt = data.get("count", 1)
-                    avg = data.get("weight", weight)
-                    new_avg = (avg * cnt + weight) / (cnt + 1)
-                    self.G[prev['_id']][node_id].update({"weight": new_avg, "count": cnt + 1})
-                else:
-                    self.G.add_edge(prev['_id'], node_id, weight=weight, count=1)
-            prev_by_vendor[vid] = e
-            self.last_event_by_vendor[vid] = e
+            if store.has_node(node_id):
+                continue
+            vid = e.get("vendorId")
+            delta = self._apply(vid, node_id, e.get("eventType", "EVENT"), iso_to_dt(e.get("timestamp")), e)
+            merged = deltas.get(vid)
+            if merged is None:
+                deltas[vid] = delta
+            else:
+                for k in ("nodes", "edges", "bumps"):
+                    merged[k].extend(delta[k])
+        return deltas
 
     def add_event_incremental(self, event):
         """
         Add a single new event (incremental update). Event is dict with vendorId, _id, eventType, timestamp.
+        Returns the snapshot delta (see _apply).
         """
-        vid = event.get("vendorId")
-        node_id = event.get("_id")
-        ts = iso_to_dt(event.get("timestamp"))
-        label = event.get("eventType", "EVENT")
-        if node_id not in self.G:
-            self.G.add_node(node_id, vendorId=vid, label=label, timestamp=ts.isoformat())
-        prev = self.last_event_by_vendor.get(vid)
-        if prev:
-            prev_ts = iso_to_dt(prev.get("timestamp"))
-            weight = max(0.0, (ts - prev_ts).total_seconds())
-            if self.G.has_edge(prev['_id'], node_id):
-                data = self.G[prev['_id']][node_id]
-                cnt = data.get("count", 1)
-                avg = data.get("weight", weight)
-                new_avg = (avg * cnt + weight) / (cnt + 1)
-                self.G[prev['_id']][node_id].update({"weight": new_avg, "count": cnt + 1})
-            else:
-                self.G.add_edge(prev['_id'], node_id, weight=weight, count=1)
-        self.last_event_by_vendor[vid] = event
+        return self._apply(event.get("vendorId"), event.get("_id"), event.get("eventType", "EVENT"),
+                    iso_to_dt(event.get("timestamp")), event)
 
     def snapshot_for_vendor(self, vendor_id):
         """
-        Build node/edge lists relevant to vendor_id by selecting nodes with vendorId and relevant edges.
+        Build node/edge lists relevant to vendor_id from the per-vendor index.
+        Cost is proportional to this vendor's events, not to the whole graph.
         """
-        nodes = []
-        edges = []
-        for n, data in self.G.nodes(data=True):
-            if data.get("vendorId") == vendor_id:
-                nodes.append({"id": str(n), "label": data.get("label"), "timestamp": data.get("timestamp")})
-        for u, v, data in self.G.edges(data=True):
-            # include edge if both endpoints belong to vendor
-            if u in [n['id'] for n in nodes] and v in [n['id'] for n in nodes]:
-                edges.append({"from": str(u), "to": str(v), "weight": float(data.get("weight", 0.0)), "count": int(data.get("count", 1))})
-        # sort nodes by timestamp
-        nodes_sorted = sorted(nodes, key=lambda x: x.get("timestamp"))
-        return {"nodes": nodes_sorted, "edges": edges}
+        return self.store.snapshot(vendor_id)
+
+    def vendor_history_lengths(self):
+        """
+        Events held per vendor (one entry per vendor, in no particular order), for gauges.
+        """
+        return self.store.history_lengths()
+
+    def timeline_for_vendor(self, vendor_id):
+        """
+        Numeric columnar snapshot ({"timestamps", "labels", "edge_counts"}) for the feature
+        extractor's fast path; no ISO strings or node dicts are built.
+        """
+        return self.store.timeline(vendor_id)
+
+    def vendor_features(self, vendor_id, exact=False):
+        """
+        The eight scoring features for one vendor. By default they come from the running
+        VendorStats in O(1) (median is a P-square estimate once there are more than five waits);
+        exact=True recomputes them from the full timeline, e.g. for auditing.
+        """
+        if exact:
+            from feature_extractor import extract_features_from_snapshot
+            return extract_features_from_snapshot(self.timeline_for_vendor(vendor_id))
+        st = self.vendor_stats.get(vendor_id)
+        if st is None:
+            tl = self.timeline_for_vendor(vendor_id)
+            if not len(tl["timestamps"]):
+                return VendorStats().features()
+            snap = self.snapshot_for_vendor(vendor_id)
+            st = self.vendor_stats[vendor_id] = VendorStats.from_arrays(
+                tl["timestamps"], [n["label"] for n in snap["nodes"]], tl["edge_counts"])
+        return st.features()
@@ -0,0 +1,269 @@
+# ml-service/graph_checkpoint.py
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime
+import numpy as np
+
+from graph_arrays import CHUNK, ArrayGraphStore, Column, epoch_to_iso
+from graph_builder import NetworkxGraphStore, iso_to_dt
+
+# On-disk DAWG checkpoint, one file:
+#   magic "DAWGCKPT" | uint32 format version | uint32 header length | JSON header | aligned column blobs
+# The header lists every column's dtype, offset and length. Chunked columns are zero-padded to a
+# multiple of graph_arrays.CHUNK so the array backend can map them copy-on-write and use the pages
+# directly as its chunks. Files are written to a temp name and os.replace()d, so readers never see
+# a partial checkpoint.
+
+MAGIC = b"DAWGCKPT"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def _flatten(rows_by_vendor):
+    lengths = np.fromiter((len(r) for r in rows_by_vendor), dtype=np.int64, count=len(rows_by_vendor))
+    offsets = np.zeros(len(rows_by_vendor) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.frombuffer(b"".join(r.tobytes() for r in rows_by_vendor), dtype=np.int64)
+    return flat, offsets
+
+def networkx_rows(nx_store):
+    """
+    Plain copies of a networkx-backed store's node and edge attributes: (nodes, vendor_edges,
+    edges). No parsing or re-encoding, so it is cheap enough to take under dawg.lock.
+    """
+    G = nx_store.G
+    nodes = [(n, d.get("vendorId"), d.get("label"), d.get("timestamp")) for n, d in G.nodes(data=True)]
+    vendor_edges = [(vid, [(u, v, G[u][v].get("weight", 0.0), G[u][v].get("count", 1)) for u, v in keys])
+                    for vid, keys in nx_store.vendor_edges.items()]
+    edges = [(u, v, d.get("weight", 0.0), d.get("count", 1)) for u, v, d in G.edges(data=True)]
+    return nodes, vendor_edges, edges
+
+def array_store_from_rows(nodes, vendor_edges, edges):
+    """
+    Re-encode networkx_rows() output in the columnar layout (used to checkpoint that backend).
+    """
+    arr = ArrayGraphStore()
+    for n, vid, label, ts in nodes:
+        arr.add_node(vid, n, label, iso_to_dt(ts))
+    indexed = set()
+    for vid, rows in vendor_edges:
+        code = arr.vendor_codes[vid]
+        for u, v, weight, count in rows:
+            arr._append_edge(arr.node_index[u], arr.node_index[v], weight, count, code)
+            indexed.add((u, v))
+    for u, v, weight, count in edges:
+        if (u, v) not in indexed:
+            arr._append_edge(arr.node_index[u], arr.node_index[v], weight, count)
+    return arr
+
+def array_store_from_networkx(nx_store):
+    return array_store_from_rows(*networkx_rows(nx_store))
+
+def networkx_store_from_array(arr):
+    nx_store = NetworkxGraphStore()
+    G = nx_store.G
+    ids, labels, vendors = arr.node_ids, arr.labels, arr.vendors
+    vendor = arr.node_vendor.to_numpy().tolist()
+    label = arr.node_label.to_numpy().tolist()
+    for i, (ts, tz) in enumerate(zip(arr.node_ts.to_numpy().tolist(), arr.node_tz.to_numpy().tolist())):
+        vid = vendors[vendor[i]]
+        G.add_node(ids[i], vendorId=vid, label=labels[label[i]], timestamp=epoch_to_iso(ts, tz))
+        nx_store.vendor_nodes.setdefault(vid, []).append(ids[i])
+    for u, v, w, c in zip(arr.edge_src.to_numpy().tolist(), arr.edge_dst.to_numpy().tolist(),
+                          arr.edge_weight.to_numpy().tolist(), arr.edge_count.to_numpy().tolist()):
+        G.add_edge(ids[u], ids[v], weight=w, count=c)
+    src, dst = arr.edge_src.to_numpy(), arr.edge_dst.to_numpy()
+    for code, erows in enumerate(arr.vendor_edges):
+        if len(erows):
+            nx_store.vendor_edges[vendors[code]] = {(ids[src[e]], ids[dst[e]]): None for e in erows}
+    return nx_store
+
+def store_arrays(store, last_event_by_vendor):
+    """
+    The checkpoint columns and vendor/label tables of an ArrayGraphStore.
+    """
+    arrays = {name: getattr(store, name).to_numpy() for name in ArrayGraphStore.COLUMNS}
+    arrays["node_ids"] = np.frombuffer("\0".join(map(str, store.node_ids)).encode(), dtype=np.uint8)
+    arrays["vendor_nodes"], arrays["vendor_nodes_offsets"] = _flatten(store.vendor_nodes)
+    arrays["vendor_edges"], arrays["vendor_edges_offsets"] = _flatten(store.vendor_edges)
+    last_rows = np.full(len(store.vendors), -1, dtype=np.int64)
+    for code, vid in enumerate(store.vendors):
+        ev = last_event_by_vendor.get(vid)
+        if ev is not None:
+            last_rows[code] = store.node_index.get(ev.get("_id"), -1)
+    arrays["vendor_last_row"] = last_rows
+    meta = {
+        "n_nodes": store.number_of_nodes(),
+        "n_edges": store.number_of_edges(),
+        "vendors": list(store.vendors),
+        "labels": list(store.labels),
+    }
+    return meta, arrays
+
+def export_state(dawg):
+    """
+    Copy everything a checkpoint needs out of the DAWG. dawg.lock is held only for the copy: the
+    array backend's columns, or the networkx backend's raw attribute lists, whose columnar
+    re-encoding (a timestamp parse per event) happens after the lock is released, like the write.
+    """
+    rows = None
+    with dawg.lock:
+        last_event_by_vendor = dict(dawg.last_event_by_vendor)
+        high_water_id, version = dawg.high_water_id, dawg.version
+        if isinstance(dawg.store, ArrayGraphStore):
+            meta, arrays = store_arrays(dawg.store, last_event_by_vendor)
+        else:
+            rows = networkx_rows(dawg.store)
+    if rows is not None:
+        meta, arrays = store_arrays(array_store_from_rows(*rows), last_event_by_vendor)
+    meta.update(high_water_id=high_water_id, dawg_version=version, created_at=datetime.utcnow().isoformat())
+    return meta, arrays
+
+def write_checkpoint(path, meta, arrays):
+    columns = {}
+    offset = 0
+    for name, data in arrays.items():
+        length = len(data)
+        padded = -(-length // CHUNK) * CHUNK if name in ArrayGraphStore.COLUMNS else length
+        columns[name] = {"dtype": data.dtype.str, "offset": offset, "length": length, "padded": padded}
+        offset = _align(offset + padded * data.dtype.itemsize)
+    header = json.dumps(dict(meta, format_version=FORMAT_VERSION, chunk=CHUNK, columns=columns)).encode()
+    data_start = _align(_PREFIX.size + len(header))
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, data in arrays.items():
+            f.seek(data_start + columns[name]["offset"])
+            f.write(np.ascontiguousarray(data).tobytes())
+            pad = columns[name]["padded"] - columns[name]["length"]
+            if pad:
+                f.write(b"\0" * (pad * data.dtype.itemsize))
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+def save_checkpoint(dawg, path):
+    meta, arrays = export_state(dawg)
+    write_checkpoint(path, meta, arrays)
+    return meta
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a DAWG checkpoint")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported DAWG checkpoint version {version} (expected {FORMAT_VERSION})")
+        header = json.loads(f.read(header_len))
+    if header.get("chunk") != CHUNK:
+        raise ValueError(f"checkpoint chunk size {header.get('chunk')} does not match CHUNK={CHUNK}")
+    return header, _align(_PREFIX.size + header_len)
+
+def restore_checkpoint(dawg, path):
+    """
+    Load a checkpoint into an (empty) DAWG in place. With the array backend the chunked columns
+    are memory-mapped copy-on-write, so pages are only read when touched and appends/edge updates
+    stay private to this process. The networkx backend is rebuilt from the columns.
+    Returns the checkpoint header.
+    """
+    header, data_start = read_header(path)
+    cols = header["columns"]
+
+    def mapped(name, mode="r"):
+        c = cols[name]
+        if c["padded"] == 0:
+            return np.empty(0, dtype=np.dtype(c["dtype"]))
+        return np.memmap(path, dtype=np.dtype(c["dtype"]), mode=mode, offset=data_start + c["offset"], shape=(c["padded"],))
+
+    store = ArrayGraphStore()
+    for name in ArrayGraphStore.COLUMNS:
+        setattr(store, name, Column.from_padded(mapped(name, "c"), cols[name]["length"]))
+    ids = mapped("node_ids").tobytes().decode()
+    store.node_ids = ids.split("\0") if header["n_nodes"] else []
+    store.node_index = None  # id -> row dict is built on first lookup, off the restart path
+    store.vendors = header["vendors"]
+    store.vendor_codes = {vid: code for code, vid in enumerate(store.vendors)}
+    store.labels = header["labels"]
+    store.label_codes = {label: code for code, label in enumerate(store.labels)}
+    for attr in ("vendor_nodes", "vendor_edges"):
+        flat, offsets = mapped(attr), mapped(attr + "_offsets").tolist()
+        raw = flat.tobytes()
+        rows = []
+        for lo, hi in zip(offsets, offsets[1:]):
+            a = array("q")
+            a.frombytes(raw[lo * 8:hi * 8])
+            rows.append(a)
+        setattr(store, attr, rows)
+
+    last_event_by_vendor = {}
+    last_rows = np.asarray(mapped("vendor_last_row"))
+    codes = np.flatnonzero(last_rows >= 0)
+    rows = last_rows[codes]
+    for code, row, label, ts, tz in zip(codes.tolist(), rows.tolist(), store.node_label.take(rows).tolist(),
+                                        store.node_ts.take(rows).tolist(), store.node_tz.take(rows).tolist()):
+        vid = store.vendors[code]
+        last_event_by_vendor[vid] = {"_id": store.node_ids[row], "vendorId": vid,
+                                     "eventType": store.labels[label], "timestamp": epoch_to_iso(ts, tz)}
+
+    with dawg.lock:
+        dawg.store = store if dawg.backend == "array" else networkx_store_from_array(store)
+        dawg.last_event_by_vendor = last_event_by_vendor
+        dawg.vendor_stats = {}  # rebuilt per vendor on first vendor_features() call
+        dawg.high_water_id = header["high_water_id"]
+        dawg.version = header["dawg_version"]
+    return header
+
+class CheckpointWriter:
+    """
+    Background thread that rewrites the checkpoint every `interval` seconds when the DAWG changed.
+    """
+    def __init__(self, dawg, path, interval=300.0):
+        self.dawg = dawg
+        self.path = path
+        self.interval = float(interval)
+        self.saved_version = dawg.version
+        self.last = {"path": path, "saved_at": None, "seconds": None, "nodes": None, "error": None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="dawg-checkpoint", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def save_if_dirty(self):
+        version = self.dawg.version
+        if version == self.saved_version:
+            return False
+        t0 = time.perf_counter()
+        try:
+            meta = save_checkpoint(self.dawg, self.path)
+        except Exception as e:
+            self.last["error"] = str(e)
+            print("DAWG checkpoint error:", e)
+            return False
+        self.saved_version = meta["dawg_version"]
+        self.last.update(saved_at=meta["created_at"], seconds=round(time.perf_counter() - t0, 3),
+                         nodes=meta["n_nodes"], error=None)
+        return True
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.save_if_dirty()
+
+    def stop(self, final_save=True):
+        self._stop.set()
+        if final_save:
+            self.save_if_dirty()
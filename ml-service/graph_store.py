@@ -1,20 +1,276 @@
-from pymongo import MongoClient
+# ml-service/graph_store.py
+from pymongo import DeleteMany, InsertOne, UpdateOne
 import os
-import json
+import threading
+import time
+from datetime import datetime
+from metrics import METRICS
+from mongo import LazyCollection
 
-MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/vendorbgac")
-client = MongoClient(MONGO_URI)
-db = client.get_database()
+# Vendor graphs are stored with the bucket pattern: vendor_graph_buckets holds documents
+# {vendorId, n, nodes: [...], edges: [...]} of at most ~GRAPH_BUCKET_SIZE nodes each, so new events are
+# appended with $push/$each instead of rewriting the vendor's whole graph (and no vendor can hit the
+# 16 MB document limit). The legacy single-document vendor_graphs collection is still read as a fallback.
+BUCKET_SIZE = int(os.getenv("GRAPH_BUCKET_SIZE", 1000))
+FLUSH_INTERVAL = float(os.getenv("GRAPH_FLUSH_INTERVAL", 1.0))
+FLUSH_MAX_PENDING = int(os.getenv("GRAPH_FLUSH_MAX_PENDING", 5000))
+
+class GraphWriteBehind:
+    """
+    Write-behind buffer for vendor graph persistence. Appends and rewrites are coalesced per vendor
+    in memory and written with one ordered bulk_write when the flush timer fires or when more than
+    `max_pending` nodes/edges are queued. Reads go through load() so callers see queued writes.
+    """
+    def __init__(self, buckets, legacy=None, bucket_size=BUCKET_SIZE, interval=FLUSH_INTERVAL, max_pending=FLUSH_MAX_PENDING):
+        self.buckets = buckets
+        self.legacy = legacy
+        self.bucket_size = bucket_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}  # vendorId -> {"replace": bool, "nodes": [], "edges": [], "bumps": {(from, to): edge}}
+        self._n_pending = 0
+        self._synced = set()  # vendors whose stored graph this process has fully written at least once
+        self._fill = {}  # vendorId -> node count of its open (last) bucket, so appends split at bucket edges
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"flushes": 0, "flush_errors": 0, "ops_written": 0, "vendors_flushed": 0,
+                        "flush_seconds_total": 0.0, "flush_seconds_last": 0.0, "flush_seconds_max": 0.0}
+
+    def _entry(self, vendor_id):
+        entry = self._pending.get(vendor_id)
+        if entry is None:
+            entry = self._pending[vendor_id] = {"replace": False, "nodes": [], "edges": [], "bumps": {}}
+        return entry
+
+    def _queued(self, n):
+        self._n_pending += n
+        if self._thread is None:
+            self.start()
+        if self._n_pending >= self.max_pending:
+            self._wake.set()
+
+    def append(self, vendor_id, nodes=(), edges=(), bumps=()):
+        """
+        Queue new nodes/edges for a vendor; bumps are existing edges with a new weight/count.
+        """
+        with self._lock:
+            entry = self._entry(vendor_id)
+            entry["nodes"].extend(nodes)
+            entry["edges"].extend(edges)
+            for e in bumps:
+                # an edge that is still queued is simply updated in place
+                for queued in reversed(entry["edges"]):
+                    if queued["from"] == e["from"] and queued["to"] == e["to"]:
+                        queued.update(e)
+                        break
+                else:
+                    entry["bumps"][(e["from"], e["to"])] = dict(e)
+            self._queued(len(nodes) + len(edges) + len(bumps))
+
+    def replace(self, vendor_id, nodes, edges):
+        """
+        Queue a full rewrite of a vendor's stored graph (supersedes anything queued before it).
+        """
+        with self._lock:
+            old = self._pending.get(vendor_id)
+            if old:
+                self._n_pending -= len(old["nodes"]) + len(old["edges"]) + len(old["bumps"])
+            self._pending[vendor_id] = {"replace": True, "nodes": list(nodes), "edges": list(edges), "bumps": {}}
+            self._synced.add(vendor_id)
+            self._queued(len(nodes) + len(edges))
+
+    def _ops(self, vendor_id, entry, now):
+        ops = []
+        nodes, edges, B = entry["nodes"], entry["edges"], self.bucket_size
+        if entry["replace"]:
+            ops.append(DeleteMany({"vendorId": vendor_id}))
+            bucket_of = {n["id"]: i // B for i, n in enumerate(nodes)}
+            n_buckets = max(1, -(-len(nodes) // B))
+            bucket_edges = [[] for _ in range(n_buckets)]
+            for e in edges:
+                bucket_edges[min(bucket_of.get(e["to"], n_buckets - 1), n_buckets - 1)].append(e)
+            for b in range(n_buckets):
+                chunk = nodes[b * B:(b + 1) * B]
+                ops.append(InsertOne({"vendorId": vendor_id, "n": len(chunk), "nodes": chunk,
+                                      "edges": bucket_edges[b], "updatedAt": now}))
+            self._fill[vendor_id] = len(nodes) - (n_buckets - 1) * B
+            return ops
+        fill = self._fill.get(vendor_id, 0)
+        i = 0
+        while i < len(nodes) or (i == 0 and edges):
+            take = B - fill if fill < B else B
+            chunk = nodes[i:i + take]
+            i += take
+            push = {"nodes": {"$each": chunk}}
+            if i >= len(nodes) and edges:
+                push["edges"] = {"$each": edges}
+            # fills the vendor's open bucket, or upserts a new one when all are full
+            ops.append(UpdateOne({"vendorId": vendor_id, "n": {"$lt": B}},
+                                 {"$push": push, "$inc": {"n": len(chunk)}, "$set": {"updatedAt": now}}, upsert=True))
+            fill = fill + len(chunk) if fill < B else len(chunk)
+        self._fill[vendor_id] = fill
+        for (u, v), e in entry["bumps"].items():
+            ops.append(UpdateOne({"vendorId": vendor_id, "edges": {"$elemMatch": {"from": u, "to": v}}},
+                                 {"$set": {"edges.$.weight": e["weight"], "edges.$.count": e["count"], "updatedAt": now}}))
+        return ops
+
+    def flush(self):
+        """
+        Write everything queued so far. Returns the number of bulk operations sent.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._n_pending = 0
+            if not pending:
+                return 0
+            now = datetime.utcnow()
+            ops = [op for vid, entry in pending.items() for op in self._ops(vid, entry, now)]
+            t0 = time.perf_counter()
+            try:
+                if ops:
+                    with METRICS.span("bulk_write", endpoint="graph-write-behind"):
+                        self.buckets.bulk_write(ops, ordered=True)
+            except Exception as e:
+                self.metrics["flush_errors"] += 1
+                print("graph_store flush error:", e)
+                # put the batch back in front of anything queued meanwhile
+                with self._lock:
+                    for vid, entry in pending.items():
+                        self._fill.pop(vid, None)
+                        newer = self._pending.get(vid)
+                        if newer and newer["replace"]:
+                            continue
+                        if newer:
+                            entry["nodes"].extend(newer["nodes"])
+                            entry["edges"].extend(newer["edges"])
+                            entry["bumps"].update(newer["bumps"])
+                        self._pending[vid] = entry
+                        self._n_pending += len(entry["nodes"]) + len(entry["edges"]) + len(entry["bumps"])
+                return 0
+            elapsed = time.perf_counter() - t0
+            m = self.metrics
+            m["flushes"] += 1
+            m["ops_written"] += len(ops)
+            m["vendors_flushed"] += len(pending)
+            m["flush_seconds_total"] += elapsed
+            m["flush_seconds_last"] = elapsed
+            m["flush_seconds_max"] = max(m["flush_seconds_max"], elapsed)
+            return len(ops)
+
+    def _pending_copy(self, vendor_id):
+        with self._lock:
+            entry = self._pending.get(vendor_id)
+            return entry and {"replace": entry["replace"], "nodes": list(entry["nodes"]),
+                              "edges": list(entry["edges"]), "bumps": dict(entry["bumps"])}
+
+    @staticmethod
+    def _merge(bucket_docs, legacy_doc, entry):
+        """
+        Assemble a stored graph from its bucket documents (or the legacy document) plus queued writes.
+        """
+        nodes, edges = [], []
+        found = False
+        for doc in bucket_docs:
+            found = True
+            nodes.extend(doc.get("nodes", []))
+            edges.extend(doc.get("edges", []))
+        if not found and legacy_doc:
+            found = True
+            nodes, edges = legacy_doc.get("nodes", []), legacy_doc.get("edges", [])
+        if entry:
+            found = True
+            nodes.extend(entry["nodes"])
+            edges.extend(entry["edges"])
+            if entry["bumps"]:
+                edges = [dict(e, **entry["bumps"].get((e["from"], e["to"]), {})) for e in edges]
+        if not found:
+            return None
+        # buckets are in insertion order; snapshots are ordered by timestamp
+        nodes.sort(key=lambda x: x.get("timestamp"))
+        return {"nodes": nodes, "edges": edges}
+
+    def load(self, vendor_id):
+        """
+        Stored graph for a vendor with queued writes applied, or None if nothing is stored.
+        """
+        entry = self._pending_copy(vendor_id)
+        if entry and entry["replace"]:
+            return {"nodes": entry["nodes"], "edges": entry["edges"]}
+        docs = list(self.buckets.find({"vendorId": vendor_id}).sort("_id", 1))
+        legacy = None
+        if not docs and self.legacy is not None:
+            legacy = self.legacy.find_one({"vendorId": vendor_id})
+        return self._merge(docs, legacy, entry)
+
+    async def load_async(self, adb, vendor_id):
+        """
+        load() over an async database handle (same collection names), for app_async.py.
+        """
+        entry = self._pending_copy(vendor_id)
+        if entry and entry["replace"]:
+            return {"nodes": entry["nodes"], "edges": entry["edges"]}
+        docs = await adb[self.buckets.name].find({"vendorId": vendor_id}).sort("_id", 1).to_list(None)
+        legacy = None
+        if not docs and self.legacy is not None:
+            legacy = await adb[self.legacy.name].find_one({"vendorId": vendor_id})
+        return self._merge(docs, legacy, entry)
+
+    def synced(self, vendor_id):
+        return vendor_id in self._synced
+
+    def stats(self):
+        with self._lock:
+            depth = {"vendors": len(self._pending), "items": self._n_pending}
+        m = dict(self.metrics)
+        m["flush_seconds_avg"] = m["flush_seconds_total"] / m["flushes"] if m["flushes"] else 0.0
+        return {"queue": depth, "flush": m}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="graph-write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+WRITER = GraphWriteBehind(LazyCollection("vendor_graph_buckets"), legacy=LazyCollection("vendor_graphs"))
 
 def save_graph(vendor_id, nodes, edges):
-    db.vendor_graphs.update_one(
-        {"vendorId": vendor_id},
-        {"$set": {"nodes": nodes, "edges": edges, "updatedAt": db.command("serverStatus")}},
-        upsert=True
-    )
+    """
+    Queue a full rewrite of the vendor's stored graph.
+    """
+    WRITER.replace(vendor_id, nodes, edges)
+
+def append_graph(vendor_id, delta, snapshot):
+    """
+    Queue only what changed (delta from DAWG.add_event_incremental). The first write of a vendor
+    after startup stores the full snapshot instead, since the stored copy may predate this process.
+    """
+    if WRITER.synced(vendor_id):
+        WRITER.append(vendor_id, delta["nodes"], delta["edges"], delta["bumps"])
+    else:
+        WRITER.replace(vendor_id, snapshot["nodes"], snapshot["edges"])
 
 def load_graph(vendor_id):
-    doc = db.vendor_graphs.find_one({"vendorId": vendor_id})
-    if not doc:
-        return {"nodes": [], "edges": []}
-    return {"nodes": doc.get("nodes", []), "edges": doc.get("edges", [])}
+    """
+    Returns {"nodes", "edges"} or None when no graph is stored for the vendor.
+    """
+    return WRITER.load(vendor_id)
+
+def flush():
+    return WRITER.flush()
+
+def store_stats():
+    return WRITER.stats()
@@ -0,0 +1,331 @@
+# ml-service/metrics.py
+"""
+In-process latency metrics for the ml-service apps: per-endpoint / per-stage histograms, request
+counters and scrape-time gauges, rendered in the Prometheus text format for GET /metrics.
+
+    with METRICS.span("mongo_insert"):
+        events_collection.insert_one(doc)
+
+records into ml_stage_seconds{endpoint=<current request's route>, stage="mongo_insert"}. The
+endpoint comes from a context variable set by MetricsMiddleware, which Starlette carries into the
+threadpool; background threads pass endpoint= explicitly. A span costs two perf_counter calls, a
+dict lookup and a locked increment. METRICS=0 turns every span into a no-op.
+
+METRICS_PROFILE=1 starts a sampling profiler (SlowRequestProfiler) that keeps the collapsed stacks
+of the METRICS_PROFILE_KEEP slowest requests, served as flame-graph input by GET /metrics/profile.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# seconds; 100us .. 10s covers everything from a dict lookup to a cold Mongo scan
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENDPOINT = contextvars.ContextVar("metrics_endpoint", default="background")
+_REQUEST = contextvars.ContextVar("metrics_request", default=None)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Span:
+    __slots__ = ("metrics", "stage", "endpoint", "t0")
+
+    def __init__(self, metrics, stage, endpoint):
+        self.metrics = metrics
+        self.stage = stage
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        profiler = self.metrics.profiler
+        if profiler is not None:
+            profiler.attach()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe("ml_stage_seconds", (("endpoint", self.endpoint or ENDPOINT.get()), ("stage", self.stage)),
+                             time.perf_counter() - self.t0)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+HELP = {
+    "ml_stage_seconds": ("histogram", "Time spent in one stage of a request or background job"),
+    "ml_request_seconds": ("histogram", "End-to-end HTTP request time by route"),
+    "ml_requests_total": ("counter", "HTTP requests by route and status"),
+}
+
+class Metrics:
+    """
+    Registry of histograms and counters keyed by (name, labels), plus gauge callbacks evaluated
+    at scrape time. Label sets are tuples of (name, value) pairs; keep their values bounded
+    (route templates and stage names, never vendor ids).
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._hist = {}
+        self._counters = {}
+        self._gauges = {}  # name -> (help, fn); fn returns a number or [(labels dict, value)]
+        self._lock = threading.Lock()
+        self.profiler = None
+
+    def start(self):
+        # called from the apps' startup hooks
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def span(self, stage, endpoint=None):
+        return _Span(self, stage, endpoint) if self.enabled else _NO_SPAN
+
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = Histogram()
+            h.observe(seconds)
+
+    def inc(self, name, labels, n=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def gauge(self, name, help, fn):
+        """
+        Register (or replace) a gauge read at scrape time.
+        """
+        self._gauges[name] = (help, fn)
+
+    def snapshot(self):
+        with self._lock:
+            hists = {k: (list(h.counts), h.sum, h.count) for k, h in self._hist.items()}
+            counters = dict(self._counters)
+        return hists, counters
+
+    def render(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        hists, counters = self.snapshot()
+        out = []
+        for name in sorted({k[0] for k in hists}):
+            _help_lines(out, name, *HELP.get(name, ("histogram", name)))
+            for (n, labels), (counts, total, count) in sorted(hists.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                out.append(f"{name}_sum{_labels(labels)} {total!r}")
+                out.append(f"{name}_count{_labels(labels)} {count}")
+        for name in sorted({k[0] for k in counters}):
+            _help_lines(out, name, *HELP.get(name, ("counter", name)))
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    out.append(f"{name}{_labels(labels)} {value}")
+        for name, (help, fn) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception as e:  # a broken gauge must not take /metrics down
+                out.append(f"# gauge {name} failed: {type(e).__name__}: {e}".replace("\n", " "))
+                continue
+            _help_lines(out, name, "gauge", help)
+            samples = value if isinstance(value, list) else [({}, value)]
+            for labels, v in samples:
+                out.append(f"{name}{_labels(tuple(labels.items()))} {float(v)!r}")
+        return "\n".join(out) + "\n"
+
+def _help_lines(out, name, kind, help):
+    out.append(f"# HELP {name} {help}")
+    out.append(f"# TYPE {name} {kind}")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+def quantile_samples(values, quantiles=(0.5, 0.9, 0.99)):
+    """
+    [(labels, value)] gauge samples for quantiles and max of `values` (e.g. per-vendor history
+    lengths), so a distribution is exported without one series per vendor.
+    """
+    values = sorted(values)
+    if not values:
+        return []
+    samples = [({"quantile": str(q)}, values[min(len(values) - 1, int(q * len(values)))]) for q in quantiles]
+    return samples + [({"quantile": "1"}, values[-1])]
+
+class _Request:
+    __slots__ = ("endpoint", "samples", "done", "threads")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.samples = Counter()
+        self.done = False
+        self.threads = set()
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler. Every `interval` seconds a daemon thread reads sys._current_frames()
+    and adds the folded stack of each thread currently working on a request to that request's
+    samples. A thread is tied to a request when the middleware starts it (the event loop thread)
+    and whenever a span is entered (threadpool threads), so for coroutine handlers interleaving on
+    the loop the attribution is approximate. Only the `keep` slowest requests over `min_seconds`
+    are retained.
+    """
+    def __init__(self, interval=0.005, keep=10, min_seconds=0.05):
+        self.interval = float(interval)
+        self.keep = max(1, int(keep))
+        self.min_seconds = float(min_seconds)
+        self._threads = {}  # thread ident -> _Request
+        self._slowest = []  # min-heap of (seconds, seq, endpoint, samples)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="metrics-profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self, endpoint):
+        req = _Request(endpoint)
+        _REQUEST.set(req)
+        self.attach(req)
+        return req
+
+    def attach(self, req=None):
+        req = req or _REQUEST.get()
+        if req is not None and not req.done:
+            tid = threading.get_ident()
+            self._threads[tid] = req
+            req.threads.add(tid)
+
+    def end(self, req, seconds):
+        req.done = True
+        for tid in req.threads:
+            if self._threads.get(tid) is req:
+                self._threads.pop(tid, None)
+        if seconds < self.min_seconds or not req.samples:
+            return
+        entry = (seconds, next(self._seq), req.endpoint, req.samples)
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def _loop(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for tid, req in list(self._threads.items()):
+                frame = frames.get(tid)
+                if frame is not None and tid != me and not req.done:
+                    req.samples[_fold(frame)] += 1
+
+    def folded(self):
+        """
+        Collapsed stacks ("root;frame;...;leaf count" per line) of the slowest requests, slowest
+        first, each under a root frame naming the request; feed to flamegraph.pl or speedscope.
+        """
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        lines = []
+        for seconds, seq, endpoint, samples in slowest:
+            root = f"{endpoint} {seconds * 1000:.1f}ms #{seq}"
+            for stack, n in samples.most_common():
+                lines.append(f"{root};{stack} {n}")
+        return "\n".join(lines) + "\n"
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no extra task per request, unlike BaseHTTPMiddleware): labels the
+    request with its route template ("GET /vendor_graph/{vendor_id}", so vendor ids never become
+    series), records ml_request_seconds / ml_requests_total, and feeds the profiler.
+    Added with app.add_middleware(MetricsMiddleware, router=app.router).
+    """
+    def __init__(self, app, router, metrics=None):
+        self.app = app
+        self.router = router
+        self.metrics = metrics or METRICS
+
+    def endpoint(self, scope):
+        from starlette.routing import Match
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        return f"{scope['method']} unmatched"
+
+    async def __call__(self, scope, receive, send):
+        metrics = self.metrics
+        if scope["type"] != "http" or not metrics.enabled:
+            return await self.app(scope, receive, send)
+        endpoint = self.endpoint(scope)
+        token = ENDPOINT.set(endpoint)
+        profiler = metrics.profiler
+        req = profiler.begin(endpoint) if profiler is not None else None
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            seconds = time.perf_counter() - t0
+            labels = (("endpoint", endpoint),)
+            metrics.observe("ml_request_seconds", labels, seconds)
+            metrics.inc("ml_requests_total", labels + (("status", str(status[0])),))
+            if req is not None:
+                profiler.end(req, seconds)
+            ENDPOINT.reset(token)
+
+METRICS = Metrics(enabled=os.getenv("METRICS", "1") != "0")
+if METRICS.enabled and os.getenv("METRICS_PROFILE", "0") == "1":
+    METRICS.profiler = SlowRequestProfiler(interval=float(os.getenv("METRICS_PROFILE_INTERVAL_MS", 5)) / 1000,
+                                           keep=int(os.getenv("METRICS_PROFILE_KEEP", 10)),
+                                           min_seconds=float(os.getenv("METRICS_PROFILE_MIN_MS", 50)) / 1000)
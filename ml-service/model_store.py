@@ -1,15 +1,226 @@
 # ml-service/model_store.py
+"""
+Versioned model artifacts and a hot-reloading registry.
+
+Layout under MODEL_DIR:
+    versions/<version>/engagement_clf.joblib, risk_reg.joblib, meta.json
+    versions/<version>/engagement_flat.joblib, risk_flat.joblib  -> FlatForest exports (flat_forest.py)
+    CURRENT                       -> name of the active version (replaced atomically)
+    engagement_clf.joblib, ...    -> legacy flat files, used only while CURRENT does not exist
+"""
+import json
 import os
-import joblib
+import shutil
+import threading
+import time
+import uuid
+from collections import namedtuple
 
 MODEL_DIR = os.getenv("MODEL_DIR", "models")
-ENGAGE_MODEL = os.path.join(MODEL_DIR, "engagement_clf.joblib")
-RISK_MODEL = os.path.join(MODEL_DIR, "risk_reg.joblib")
-
-def load_models():
-    m1 = None; m2 = None
-    if os.path.exists(ENGAGE_MODEL):
-        m1 = joblib.load(ENGAGE_MODEL)
-    if os.path.exists(RISK_MODEL):
-        m2 = joblib.load(RISK_MODEL)
-    return m1, m2
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+CURRENT_FILE = os.path.join(MODEL_DIR, "CURRENT")
+ENGAGE_FILE = "engagement_clf.joblib"
+RISK_FILE = "risk_reg.joblib"
+ENGAGE_FLAT_FILE = "engagement_flat.joblib"
+RISK_FLAT_FILE = "risk_flat.joblib"
+ENGAGE_MODEL = os.path.join(MODEL_DIR, ENGAGE_FILE)
+RISK_MODEL = os.path.join(MODEL_DIR, RISK_FILE)
+KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", 5))
+# MODEL_LOAD_SKLEARN=0 loads only the flat exports, so every batch size is scored by FlatForest
+# and the whole model is shared between workers through the page cache
+LOAD_SKLEARN = os.getenv("MODEL_LOAD_SKLEARN", "1") == "1"
+
+# one published version as the scorer sees it; any member may be None
+ModelSet = namedtuple("ModelSet", "version clf reg flat_clf flat_reg")
+
+def version_dir(version):
+    return os.path.join(VERSIONS_DIR, version)
+
+def current_version():
+    """
+    Name of the active version, or None if nothing was published yet.
+    """
+    try:
+        with open(CURRENT_FILE) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions():
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(v for v in os.listdir(VERSIONS_DIR) if not v.startswith("."))
+
+def set_current(version):
+    """
+    Point CURRENT at an existing version (also used to roll back). Readers see either the old
+    or the new name, never a partial file.
+    """
+    if not os.path.isdir(version_dir(version)):
+        raise ValueError(f"unknown model version {version!r}")
+    tmp = f"{CURRENT_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, CURRENT_FILE)
+
+def publish_models(clf, reg, meta=None, flat=None):
+    """
+    Write both models (and their FlatForest exports, if given as a pair) into a new version
+    directory, then make it current. The directory is built under a hidden name and renamed, so
+    a watcher never sees half-written artifacts. Artifacts are dumped uncompressed so they can be
+    loaded with mmap_mode. Returns the version.
+    """
+    import joblib
+    version = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    tmp = os.path.join(VERSIONS_DIR, "." + version)
+    os.makedirs(tmp)
+    joblib.dump(clf, os.path.join(tmp, ENGAGE_FILE))
+    joblib.dump(reg, os.path.join(tmp, RISK_FILE))
+    if flat is not None:
+        joblib.dump(flat[0], os.path.join(tmp, ENGAGE_FLAT_FILE))
+        joblib.dump(flat[1], os.path.join(tmp, RISK_FLAT_FILE))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(dict(meta or {}, version=version, created_at=time.time()), f, default=str)
+    os.rename(tmp, version_dir(version))
+    set_current(version)
+    prune_versions()
+    return version
+
+def prune_versions(keep=KEEP_VERSIONS):
+    """
+    Delete all but the newest `keep` versions; the current one is always kept.
+    """
+    current = current_version()
+    for v in list_versions()[:-keep] if keep > 0 else []:
+        if v != current:
+            shutil.rmtree(version_dir(v), ignore_errors=True)
+
+def _load(path, mmap):
+    if not os.path.exists(path):
+        return None
+    # mmap_mode maps the pickled numpy buffers from the page cache instead of reading them into
+    # private memory, so workers loading the same file share those pages
+    import joblib  # deferred with the model load itself (ML_LAZY_START)
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+def load_models(version=None, mmap=True):
+    """
+    (clf, reg) for `version` (default: the current one), falling back to the legacy flat files
+    when nothing has been published. Missing models are None.
+    """
+    version = version or current_version()
+    base = version_dir(version) if version else MODEL_DIR
+    return _load(os.path.join(base, ENGAGE_FILE), mmap), _load(os.path.join(base, RISK_FILE), mmap)
+
+def load_model_set(version=None, mmap=True, sklearn=None):
+    """
+    ModelSet for `version` (default: the current one). Flat exports are read from disk when the
+    version has them and built from the sklearn models otherwise (legacy files, older versions).
+    sklearn=False skips the sklearn models whenever both flat exports exist.
+    """
+    sklearn = LOAD_SKLEARN if sklearn is None else sklearn
+    version = version or current_version()
+    base = version_dir(version) if version else MODEL_DIR
+    flat_clf = _load(os.path.join(base, ENGAGE_FLAT_FILE), mmap)
+    flat_reg = _load(os.path.join(base, RISK_FLAT_FILE), mmap)
+    clf = reg = None
+    if sklearn or flat_clf is None or flat_reg is None:
+        clf, reg = load_models(version, mmap=mmap)
+    from flat_forest import FlatForest  # loaded with the models, not when the registry is imported
+    if flat_clf is None and clf is not None:
+        flat_clf = FlatForest.from_sklearn(clf)
+    if flat_reg is None and reg is not None:
+        flat_reg = FlatForest.from_sklearn(reg)
+    if not sklearn:
+        clf = reg = None
+    return ModelSet(version, clf, reg, flat_clf, flat_reg)
+
+class ModelRegistry:
+    """
+    Holds the active ModelSet and swaps it when CURRENT changes. A background watcher
+    polls CURRENT every `interval` seconds and loads the new version off the request path; the
+    swap is a single reference assignment, so a request always scores with one consistent pair.
+    on_swap(version) runs after every swap.
+    """
+    def __init__(self, interval=None, mmap=True, on_swap=None):
+        self.interval = float(os.getenv("MODEL_POLL_INTERVAL", 5)) if interval is None else interval
+        self.mmap = mmap
+        self.on_swap = on_swap
+        self.active = ModelSet(None, None, None, None, None)
+        self.ready = threading.Event()  # set once the first load has been attempted
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"swaps": 0, "load_errors": 0, "load_seconds_last": 0.0, "last_error": None, "swapped_at": None}
+
+    @property
+    def version(self):
+        return self.active.version
+
+    @property
+    def models(self):
+        """
+        (clf, reg) from a single read of `active`.
+        """
+        active = self.active
+        return active.clf, active.reg
+
+    def activate(self, version, clf, reg, flat_clf=None, flat_reg=None):
+        self.active = ModelSet(version, clf, reg, flat_clf, flat_reg)
+        self.metrics["swaps"] += 1
+        self.metrics["swapped_at"] = time.time()
+        if self.on_swap:
+            self.on_swap(version)
+
+    def load(self):
+        """
+        Load CURRENT (or the legacy files) if it differs from the active version. Returns True
+        if a swap happened; a failed load keeps the previous models.
+        """
+        with self._load_lock:
+            try:
+                version = current_version()
+                if self.metrics["swaps"] and version == self.version:
+                    return False
+                t0 = time.perf_counter()
+                try:
+                    models = load_model_set(version, mmap=self.mmap)
+                except Exception as e:
+                    self.metrics["load_errors"] += 1
+                    self.metrics["last_error"] = f"{version}: {e}"
+                    print("Model load failed, keeping", self.version, ":", e)
+                    return False
+                self.metrics["load_seconds_last"] = round(time.perf_counter() - t0, 4)
+                self.activate(*models)
+                print("Models active:", version or "legacy", f"({self.metrics['load_seconds_last']} s)")
+                return True
+            finally:
+                self.ready.set()
+
+    def ensure_loaded(self):
+        """
+        First-use load for a registry that was not loaded at import (ML_LAZY_START=1); a no-op
+        once the first load has been attempted.
+        """
+        if not self.ready.is_set():
+            self.load()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.load()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return dict(self.metrics, version=self.version, current=current_version(), versions=list_versions(),
+                    **{k: v is not None for k, v in self.active._asdict().items() if k != "version"},
+                    mmap=self.mmap, interval=self.interval)
@@ -0,0 +1,58 @@
+# ml-service/mongo.py
+import os
+import threading
+from pymongo import MongoClient
+
+# One pooled client per process, shared by app.py, graph_store.py and the async app. The database
+# comes from the URI path and defaults to vendorbgac.
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/vendorbgac")
+MONGO_DB = "vendorbgac"
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", 60000)),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+}
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            _client = MongoClient(MONGO_URI, **POOL_OPTIONS)
+        return _client
+
+def get_db():
+    return get_client().get_default_database(MONGO_DB)
+
+class LazyCollection:
+    """
+    A collection of the default database that creates the shared client on its first use, so a
+    module can hold one at import time without connecting (ML_LAZY_START cold starts).
+    """
+    def __init__(self, name):
+        self.name = name
+        self._collection = None
+
+    def __getattr__(self, attr):
+        collection = self._collection
+        if collection is None:
+            collection = self._collection = get_db()[self.name]
+        return getattr(collection, attr)
+
+def get_async_client():
+    """
+    Shared asyncio client (pymongo's native async API, pymongo >= 4.9), created on first use.
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            from pymongo import AsyncMongoClient
+            _async_client = AsyncMongoClient(MONGO_URI, **POOL_OPTIONS)
+        return _async_client
+
+def get_async_db():
+    return get_async_client().get_default_database(MONGO_DB)
@@ -0,0 +1,108 @@
+# ml-service/result_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Bounded LRU + TTL cache of scored vendor results, keyed by vendor and a version token
+    (a get with a different version is a miss). With a redis_url, entries are also written to
+    Redis so several uvicorn workers share hits; Redis is optional and failures only count as misses.
+    """
+    def __init__(self, maxsize=10000, ttl=30.0, redis_url=None, prefix="vendor_graph:"):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.prefix = prefix
+        self._data = OrderedDict()  # key -> (expires_at, version, value)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0,
+                         "redis_hits": 0, "redis_errors": 0}
+        self.redis = None
+        if redis_url:
+            try:
+                import redis
+                self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.05, socket_connect_timeout=0.05)
+            except ImportError:
+                print("REDIS_URL is set but the redis package is not installed; using the in-process cache only")
+
+    def _local_get(self, key, version):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._data[key]
+                self.counters["expirations"] += 1
+                return None
+            if entry[1] != version:
+                return None
+            self._data.move_to_end(key)
+            return entry[2]
+
+    def _local_put(self, key, version, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def get(self, key, version):
+        value = self._local_get(key, version)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self.prefix + key)
+                if raw is not None:
+                    doc = json.loads(raw)
+                    if doc.get("version") == version:
+                        self._local_put(key, version, doc["value"])
+                        self.counters["hits"] += 1
+                        self.counters["redis_hits"] += 1
+                        return doc["value"]
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                print("result cache redis get failed:", e)
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key, version, value):
+        self._local_put(key, version, value)
+        if self.redis is not None:
+            try:
+                self.redis.set(self.prefix + key, json.dumps({"version": version, "value": value}),
+                               px=max(1, int(self.ttl * 1000)))
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                print("result cache redis set failed:", e)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.counters["invalidations"] += 1
+        if self.redis is not None and keys:
+            try:
+                self.redis.delete(*[self.prefix + k for k in keys])
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                print("result cache redis delete failed:", e)
+
+    def clear(self):
+        """
+        Drop every local entry; Redis entries carry a version and expire on their own TTL.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        c = dict(self.counters)
+        lookups = c["hits"] + c["misses"]
+        c["hit_rate"] = c["hits"] / lookups if lookups else 0.0
+        return {"size": size, "maxsize": self.maxsize, "ttl": self.ttl, "redis": self.redis is not None, **c}
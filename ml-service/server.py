@@ -1,13 +1,15 @@
 import os
-from fastapi import FastAPI
+import threading
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict, List
-import torch
-import torch.nn.functional as F
-from torch_geometric.nn import GCNConv
 from fastapi.middleware.cors import CORSMiddleware
-from torch_geometric.data import Data
 import time  # --- 1. ADDED IMPORT ---
+from storage import VendorStateDB, load_legacy_state
+from decay import ENGAGEMENT_RATE, DecayedScores, factor
+from metrics import METRICS, MetricsMiddleware, quantile_samples
+from startup import LAZY_START, Readiness, add_health_routes
 
 app = FastAPI()
 
@@ -18,34 +20,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, router=app.router)
 
-# -------- REAL GNN MODEL -------- #
-
-class FraudGNN(torch.nn.Module):
-    def __init__(self):
-        super(FraudGNN, self).__init__()
-        # --- 2. CHANGED GNN INPUT ---
-        # Input features are now 2 (event_type, engagement_score)
-        self.conv1 = GCNConv(2, 8) 
-        self.conv2 = GCNConv(8, 1)
-
-    def forward(self, x, edge_index):
-        x = self.conv1(x, edge_index)
-        x = torch.relu(x)
-        x = self.conv2(x, edge_index)
-        return torch.sigmoid(x)
-
-model = FraudGNN()
-optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+READINESS = Readiness()
+add_health_routes(app, READINESS)
 
 # -------- MEMORY -------- #
 
-vendor_events: Dict[str, List[str]] = {}
-# --- 2. UPDATED MEMORY ---
-vendor_engagement: Dict[str, float] = {}      # Replaced vendor_score
-vendor_last_event_time: Dict[str, float] = {} # New: To track time
-# Removed vendor_decay
-
 EVENT_MAP = {
     "send": 0,
     "sign": 1,
@@ -56,8 +37,61 @@ EVENT_MAP = {
 
 # Constants for the new formula
 ENGAGEMENT_BOOST = 0.1   # Amount score increases per event
-ENGAGEMENT_DECAY_RATE = 0.99 # Multiplier per second (0.99 = 1% decay per sec)
+# Decay: x0.99 per second, as decay.ENGAGEMENT_RATE (exp of a precomputed log-rate, no pow per event)
+
+# (engagement, last event time) of every vendor, resident or spilled, for /top_engaged; decayed at read time
+engagement_scores = DecayedScores(ENGAGEMENT_RATE)
+
+# -------- REAL GNN MODEL -------- #
 
+# model, optimizer, trainer, vendor_tensors and vendor_state need torch / torch_geometric, which
+# take seconds to import. load_runtime() builds them: at import by default, or as a background
+# warm-up step with ML_LAZY_START=1 (handlers and `server.<name>` load them on first use).
+RUNTIME_NAMES = ("model", "optimizer", "trainer", "vendor_tensors", "vendor_state")
+_runtime_lock = threading.Lock()
+_runtime_loaded = False
+
+def load_runtime():
+    global torch, model, optimizer, trainer, vendor_tensors, vendor_state, _runtime_loaded
+    if _runtime_loaded:
+        return
+    with _runtime_lock:
+        if _runtime_loaded:
+            return
+        import torch  # binds the module global (used by the handlers)
+        from gnn_model import FraudGNN
+        from gnn_tensors import VendorTensorStore
+        from gnn_trainer import BackgroundTrainer
+        from vendor_state import VendorStateStore
+
+        model = FraudGNN()
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+
+        # Training runs on a background thread in mini-batches (gnn_trainer.py); requests score with the
+        # trainer's read-only inference copy, refreshed every GNN_PUBLISH_EVERY optimizer steps.
+        trainer = BackgroundTrainer(model, optimizer,
+                                    batch_size=int(os.getenv("GNN_TRAIN_BATCH", 32)),
+                                    max_queue=int(os.getenv("GNN_TRAIN_QUEUE", 10000)),
+                                    publish_every=int(os.getenv("GNN_PUBLISH_EVERY", 10)),
+                                    linger=float(os.getenv("GNN_TRAIN_LINGER", 0.05)))
+
+        # Per-vendor x / edge_index buffers appended in place (gnn_tensors.py); scoring only runs the model
+        # over the newest event's receptive field. GNN_MAX_HISTORY > 0 bounds the events kept per vendor.
+        vendor_tensors = VendorTensorStore(num_layers=2, max_history=int(os.getenv("GNN_MAX_HISTORY", 0)))
+
+        # Per-vendor engagement / last event time / event codes (vendor_state.py). Above GNN_STATE_MEMORY_MB
+        # of resident state, cold vendors spill to the SQLite file GNN_STATE_DB and are reloaded on their next event.
+        vendor_state = VendorStateStore(VendorStateDB(os.getenv("GNN_STATE_DB", "gnn_state.db")), vendor_tensors, EVENT_MAP,
+                                        memory_budget=int(float(os.getenv("GNN_STATE_MEMORY_MB", 256)) * 2 ** 20))
+        register_gauges()
+        _runtime_loaded = True
+
+def __getattr__(name):
+    # module attribute access (benchmarks, tests) before the lazy warm-up has run
+    if name in RUNTIME_NAMES:
+        load_runtime()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class Event(BaseModel):
     vendorId: str
@@ -65,85 +99,156 @@ class Event(BaseModel):
     metadata: dict = {}
 
 def build_graph(vendor: str):
-    events = vendor_events[vendor]
-    x = []
-    edges = []
-
-    # Get the current engagement score for this vendor
-    current_engagement = vendor_engagement.get(vendor, 0.1)
-
-    for i, evt in enumerate(events):
-        evt_idx = EVENT_MAP.get(evt, 0)
-        # --- 3. UPDATED FEATURES ---
-        x.append([evt_idx, current_engagement]) # Features: event_type, engagement
-        if i > 0:
-            edges.append([i - 1, i])
-
-    x = torch.tensor(x, dtype=torch.float32)
-    edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous() if edges else torch.tensor([[0],[0]])
-    return Data(x=x, edge_index=edge_index)
+    # full-history graph with every node carrying the current engagement (scoring uses window())
+    load_runtime()
+    st = vendor_state.get(vendor)
+    return vendor_tensors.full(vendor, st.engagement if st else 0.1)
+
+def import_legacy_state():
+    # one-time import of the old gnn_state.pkl ({vendorId: [event dicts]}) into an empty state DB
+    load_runtime()
+    db = vendor_state.db
+    legacy = load_legacy_state()
+    if not legacy or db.count():
+        return
+    now = time.time()
+    db.put_many((vid, 0.1, now, [vendor_state.code(e.get("eventType")) for e in events]) for vid, events in legacy.items())
+    print(f"[ML] imported {len(legacy)} vendors from the legacy state file")
+
+def restore_state():
+    import_legacy_state()
+    for vid, engagement, last_time in vendor_state.db.scores():
+        engagement_scores.set(vid, engagement, last_time)
+
+@app.on_event("startup")
+def start_trainer():
+    METRICS.start()
+    READINESS.run_all([("gnn_runtime", load_runtime), ("state", restore_state), ("trainer", lambda: trainer.start())])
+
+@app.on_event("shutdown")
+def stop_trainer():
+    if _runtime_loaded:
+        trainer.stop()
+        vendor_state.spill_all()
+
+@app.get("/top_engaged")
+def top_engaged(n: int = 10):
+    """
+    The n vendors with the highest engagement right now (decayed to the current time).
+    """
+    return [{"vendorId": vid, "engagement": round(e, 4)} for vid, e in engagement_scores.top(n, time.time())]
+
+@app.get("/state_stats")
+def state_stats():
+    load_runtime()
+    return vendor_state.gauges()
+
+@app.get("/trainer_stats")
+def trainer_stats():
+    load_runtime()
+    return {**trainer.stats, "queue_depth": trainer.queue.qsize()}
+
+def register_gauges():
+    # registered by load_runtime, so a scrape never forces the torch import
+    METRICS.gauge("gnn_vendors_resident", "Vendors whose state is in memory", lambda: len(vendor_tensors))
+    METRICS.gauge("gnn_vendors_on_disk", "Vendors in the SQLite state DB", lambda: vendor_state.db.count())
+    METRICS.gauge("gnn_vendor_history_events", "Events per resident vendor (quantile 1 = max)",
+                  lambda: quantile_samples(vendor_tensors.history_lengths()))
+    METRICS.gauge("gnn_model_version", "Inference model copies published by the trainer", lambda: trainer.stats["published_version"])
+    METRICS.gauge("gnn_train_queue_depth", "Samples waiting for the background trainer", lambda: trainer.queue.qsize())
+    METRICS.gauge("gnn_train_dropped", "Samples dropped because the trainer queue was full", lambda: trainer.stats["dropped"])
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus text format: per-route request histograms, per-stage spans (state, build_graph,
+    forward on /add_event; build_graph, forward, backward, optimizer on gnn-trainer) and gauges.
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profile")
+def metrics_profile():
+    if METRICS.profiler is None:
+        raise HTTPException(status_code=404, detail="profiler disabled; start with METRICS_PROFILE=1")
+    return PlainTextResponse(METRICS.profiler.folded())
 
 @app.get("/")
 def home():
     return {"status": "GNN ML Service Running ✅"}
 
+# VendorStateStore and VendorTensorStore are not thread-safe; apply_event runs in the threadpool,
+# so this keeps their updates one request at a time, as they were on the event loop
+_state_lock = threading.Lock()
+
+def apply_event(vendor, event_type, current_time):
+    """
+    /add_event's state step: the vendor's event history, engagement and scoring window, updated
+    under _state_lock. Returns (engagement, seconds since the previous event, window, event names).
+    """
+    with _state_lock:
+        with METRICS.span("state"):
+            st = vendor_state.get(vendor)
+            if st is None:
+                st = vendor_state.create(vendor, 0.1, current_time)
+
+            vendor_state.append_event(vendor, st, event_type)
+
+        # --- 4. NEW ENGAGEMENT FORMULA ---
+        
+        # 1. Calculate time decay
+        last_time = st.last_time
+        time_delta_seconds = current_time - last_time
+        
+        # Apply exponential decay for every second passed
+        # score = score * exp(-ENGAGEMENT_RATE * num_seconds)  (= 0.99 ^ num_seconds)
+        decay_factor = factor(time_delta_seconds, ENGAGEMENT_RATE)
+        current_engagement = st.engagement * decay_factor
+        
+        # 2. Add the event boost
+        new_engagement = current_engagement + ENGAGEMENT_BOOST
+        
+        # 3. Cap the score at 1.0
+        st.engagement = min(new_engagement, 1.0)
+        
+        # 4. Update the last event time
+        st.last_time = current_time
+        engagement_scores.set(vendor, st.engagement, current_time)
+        
+        # --- END OF NEW FORMULA ---
+
+        with METRICS.span("build_graph"):
+            data = vendor_tensors.window(vendor, st.engagement)
+        return st.engagement, time_delta_seconds, data, vendor_state.events(vendor)
+
 @app.post("/add_event")
 async def log_event(event: Event):
+    if not _runtime_loaded:
+        # request before the lazy warm-up got there: load now, off the event loop
+        await run_in_threadpool(load_runtime)
     vendor = event.vendorId
-    current_time = time.time()
-
-    if vendor not in vendor_events:
-        vendor_events[vendor] = []
-        vendor_engagement[vendor] = 0.1
-        vendor_last_event_time[vendor] = current_time
-    
-    vendor_events[vendor].append(event.eventType)
-
-    # --- 4. NEW ENGAGEMENT FORMULA ---
-    
-    # 1. Calculate time decay
-    last_time = vendor_last_event_time[vendor]
-    time_delta_seconds = current_time - last_time
-    
-    # Apply exponential decay for every second passed
-    # score = score * (0.99 ^ num_seconds)
-    decay_factor = ENGAGEMENT_DECAY_RATE ** time_delta_seconds
-    current_engagement = vendor_engagement[vendor] * decay_factor
-    
-    # 2. Add the event boost
-    new_engagement = current_engagement + ENGAGEMENT_BOOST
-    
-    # 3. Cap the score at 1.0
-    vendor_engagement[vendor] = min(new_engagement, 1.0)
-    
-    # 4. Update the last event time
-    vendor_last_event_time[vendor] = current_time
-    
-    # --- END OF NEW FORMULA ---
-
-    data = build_graph(vendor)
-
-    model.train()
-    optimizer.zero_grad()
-
-    out = model(data.x, data.edge_index)
+    # the state step can read or spill vendors to the SQLite VendorStateDB, so it runs off the event loop
+    engagement, time_delta_seconds, data, events = await run_in_threadpool(apply_event, vendor, event.eventType, time.time())
+
+    with METRICS.span("forward"), torch.no_grad():
+        out = trainer.inference_model(data.x, data.edge_index)
     score = out[-1].item()
 
     # Inverted logic: 0.0 for fraud, 1.0 for normal
     label = 0.0 if event.eventType == "fraud_alert" else 1.0
-    loss = F.binary_cross_entropy(out[-1], torch.tensor([label]))
-
-    loss.backward()
-    optimizer.step()
+    trainer.submit(data, label)
+    loss = trainer.stats["last_loss"]
 
-    print(f"[ML] vendor={vendor} event={event.eventType} score={score:.4f} loss={loss.item():.4f}")
+    print(f"[ML] vendor={vendor} event={event.eventType} score={score:.4f} loss={loss}")
 
     return {
         "vendorId": vendor,
         "event": event.eventType,
-        "events": vendor_events[vendor],
+        "events": events,
         "gnn_score": round(score, 4),
-        "engagement": round(vendor_engagement[vendor], 4), # Changed from decay
+        "engagement": round(engagement, 4), # Changed from decay
         "time_since_last_event": round(time_delta_seconds, 2),
-        "loss": float(loss.item())
-    }
\ No newline at end of file
+        "loss": loss  # latest background training loss (None until the first step)
+    }
+
+if not LAZY_START:
+    load_runtime()
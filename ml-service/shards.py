@@ -0,0 +1,227 @@
+# ml-service/shards.py
+"""
+Vendor-partitioned DAWG. Vendors are hash-assigned to N shard processes; each owns the slice of
+DynamicAdaptiveWeightedGraph for its vendors and its own scorer (bgac_model with its own
+ModelRegistry watcher). ShardRouter, in the API process, forwards each call to the owning shard
+over a multiprocessing pipe and scatters batch operations to all shards at once.
+"""
+import os
+import threading
+import time
+import zlib
+from multiprocessing import get_context
+from metrics import METRICS, quantile_samples
+
+def shard_for(vendor_id, n_shards):
+    # stable across processes and restarts (unlike hash() on str)
+    return zlib.crc32(str(vendor_id).encode()) % n_shards
+
+class DawgShard:
+    """
+    State and operations of one shard, inside its process. Method names are the IPC ops.
+    """
+    def __init__(self, index, backend):
+        from graph_builder import DynamicAdaptiveWeightedGraph
+        import bgac_model
+        self.index = index
+        self.dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+        self.bgac = bgac_model
+        bgac_model.REGISTRY.ensure_loaded()
+        bgac_model.REGISTRY.start()
+
+    def add_events(self, events, snapshot_for=(), presorted=False):
+        """
+        Apply events (see DAWG.add_events_bulk); returns ({vendorId: delta}, {vendorId: snapshot})
+        with snapshots only for the vendors in snapshot_for.
+        """
+        deltas = self.dawg.add_events_bulk(events, presorted=presorted)
+        return deltas, {vid: self.dawg.snapshot_for_vendor(vid) for vid in snapshot_for if vid in deltas}
+
+    def add_event(self, event, exact):
+        delta = self.dawg.add_event_incremental(event)
+        vid = event["vendorId"]
+        feats = self.dawg.vendor_features(vid, exact=exact)
+        return {"delta": delta, "snapshot": self.dawg.snapshot_for_vendor(vid),
+                "score": self.bgac.score_graph_snapshot_ml({}, features=feats)}
+
+    def last_event_id(self, vendor_id):
+        last = self.dawg.last_event_by_vendor.get(vendor_id)
+        return last["_id"] if last else None
+
+    def snapshot(self, vendor_id):
+        return self.dawg.snapshot_for_vendor(vendor_id)
+
+    def vendor_graph(self, vendor_id, exact):
+        snapshot = self.dawg.snapshot_for_vendor(vendor_id)
+        if not snapshot["nodes"]:
+            return None
+        feats = self.dawg.vendor_features(vendor_id, exact=exact)
+        return {"graph": snapshot, "score": self.bgac.score_graph_snapshot_ml({}, features=feats)}
+
+    def score_vendors(self, vendor_ids, exact):
+        feats = [self.dawg.vendor_features(vid, exact=exact) for vid in vendor_ids]
+        return self.bgac.score_graph_snapshots_ml([{}] * len(feats), feats)
+
+    def stats(self):
+        return {"shard": self.index, "pid": os.getpid(), "nodes": self.dawg.store.number_of_nodes(),
+                "edges": self.dawg.store.number_of_edges(), "vendors": len(self.dawg.last_event_by_vendor),
+                "history": quantile_samples(self.dawg.vendor_history_lengths()),
+                "model_version": self.bgac.REGISTRY.version}
+
+def shard_main(index, backend, conn):
+    """
+    Shard process loop: (op, args) requests in, (ok, result or error text) replies out, until None.
+    """
+    shard = DawgShard(index, backend)
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        op, args = msg
+        try:
+            conn.send((True, getattr(shard, op)(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+class ShardRouter:
+    """
+    Starts n_shards shard processes and routes calls to them. One request is in flight per shard
+    (a lock per pipe), so calls for different shards run in parallel and calls for one shard queue.
+    Also exposes the `lock` / `add_events_bulk` pair DawgWarmup and load_vendor use, so the
+    warm-up streams history once and scatters it to the shards.
+    """
+    def __init__(self, n_shards, backend="networkx"):
+        self.n_shards = max(1, int(n_shards))
+        self.backend = backend
+        self.lock = threading.RLock()
+        self._conns = []
+        self._locks = []
+        self._procs = []
+        self.metrics = {"calls": 0, "scatters": 0, "errors": 0}
+
+    def start(self):
+        if self._procs:
+            return
+        ctx = get_context("spawn")
+        for i in range(self.n_shards):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=shard_main, args=(i, self.backend, child), name=f"dawg-shard-{i}", daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._locks.append(threading.Lock())
+            self._procs.append(proc)
+        print(f"DAWG shards started: {self.n_shards} ({self.backend} backend)")
+
+    def stop(self):
+        for conn, lock in zip(self._conns, self._locks):
+            with lock:
+                try:
+                    conn.send(None)
+                except (OSError, BrokenPipeError):
+                    pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._conns, self._locks, self._procs = [], [], []
+
+    def shard_for(self, vendor_id):
+        return shard_for(vendor_id, self.n_shards)
+
+    def _reply(self, shard):
+        try:
+            ok, result = self._conns[shard].recv()
+        except EOFError:
+            self.metrics["errors"] += 1
+            raise RuntimeError(f"DAWG shard {shard} is gone")
+        if not ok:
+            self.metrics["errors"] += 1
+            raise RuntimeError(f"DAWG shard {shard}: {result}")
+        return result
+
+    def call(self, shard, op, *args):
+        # round trip including the wait for the shard's pipe and the shard's own work
+        with METRICS.span("shard_call"), self._locks[shard]:
+            self.metrics["calls"] += 1
+            self._conns[shard].send((op, args))
+            return self._reply(shard)
+
+    def call_vendor(self, vendor_id, op, *args):
+        return self.call(self.shard_for(vendor_id), op, vendor_id, *args)
+
+    def scatter(self, requests):
+        """
+        {shard: (op, args)} -> {shard: result}. Every request is sent before any reply is read,
+        so the shards work concurrently; locks are taken in shard order to avoid deadlocks.
+        """
+        with METRICS.span("shard_scatter"):
+            return self._scatter(requests)
+
+    def _scatter(self, requests):
+        shards = sorted(requests)
+        for s in shards:
+            self._locks[s].acquire()
+        try:
+            self.metrics["scatters"] += 1
+            for s in shards:
+                op, args = requests[s]
+                self._conns[s].send((op, args))
+            results, error = {}, None
+            for s in shards:
+                # drain every reply even after a failure, so no pipe is left with a stale answer
+                try:
+                    results[s] = self._reply(s)
+                except RuntimeError as e:
+                    error = error or e
+            if error:
+                raise error
+            return results
+        finally:
+            for s in shards:
+                self._locks[s].release()
+
+    def partition(self, items, key):
+        parts = {}
+        for item in items:
+            parts.setdefault(self.shard_for(key(item)), []).append(item)
+        return parts
+
+    def add_events(self, events, snapshot_for=(), presorted=False):
+        """
+        Scatter events to their shards; returns merged ({vendorId: delta}, {vendorId: snapshot}).
+        Partitioning keeps the events' relative order, so presorted input stays presorted.
+        """
+        wanted = set(snapshot_for)
+        parts = self.partition(events, lambda e: e["vendorId"])
+        requests = {s: ("add_events", (part, [v for v in {e["vendorId"] for e in part} if v in wanted], presorted))
+                    for s, part in parts.items()}
+        deltas, snapshots = {}, {}
+        for d, snaps in self.scatter(requests).values():
+            deltas.update(d)
+            snapshots.update(snaps)
+        return deltas, snapshots
+
+    def add_events_bulk(self, events, presorted=False):
+        # DawgWarmup / load_vendor entry point
+        return self.add_events(events, presorted=presorted)[0]
+
+    def score_vendors(self, vendor_ids, exact):
+        """
+        Scores in vendor_ids order, each shard scoring its own vendors in one batch.
+        """
+        parts = self.partition(range(len(vendor_ids)), lambda i: vendor_ids[i])
+        results = self.scatter({s: ("score_vendors", ([vendor_ids[i] for i in idx], exact)) for s, idx in parts.items()})
+        scores = [None] * len(vendor_ids)
+        for s, idx in parts.items():
+            for i, sc in zip(idx, results[s]):
+                scores[i] = sc
+        return scores
+
+    def stats(self):
+        t0 = time.perf_counter()
+        shards = self.scatter({s: ("stats", ()) for s in range(self.n_shards)}) if self._procs else {}
+        return {"shards": [shards[s] for s in sorted(shards)], "alive": [p.is_alive() for p in self._procs],
+                "round_trip_ms": round((time.perf_counter() - t0) * 1000, 3), **self.metrics}
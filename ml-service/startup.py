@@ -0,0 +1,102 @@
+# ml-service/startup.py
+"""
+Cold-start support shared by app.py and server.py.
+
+ML_LAZY_START=1 defers the heavy parts of start-up (model unpickling, torch / torch_geometric)
+to warm-up steps that run on a background thread after the app is serving, instead of at import
+or inside the startup hook; anything that needs them before then loads them on first use.
+Without it the same steps run synchronously in the startup hook, as before. Steps marked
+blocking (app.py's DAWG restore, which must not race requests) run in the hook in both modes.
+
+Either way /healthz (liveness) answers as soon as the process serves HTTP, and /readyz
+(readiness) returns 503 until every warm-up step has finished, so an orchestrator can send
+traffic only to warm workers without restarting slow ones.
+"""
+import os
+import threading
+import time
+
+LAZY_START = os.getenv("ML_LAZY_START", "0") == "1"
+_T0 = time.time()  # ~ interpreter start: this module is imported by the apps' first lines
+
+class Readiness:
+    """
+    Named warm-up steps and their state (pending / running / done / error). Ready while every
+    registered step is done (recomputed on each change, so registering a step unreadies the worker);
+    a failed step keeps the worker unready and reports its error.
+    """
+    def __init__(self):
+        self.steps = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.ready_at = None
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self.steps.setdefault(name, {"state": "pending", "seconds": None, "error": None}).update(fields)
+            if not all(s["state"] == "done" for s in self.steps.values()):
+                self.ready_at = None
+            elif self.ready_at is None:
+                self.ready_at = time.time()
+
+    def run(self, name, fn):
+        self._set(name, state="running")
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self._set(name, state="error", seconds=round(time.perf_counter() - t0, 3), error=f"{type(e).__name__}: {e}")
+            print(f"warm-up step {name} failed:", e)
+            return False
+        self._set(name, state="done", seconds=round(time.perf_counter() - t0, 3))
+        return True
+
+    def run_all(self, steps, background=LAZY_START):
+        """
+        Run [(name, fn)] or [(name, fn, blocking)] in order; every step is registered before any
+        runs. Blocking steps always run in the caller, the others on a daemon thread when
+        `background`. A failed step does not stop the ones after it.
+        """
+        steps = [(s[0], s[1], len(s) > 2 and s[2]) for s in steps]
+        for name, _, _ in steps:
+            self._set(name)
+        for name, fn, blocking in steps:
+            if blocking or not background:
+                self.run(name, fn)
+        deferred = [(name, fn) for name, fn, blocking in steps if background and not blocking]
+        if not deferred:
+            return
+
+        def run():
+            for name, fn in deferred:
+                self.run(name, fn)
+        self._thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    def status(self):
+        with self._lock:
+            steps = {k: dict(v) for k, v in self.steps.items()}
+        return {"ready": self.ready, "lazy_start": LAZY_START, "uptime": round(time.time() - _T0, 3),
+                "ready_after": round(self.ready_at - _T0, 3) if self.ready_at else None, "steps": steps}
+
+def add_health_routes(app, readiness):
+    from fastapi.responses import JSONResponse
+
+    @app.get("/healthz")
+    def healthz():
+        """
+        Liveness: the process is up and serving. Never touches models, Mongo or the DAWG.
+        """
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    def readyz():
+        """
+        Readiness: 200 once every warm-up step has finished, 503 (with the steps' state) before.
+        """
+        status = readiness.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
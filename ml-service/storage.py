@@ -1,13 +1,95 @@
+# ml-service/storage.py
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from array import array
 
-import pickle, os
+# On-disk vendor state for server.py (spill target of vendor_state.VendorStateStore): one SQLite
+# row per vendor, event history as a little-endian uint16 code blob, event-type names in their own table.
+STATE_DB = os.getenv("GNN_STATE_DB", "gnn_state.db")
+LEGACY_STATE_FILE = "gnn_state.pkl"  # previous format: pickle of {vendorId: [event dicts]}
 
-STATE_FILE = "gnn_state.pkl"
+_BIG_ENDIAN = sys.byteorder == "big"
 
-def save_state(data):
-    with open(STATE_FILE, "wb") as f:
-        pickle.dump(data, f)
+def encode_codes(codes):
+    a = array("H", codes)
+    if _BIG_ENDIAN:
+        a.byteswap()
+    return a.tobytes()
 
-def load_state():
-    if not os.path.exists(STATE_FILE):
+def decode_codes(blob):
+    a = array("H")
+    a.frombytes(blob or b"")
+    if _BIG_ENDIAN:
+        a.byteswap()
+    return a
+
+class VendorStateDB:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS vendors (vendor_id TEXT PRIMARY KEY, engagement REAL NOT NULL, "
+                          "last_time REAL NOT NULL, codes BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS event_types (code INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        self.conn.commit()
+
+    def event_types(self):
+        with self._lock:
+            return dict(self.conn.execute("SELECT name, code FROM event_types"))
+
+    def put_event_type(self, name, code):
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO event_types (code, name) VALUES (?, ?)", (code, name))
+            self.conn.commit()
+
+    def put_many(self, rows):
+        """
+        rows: iterable of (vendor_id, engagement, last_time, codes)
+        """
+        rows = [(v, e, t, encode_codes(c)) for v, e, t, c in rows]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO vendors VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def get(self, vendor_id):
+        """
+        Returns (engagement, last_time, codes) or None.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT engagement, last_time, codes FROM vendors WHERE vendor_id = ?",
+                                    (vendor_id,)).fetchone()
+        return row and (row[0], row[1], decode_codes(row[2]))
+
+    def scores(self):
+        """
+        (vendor_id, engagement, last_time) for every stored vendor.
+        """
+        with self._lock:
+            return self.conn.execute("SELECT vendor_id, engagement, last_time FROM vendors").fetchall()
+
+    def delete(self, vendor_id):
+        with self._lock:
+            self.conn.execute("DELETE FROM vendors WHERE vendor_id = ?", (vendor_id,))
+            self.conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM vendors").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def load_legacy_state(path=LEGACY_STATE_FILE):
+    """
+    {vendorId: [event dicts]} from the old pickle file, or {} if there is none.
+    """
+    if not os.path.exists(path):
         return {}
-    return pickle.load(open(STATE_FILE, "rb"))
+    with open(path, "rb") as f:
+        return pickle.load(f)
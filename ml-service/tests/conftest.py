@@ -0,0 +1,6 @@
+# ml-service/tests/conftest.py
+# the service modules are flat top-level modules of ml-service/ (as uvicorn imports them)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,93 @@
+# ml-service/tests/test_bayes_model.py
+"""
+bayes_model.TransitionModel: batch log-space scoring against a per-transition loop over the
+smoothed probabilities, the legacy nested-dict counts, and the save/load round trip.
+"""
+import math
+import random
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from bayes_model import DEFAULT_PRIOR, TransitionModel, priors
+
+LABELS = list(priors) + ["publish", "fraud_alert"]
+
+@pytest.fixture(scope="module")
+def paths():
+    rng = random.Random(0)
+    # includes empty and single-event paths, which have no transitions
+    return [[rng.choice(LABELS) for _ in range(rng.randint(0, 60))] for _ in range(300)]
+
+@pytest.fixture(scope="module")
+def model(paths):
+    model = TransitionModel(priors=priors)
+    model.update_transitions(paths)
+    return model
+
+def loop_log_likelihood(model, path):
+    k = model.n_labels
+    return sum(math.log((model.counts[model.index[a], model.index[b]] + model.alpha)
+                        / (model.counts[model.index[a]].sum() + model.alpha * k))
+               + math.log(priors.get(b, DEFAULT_PRIOR)) for a, b in zip(path, path[1:]))
+
+def test_counts_match_the_legacy_nested_dicts(model, paths):
+    transition_counts = defaultdict(lambda: defaultdict(int))
+    for path in paths:
+        for a, b in zip(path, path[1:]):
+            transition_counts[a][b] += 1
+    for a in LABELS:
+        for b in LABELS:
+            assert model.counts[model.index[a], model.index[b]] == transition_counts[a][b]
+
+def test_update_transition_matches_bulk_update(model, paths):
+    one_by_one = TransitionModel(priors=priors)
+    for path in paths:
+        for a, b in zip(path, path[1:]):
+            one_by_one.update_transition(a, b)
+    assert one_by_one.transition_prob("send", "open") == pytest.approx(model.transition_prob("send", "open"))
+    assert np.allclose(one_by_one.score_paths(paths), model.score_paths(paths), rtol=1e-12, atol=0)
+
+def test_score_paths_matches_a_per_transition_loop(model, paths):
+    scores = model.score_paths(paths)
+    assert scores.shape == (len(paths),)
+    for path, score in zip(paths, scores):
+        expected = loop_log_likelihood(model, path)
+        assert score == pytest.approx(expected, rel=1e-9, abs=1e-9)
+        assert model.log_likelihood(path) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+    assert all(s == 0.0 for p, s in zip(paths, scores) if len(p) < 2)
+
+def test_long_paths_stay_finite(model, paths):
+    long_path = [label for p in paths for label in p]
+    assert len(long_path) > 5000
+    score = model.log_likelihood(long_path)
+    assert math.isfinite(score) and score < -1000
+    # the old probability product underflows on the same path
+    prob = 1.0
+    for a, b in zip(long_path, long_path[1:]):
+        prob *= model.transition_prob(a, b) * priors.get(b, DEFAULT_PRIOR)
+    assert prob == 0.0
+
+def test_unseen_labels(model):
+    assert model.transition_prob("send", "never_seen") == 1.0 / (model.n_labels + 1)
+    grown = TransitionModel(labels=LABELS, priors=priors)
+    grown.update_transitions([["send", "open", "brand_new"]])
+    assert grown.n_labels == len(LABELS) + 1
+    assert grown.counts.shape == (grown.n_labels, grown.n_labels)
+    assert math.isfinite(grown.log_likelihood(["brand_new", "send"]))
+
+def test_save_load_round_trip(model, paths, tmp_path):
+    path = tmp_path / "bayes.npz"
+    model.save(str(path))
+    restored = TransitionModel.load(str(path))
+    assert restored.labels == model.labels
+    assert restored.index == model.index
+    assert restored.alpha == model.alpha
+    assert restored.priors == model.priors
+    assert np.array_equal(restored.counts, model.counts)
+    assert np.array_equal(restored.score_paths(paths), model.score_paths(paths))
+    # the restored model keeps learning from where the saved one stopped
+    restored.update_transitions([["send", "sign"]])
+    assert restored.counts[restored.index["send"], restored.index["sign"]] == \
+        model.counts[model.index["send"], model.index["sign"]] + 1
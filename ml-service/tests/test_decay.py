@@ -0,0 +1,69 @@
+# ml-service/tests/test_decay.py
+"""
+decay.py: the exp(-rate * t) helpers against the pow() formulas they replaced, and
+DecayedScores.top against a per-key loop with a full sort.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from decay import ENGAGEMENT_RATE, DecayedScores, decayed, factor, factors
+
+NOW = 1_700_000_000.0
+
+def legacy_top(keys, values, last_ts, now, n):
+    # the old engagement formula: x0.99 per elapsed second, sorted in Python
+    cur = [(k, v * 0.99 ** (now - t)) for k, v, t in zip(keys, values, last_ts)]
+    return sorted(cur, key=lambda kv: -kv[1])[:n]
+
+@pytest.fixture(scope="module")
+def population():
+    rng = np.random.default_rng(0)
+    n = 5000
+    keys = [f"v{i}" for i in range(n)]
+    values = rng.random(n).tolist()
+    last_ts = (NOW - rng.exponential(600.0, n)).tolist()
+    scores = DecayedScores(ENGAGEMENT_RATE, capacity=16)  # small capacity so the columns grow
+    scores.set_many(keys, values, last_ts)
+    return keys, values, last_ts, scores
+
+def test_factor_matches_pow():
+    for seconds in (0.5, 1.0, 60.0, 3600.0):
+        assert math.isclose(factor(seconds, ENGAGEMENT_RATE), 0.99 ** seconds, rel_tol=1e-12)
+    # clock skew: an update "from the future" is not amplified
+    assert factor(-5.0, ENGAGEMENT_RATE) == 1.0
+    np.testing.assert_allclose(factors([-5.0, 0.0, 10.0], ENGAGEMENT_RATE), [1.0, 1.0, 0.99 ** 10], rtol=1e-12)
+
+@pytest.mark.parametrize("n", [1, 10, 100])
+def test_top_matches_pow_ranking(population, n):
+    keys, values, last_ts, scores = population
+    top = scores.top(n, NOW)
+    legacy = legacy_top(keys, values, last_ts, NOW, n)
+    assert [k for k, _ in top] == [k for k, _ in legacy]
+    np.testing.assert_allclose([v for _, v in top], [v for _, v in legacy], rtol=1e-9)
+
+def test_top_of_everything_is_a_full_sort(population):
+    keys, values, last_ts, scores = population
+    top = scores.top(len(keys) + 10, NOW)
+    assert len(top) == len(keys)
+    assert [k for k, _ in top] == [k for k, _ in legacy_top(keys, values, last_ts, NOW, len(keys))]
+
+def test_get_and_current_agree(population):
+    keys, values, last_ts, scores = population
+    cur = scores.current(NOW)
+    assert len(cur) == len(scores) == len(keys)
+    for i in (0, 17, len(keys) - 1):
+        assert scores.get(keys[i], NOW) == pytest.approx(decayed(values[i], last_ts[i], NOW, ENGAGEMENT_RATE), rel=1e-12)
+        assert cur[i] == pytest.approx(values[i] * 0.99 ** (NOW - last_ts[i]), rel=1e-9)
+    assert scores.get("missing", NOW) is None
+
+def test_set_overwrites_a_key():
+    scores = DecayedScores(ENGAGEMENT_RATE)
+    scores.set("a", 1.0, NOW - 10)
+    scores.set("b", 0.5, NOW)
+    assert [k for k, _ in scores.top(2, NOW)] == ["a", "b"]
+    scores.set("a", 0.1, NOW)
+    assert len(scores) == 2
+    assert scores.top(2, NOW) == [("b", 0.5), ("a", pytest.approx(0.1))]
+    assert DecayedScores(ENGAGEMENT_RATE).top(5, NOW) == []
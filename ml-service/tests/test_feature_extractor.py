@@ -0,0 +1,75 @@
+# ml-service/tests/test_feature_extractor.py
+"""
+feature_extractor.py: the vectorized ISO path, the numeric fast path and the batch matrix against
+the original per-node implementation.
+"""
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_vendor_events, snapshot_from_events
+from feature_extractor import (FEATURE_ORDER, extract_features_batch, extract_features_from_snapshot,
+                               features_from_matrix, features_to_vector)
+from feature_extractor import snapshot_from_events as columnar_from_events
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def legacy_extract(snapshot):
+    # the original per-node implementation, the reference for every path
+    nodes = snapshot.get("nodes", [])
+    edges = snapshot.get("edges", [])
+    ts = [datetime.fromisoformat(n["timestamp"]) for n in nodes]
+    diffs = [(b - a).total_seconds() for a, b in zip(ts, ts[1:])] or [0.0]
+    return {
+        "n_events": len(nodes),
+        "avg_wait": float(np.mean(diffs)),
+        "median_wait": float(np.median(diffs)),
+        "std_wait": float(np.std(diffs)),
+        "unique_actions": len(set(n.get("label") for n in nodes)),
+        "edge_count": len(edges),
+        "avg_edge_count": float(np.mean([e.get("count", 1) for e in edges])) if edges else 0.0,
+        "last_event_age": ((datetime.now(ts[-1].tzinfo) if ts[-1].tzinfo else datetime.utcnow()) - ts[-1]).total_seconds(),
+    }
+
+def assert_same(expected, got):
+    e, g = features_to_vector(expected), features_to_vector(got)
+    # all but last_event_age (wall-clock dependent) agree to float round-off
+    assert np.allclose(e[:-1], g[:-1], rtol=1e-9, atol=1e-6), dict(zip(FEATURE_ORDER, zip(e, g)))
+    assert abs(e[-1] - g[-1]) < 5.0
+
+@pytest.mark.parametrize("size", [1, 2, 5, 100, 2000])
+def test_iso_and_numeric_paths_match_legacy(size):
+    events = make_vendor_events("v", size, random.Random(size))
+    snapshot = snapshot_from_events(events, edge_count=2)
+    expected = legacy_extract(snapshot)
+    assert_same(expected, extract_features_from_snapshot(snapshot))
+    dawg = DynamicAdaptiveWeightedGraph(backend="array")
+    dawg.add_events_bulk(events)
+    timeline = dict(dawg.timeline_for_vendor("v"), edge_counts=np.full(max(size - 1, 0), 2.0))
+    assert_same(expected, extract_features_from_snapshot(timeline))
+
+def test_timezone_aware_timestamps():
+    events = make_vendor_events("v", 20, random.Random(7))
+    for e in events:
+        e["timestamp"] += "+02:00"
+    snapshot = snapshot_from_events(events)
+    assert_same(legacy_extract(snapshot), extract_features_from_snapshot(snapshot))
+
+def test_batch_matches_one_snapshot_at_a_time():
+    rng = random.Random(3)
+    snapshots = [snapshot_from_events(make_vendor_events(f"v{i}", rng.randint(1, 30), rng)) for i in range(40)]
+    batch = features_from_matrix(extract_features_batch(snapshots))
+    for snapshot, got in zip(snapshots, batch):
+        assert_same(extract_features_from_snapshot(snapshot), got)
+
+def test_raw_events_are_sorted_before_extraction():
+    events = make_vendor_events("v", 30, random.Random(5))
+    shuffled = events[:]
+    random.Random(6).shuffle(shuffled)
+    expected = legacy_extract(snapshot_from_events(events))
+    assert_same(expected, extract_features_from_snapshot(columnar_from_events(shuffled)))
+
+def test_empty_snapshot():
+    feats = extract_features_from_snapshot({"nodes": [], "edges": []})
+    assert feats["n_events"] == 0 and feats["edge_count"] == 0
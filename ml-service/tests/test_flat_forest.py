@@ -0,0 +1,57 @@
+# ml-service/tests/test_flat_forest.py
+"""
+FlatForest (flat_forest.py) against the sklearn forests it is exported from, on held-out rows.
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+import bgac_model
+from model_store import ModelRegistry
+from train_model import export_flat_models, synthesize_training_data
+
+N_TRAIN = 2000
+
+@pytest.fixture(scope="module")
+def models():
+    X, y_engage, y_risk = synthesize_training_data(N_TRAIN + bgac_model.FLAT_MAX_BATCH + 200, seed=0)
+    clf = RandomForestClassifier(n_estimators=30, random_state=42).fit(X[:N_TRAIN], y_engage[:N_TRAIN])
+    reg = RandomForestRegressor(n_estimators=30, random_state=42).fit(X[:N_TRAIN], y_risk[:N_TRAIN])
+    return clf, reg, *export_flat_models(clf, reg), X[N_TRAIN:]
+
+BATCH_SIZES = [1, 2, 7, 64, bgac_model.FLAT_MAX_BATCH - 1, bgac_model.FLAT_MAX_BATCH, bgac_model.FLAT_MAX_BATCH + 1]
+
+@pytest.mark.parametrize("n", BATCH_SIZES)
+def test_predict_proba_matches_sklearn(models, n):
+    clf, reg, flat_clf, flat_reg, held_out = models
+    rows = held_out[:n]
+    # identical leaves, so only the float summation order can differ
+    np.testing.assert_allclose(flat_clf.predict_proba(rows), clf.predict_proba(rows), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(flat_reg.predict(rows), reg.predict(rows), rtol=0, atol=1e-9)
+    assert np.array_equal(flat_clf.predict(rows), clf.predict(rows))
+
+def test_single_row(models):
+    clf, reg, flat_clf, flat_reg, held_out = models
+    row = held_out[3:4]
+    assert flat_clf.predict_proba(row).shape == (1, len(clf.classes_))
+    assert flat_reg.predict(row).shape == (1,)
+    np.testing.assert_allclose(flat_clf.predict_proba(row), clf.predict_proba(row), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(flat_reg.predict(row), reg.predict(row), rtol=0, atol=1e-9)
+
+def test_whole_held_out_set(models):
+    clf, reg, flat_clf, flat_reg, held_out = models
+    np.testing.assert_allclose(flat_clf.predict_proba(held_out), clf.predict_proba(held_out), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(flat_reg.predict(held_out), reg.predict(held_out), rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize("n", BATCH_SIZES)
+def test_scorer_switches_at_flat_max_batch(models, monkeypatch, n):
+    # predict_models uses FlatForest up to FLAT_MAX_BATCH rows and sklearn above; both sides agree
+    clf, reg, flat_clf, flat_reg, held_out = models
+    registry = ModelRegistry()
+    registry.activate("test", clf, reg, flat_clf, flat_reg)
+    registry.ready.set()
+    monkeypatch.setattr(bgac_model, "REGISTRY", registry)
+    rows = held_out[:n]
+    engage, risk = bgac_model.predict_models(rows)
+    np.testing.assert_allclose(engage, clf.predict_proba(rows)[:, 1], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(risk, reg.predict(rows), rtol=0, atol=1e-9)
@@ -0,0 +1,82 @@
+# ml-service/tests/test_graph_builder.py
+"""
+DAWG snapshots (graph_builder.py): the per-vendor index against a scan of the whole graph.
+"""
+import random
+
+import pytest
+
+from benchmarks.common import make_population, make_vendor_events
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+def scan_snapshot(dawg, vendor_id):
+    # what snapshot_for_vendor returned before the per-vendor index: a filter over every node and edge
+    nodes = [{"id": str(n), "label": data.get("label"), "timestamp": data.get("timestamp")}
+             for n, data in dawg.G.nodes(data=True) if data.get("vendorId") == vendor_id]
+    ids = {n["id"] for n in nodes}
+    edges = [{"from": str(u), "to": str(v), "weight": float(data.get("weight", 0.0)), "count": int(data.get("count", 1))}
+             for u, v, data in dawg.G.edges(data=True) if u in ids and v in ids]
+    return {"nodes": sorted(nodes, key=lambda x: x.get("timestamp")), "edges": edges}
+
+@pytest.fixture
+def dawg():
+    dawg = DynamicAdaptiveWeightedGraph()
+    dawg.add_events_bulk(make_population(50, 5))
+    return dawg
+
+def test_bulk_load_matches_scan(dawg):
+    for vid in ("v0", "v17", "v49"):
+        assert dawg.snapshot_for_vendor(vid) == scan_snapshot(dawg, vid)
+
+def test_incremental_events_match_scan(dawg):
+    for e in make_vendor_events("v3", 30, random.Random(1), id_prefix="v3-live"):
+        dawg.add_event_incremental(e)
+    assert dawg.snapshot_for_vendor("v3") == scan_snapshot(dawg, "v3")
+    assert dawg.snapshot_for_vendor("v4") == scan_snapshot(dawg, "v4")
+
+def test_overlapping_batches_match_scan():
+    # warm-up and on-demand loads can deliver the same events twice; known ids are skipped
+    dawg = DynamicAdaptiveWeightedGraph()
+    events = make_vendor_events("v", 10, random.Random(2))
+    dawg.add_events_bulk(events[:7])
+    dawg.add_events_bulk(events)
+    assert dawg.snapshot_for_vendor("v") == scan_snapshot(dawg, "v")
+    assert len(dawg.snapshot_for_vendor("v")["nodes"]) == 10
+
+def test_unknown_vendor_is_empty(dawg):
+    assert dawg.snapshot_for_vendor("nobody") == {"nodes": [], "edges": []}
+
+def build_both(events, live=()):
+    dawgs = {}
+    for backend in ("networkx", "array"):
+        dawg = dawgs[backend] = DynamicAdaptiveWeightedGraph(backend=backend)
+        dawg.add_events_bulk(events)
+        for e in live:
+            dawg.add_event_incremental(e)
+    return dawgs["networkx"], dawgs["array"]
+
+def test_backends_give_identical_snapshots():
+    live = make_vendor_events("v5", 20, random.Random(3), id_prefix="v5-live")
+    # a late event (older than the vendor's history) arriving live
+    late = dict(make_vendor_events("v6", 1, random.Random(4))[0], _id="v6-late")
+    nx_dawg, arr_dawg = build_both(make_population(40, 6), live + [late])
+    assert nx_dawg.store.number_of_nodes() == arr_dawg.store.number_of_nodes()
+    assert nx_dawg.store.number_of_edges() == arr_dawg.store.number_of_edges()
+    assert sorted(nx_dawg.vendor_history_lengths()) == sorted(arr_dawg.vendor_history_lengths())
+    for v in range(40):
+        vid = f"v{v}"
+        assert nx_dawg.snapshot_for_vendor(vid) == arr_dawg.snapshot_for_vendor(vid), vid
+        assert nx_dawg.last_event_by_vendor[vid] == arr_dawg.last_event_by_vendor[vid], vid
+
+def test_backends_give_identical_timelines_and_features():
+    nx_dawg, arr_dawg = build_both(make_population(10, 30))
+    for vid in ("v0", "v9"):
+        a, b = nx_dawg.timeline_for_vendor(vid), arr_dawg.timeline_for_vendor(vid)
+        assert a.keys() == b.keys()
+        assert list(a["timestamps"]) == list(b["timestamps"]) and list(a["edge_counts"]) == list(b["edge_counts"])
+        # label codes are backend-local; the same events must share a code on both
+        assert len(set(zip(a["labels"].tolist(), b["labels"].tolist()))) == len(set(a["labels"].tolist()))
+        for exact in (False, True):
+            fa, fb = nx_dawg.vendor_features(vid, exact=exact), arr_dawg.vendor_features(vid, exact=exact)
+            fa.pop("last_event_age"), fb.pop("last_event_age")
+            assert fa == pytest.approx(fb), (vid, exact)
@@ -0,0 +1,67 @@
+# ml-service/tests/test_graph_checkpoint.py
+"""
+DAWG checkpoints (graph_checkpoint.py): save, memory-mapped restore and the tail replay on top.
+"""
+import pytest
+
+from benchmarks.common import make_population
+from graph_builder import DynamicAdaptiveWeightedGraph
+from graph_checkpoint import CheckpointWriter, restore_checkpoint, save_checkpoint
+
+BACKENDS = ("networkx", "array")
+VENDORS = 30
+
+@pytest.fixture(scope="module")
+def events():
+    events = make_population(VENDORS, 8)
+    events.sort(key=lambda e: e["timestamp"])
+    return events
+
+def assert_same(restored, full):
+    for v in range(VENDORS):
+        vid = f"v{v}"
+        assert restored.snapshot_for_vendor(vid) == full.snapshot_for_vendor(vid), vid
+        assert restored.last_event_by_vendor[vid] == full.last_event_by_vendor[vid], vid
+        for exact in (True, False):
+            a, b = restored.vendor_features(vid, exact=exact), full.vendor_features(vid, exact=exact)
+            a.pop("last_event_age"), b.pop("last_event_age")
+            if not exact:
+                # restored stats are rebuilt from the timeline; P-square medians depend on the path
+                a.pop("median_wait"), b.pop("median_wait")
+            assert a == pytest.approx(b), (vid, exact)
+
+@pytest.mark.parametrize("saved_from", BACKENDS)
+@pytest.mark.parametrize("restored_to", BACKENDS)
+def test_restore_plus_tail_equals_full_replay(tmp_path, events, saved_from, restored_to):
+    head = events[:-40]
+    full = DynamicAdaptiveWeightedGraph(backend=restored_to)
+    full.add_events_bulk(events, presorted=True)
+    base = DynamicAdaptiveWeightedGraph(backend=saved_from)
+    base.add_events_bulk(head, presorted=True)
+    path = tmp_path / "dawg.ckpt"
+    meta = save_checkpoint(base, str(path))
+
+    restored = DynamicAdaptiveWeightedGraph(backend=restored_to)
+    header = restore_checkpoint(restored, str(path))
+    assert header["n_nodes"] == meta["n_nodes"] == len(head)
+    assert restored.high_water_id == base.high_water_id
+    assert restored.version == base.version
+    restored.add_events_bulk(events[-60:], presorted=True)  # the replay margin re-delivers known events
+    assert_same(restored, full)
+
+def test_not_a_checkpoint(tmp_path):
+    path = tmp_path / "junk.ckpt"
+    path.write_bytes(b"not a checkpoint at all, but long enough to hold a prefix")
+    with pytest.raises(ValueError):
+        restore_checkpoint(DynamicAdaptiveWeightedGraph(), str(path))
+
+def test_writer_saves_only_when_dirty(tmp_path, events):
+    dawg = DynamicAdaptiveWeightedGraph(backend="array")
+    writer = CheckpointWriter(dawg, str(tmp_path / "dawg.ckpt"), interval=3600)
+    assert not writer.save_if_dirty()
+    dawg.add_events_bulk(events[:50], presorted=True)
+    assert writer.save_if_dirty()
+    assert not writer.save_if_dirty()
+    dawg.add_events_bulk(events[50:60], presorted=True)
+    assert writer.save_if_dirty()
+    assert writer.last["nodes"] == 60 and writer.last["error"] is None
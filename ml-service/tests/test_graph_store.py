@@ -0,0 +1,138 @@
+# ml-service/tests/test_graph_store.py
+"""
+GraphWriteBehind.load (graph_store.py): stored buckets, the legacy document and queued writes
+merge into the graph a caller would read after the next flush.
+"""
+import pytest
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from graph_store import GraphWriteBehind
+
+class FakeCursor(list):
+    def sort(self, key, direction):
+        return FakeCursor(sorted(self, key=lambda d: d[key], reverse=direction < 0))
+
+class FakeCollection:
+    """
+    Just enough of a pymongo collection for load(): documents are seeded directly and
+    bulk_write only records what it was sent (or raises, to test the retry path).
+    """
+    def __init__(self, docs=(), fail=False):
+        self.docs = [dict(d, _id=i) for i, d in enumerate(docs)]
+        self.fail = fail
+        self.writes = []
+
+    def find(self, query):
+        return FakeCursor(d for d in self.docs if d["vendorId"] == query["vendorId"])
+
+    def find_one(self, query):
+        return next(iter(self.find(query)), None)
+
+    def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.writes.append(ops)
+
+def node(i):
+    return {"id": f"e{i}", "label": "view", "timestamp": f"2024-01-01T00:00:{i:02d}"}
+
+def edge(i, j, weight=1.0, count=1):
+    return {"from": f"e{i}", "to": f"e{j}", "weight": weight, "count": count}
+
+@pytest.fixture
+def make_writer():
+    writers = []
+    def make(buckets, legacy=None, bucket_size=3):
+        # a long interval keeps the background thread from flushing in the middle of a test
+        w = GraphWriteBehind(buckets, legacy=legacy, bucket_size=bucket_size, interval=3600, max_pending=10 ** 9)
+        writers.append(w)
+        return w
+    yield make
+    for w in writers:
+        w._stop.set()
+        w._wake.set()
+
+def test_unknown_vendor_is_none(make_writer):
+    assert make_writer(FakeCollection(), legacy=FakeCollection()).load("v") is None
+
+def test_buckets_are_concatenated_in_timestamp_order(make_writer):
+    # the second bucket was inserted first, so insertion order is not timestamp order
+    buckets = FakeCollection([
+        {"vendorId": "v", "n": 2, "nodes": [node(3), node(4)], "edges": [edge(3, 4)]},
+        {"vendorId": "v", "n": 3, "nodes": [node(0), node(1), node(2)], "edges": [edge(0, 1), edge(1, 2)]},
+        {"vendorId": "other", "n": 1, "nodes": [node(9)], "edges": []},
+    ])
+    graph = make_writer(buckets).load("v")
+    assert [n["id"] for n in graph["nodes"]] == ["e0", "e1", "e2", "e3", "e4"]
+    assert sorted((e["from"], e["to"]) for e in graph["edges"]) == [("e0", "e1"), ("e1", "e2"), ("e3", "e4")]
+
+def test_legacy_document_is_only_a_fallback(make_writer):
+    legacy = FakeCollection([{"vendorId": "v", "nodes": [node(0), node(1)], "edges": [edge(0, 1)]}])
+    w = make_writer(FakeCollection(), legacy=legacy)
+    assert [n["id"] for n in w.load("v")["nodes"]] == ["e0", "e1"]
+    buckets = FakeCollection([{"vendorId": "v", "n": 1, "nodes": [node(5)], "edges": []}])
+    w = make_writer(buckets, legacy=legacy)
+    assert [n["id"] for n in w.load("v")["nodes"]] == ["e5"]
+
+def test_queued_appends_and_bumps_merge_with_stored_buckets(make_writer):
+    buckets = FakeCollection([{"vendorId": "v", "n": 2, "nodes": [node(0), node(1)], "edges": [edge(0, 1)]}])
+    w = make_writer(buckets)
+    w.append("v", [node(2)], [edge(1, 2)])
+    w.append("v", [node(3)], [edge(2, 3)], bumps=[edge(0, 1, weight=3.5, count=2)])
+    # a bump of an edge that is still queued updates the queued copy rather than becoming a bump
+    w.append("v", bumps=[edge(1, 2, weight=7.0, count=4)])
+    graph = w.load("v")
+    assert [n["id"] for n in graph["nodes"]] == ["e0", "e1", "e2", "e3"]
+    edges = {(e["from"], e["to"]): (e["weight"], e["count"]) for e in graph["edges"]}
+    assert edges == {("e0", "e1"): (3.5, 2), ("e1", "e2"): (7.0, 4), ("e2", "e3"): (1.0, 1)}
+
+def test_queued_replace_hides_the_stored_graph(make_writer):
+    buckets = FakeCollection([{"vendorId": "v", "n": 2, "nodes": [node(0), node(1)], "edges": [edge(0, 1)]}])
+    w = make_writer(buckets)
+    w.append("v", [node(2)], [edge(1, 2)])
+    w.replace("v", [node(5), node(6)], [edge(5, 6)])
+    assert w.load("v") == {"nodes": [node(5), node(6)], "edges": [edge(5, 6)]}
+    assert w.stats()["queue"] == {"vendors": 1, "items": 3}
+    # appends after the replace are part of the same rewrite
+    w.append("v", [node(7)], [edge(6, 7)])
+    assert [n["id"] for n in w.load("v")["nodes"]] == ["e5", "e6", "e7"]
+
+def test_load_does_not_expose_the_queue(make_writer):
+    w = make_writer(FakeCollection())
+    w.append("v", [node(0)])
+    w.load("v")["nodes"].append(node(1))
+    assert [n["id"] for n in w.load("v")["nodes"]] == ["e0"]
+
+def test_flush_splits_appends_at_bucket_edges(make_writer):
+    buckets = FakeCollection()
+    w = make_writer(buckets, bucket_size=3)
+    w.replace("v", [node(0), node(1)], [edge(0, 1)])
+    assert w.flush() == 2
+    delete, insert = buckets.writes[0]
+    assert isinstance(delete, DeleteMany) and isinstance(insert, InsertOne)
+    # the open bucket has room for one more node, so four new nodes take two updates
+    w.append("v", [node(i) for i in range(2, 6)], [edge(i, i + 1) for i in range(1, 5)], bumps=[edge(0, 1, 2.0, 2)])
+    assert w.flush() == 3
+    fill_open, new_bucket, bump = buckets.writes[1]
+    assert all(isinstance(op, UpdateOne) for op in buckets.writes[1])
+    assert [n["id"] for n in fill_open._doc["$push"]["nodes"]["$each"]] == ["e2"]
+    assert [n["id"] for n in new_bucket._doc["$push"]["nodes"]["$each"]] == ["e3", "e4", "e5"]
+    assert len(new_bucket._doc["$push"]["edges"]["$each"]) == 4
+    assert bump._filter == {"vendorId": "v", "edges": {"$elemMatch": {"from": "e0", "to": "e1"}}}
+    assert w.stats()["queue"] == {"vendors": 0, "items": 0}
+    assert w.flush() == 0
+
+def test_failed_flush_requeues_in_order(make_writer):
+    buckets = FakeCollection(fail=True)
+    w = make_writer(buckets)
+    w.append("v", [node(0)], bumps=[edge(8, 9, 2.0, 2)])
+    assert w.flush() == 0
+    assert w.metrics["flush_errors"] == 1
+    w.append("v", [node(1)], [edge(0, 1)])
+    assert [n["id"] for n in w.load("v")["nodes"]] == ["e0", "e1"]
+    assert w.stats()["queue"] == {"vendors": 1, "items": 4}
+    buckets.fail = False
+    assert w.flush() == 2
+    push = buckets.writes[0][0]._doc["$push"]
+    assert [n["id"] for n in push["nodes"]["$each"]] == ["e0", "e1"]
+    assert push["edges"]["$each"] == [edge(0, 1)]
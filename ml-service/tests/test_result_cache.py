@@ -0,0 +1,112 @@
+# ml-service/tests/test_result_cache.py
+"""
+ResultCache (result_cache.py): version mismatches, invalidation, TTL and LRU bounds, and the
+optional Redis tier (a dict-backed stand-in here).
+"""
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        self._check()
+        self.data[key] = value.encode()
+
+    def delete(self, *keys):
+        self._check()
+        for k in keys:
+            self.data.pop(k, None)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def with_redis(cache, redis):
+    cache.redis = redis
+    return cache
+
+def test_hit_needs_the_same_version():
+    cache = ResultCache()
+    cache.put("v1", "e1@m1", {"score": 1})
+    assert cache.get("v1", "e1@m1") == {"score": 1}
+    # a new event or model version is a miss, even though the key is still cached
+    assert cache.get("v1", "e2@m1") is None
+    assert cache.get("v1", "e1@m2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    assert cache.stats()["size"] == 1
+
+def test_invalidate_drops_every_given_key():
+    cache = ResultCache()
+    for key in ("v1", "v1:exact", "v2"):
+        cache.put(key, "e1@m1", key)
+    cache.invalidate("v1", "v1:exact", "missing")
+    assert cache.get("v1", "e1@m1") is None
+    assert cache.get("v1:exact", "e1@m1") is None
+    assert cache.get("v2", "e1@m1") == "v2"
+    assert cache.stats()["invalidations"] == 2
+
+def test_clear_drops_everything():
+    cache = ResultCache()
+    cache.put("v1", "e1@m1", 1)
+    cache.put("v2", "e1@m1", 2)
+    cache.clear()
+    assert cache.stats()["size"] == 0
+    assert cache.get("v1", "e1@m1") is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(ttl=30)
+    cache.put("v1", "e1@m1", 1)
+    clock[0] += 29.9
+    assert cache.get("v1", "e1@m1") == 1
+    clock[0] += 0.1
+    assert cache.get("v1", "e1@m1") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+def test_lru_eviction_keeps_recently_read_keys():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", "1", "a")
+    cache.put("b", "1", "b")
+    assert cache.get("a", "1") == "a"
+    cache.put("c", "1", "c")
+    assert cache.get("b", "1") is None
+    assert cache.get("a", "1") == "a" and cache.get("c", "1") == "c"
+    assert cache.stats()["evictions"] == 1
+
+def test_redis_tier_is_shared_between_workers():
+    redis = FakeRedis()
+    worker_a = with_redis(ResultCache(), redis)
+    worker_b = with_redis(ResultCache(), redis)
+    worker_a.put("v1", "e1@m1", {"score": 0.5})
+    assert worker_b.get("v1", "e1@m1") == {"score": 0.5}
+    assert worker_b.stats()["redis_hits"] == 1
+    # the stored version still guards the shared entry
+    assert worker_b.get("v1", "e2@m1") is None
+    # invalidation on one worker removes the shared copy, so a cold worker misses
+    worker_a.invalidate("v1")
+    assert with_redis(ResultCache(), redis).get("v1", "e1@m1") is None
+
+def test_redis_errors_count_as_misses():
+    redis = FakeRedis()
+    cache = with_redis(ResultCache(), redis)
+    redis.fail = True
+    cache.put("v1", "e1@m1", 1)
+    assert cache.get("v1", "e1@m1") == 1  # served locally
+    assert cache.get("v2", "e1@m1") is None
+    cache.invalidate("v1")
+    assert cache.get("v1", "e1@m1") is None
+    assert cache.stats()["redis_errors"] == 4
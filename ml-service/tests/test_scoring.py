@@ -0,0 +1,55 @@
+# ml-service/tests/test_scoring.py
+"""
+bgac_model scoring: the batch path against one call per snapshot, on in-memory demo forests.
+"""
+import random
+
+import pytest
+
+import bgac_model
+from benchmarks.common import fit_demo_models, make_vendor_events, snapshot_from_events
+from feature_extractor import extract_features_from_snapshot
+from model_store import ModelRegistry
+
+@pytest.fixture(scope="module")
+def demo_models():
+    return fit_demo_models(n=1000, n_estimators=20)
+
+@pytest.fixture
+def registry(demo_models, monkeypatch):
+    registry = ModelRegistry()
+    registry.activate("test", *demo_models)
+    registry.ready.set()
+    monkeypatch.setattr(bgac_model, "REGISTRY", registry)
+    return registry
+
+@pytest.fixture(scope="module")
+def snapshots():
+    rng = random.Random(0)
+    return [snapshot_from_events(make_vendor_events(f"v{i}", rng.randint(1, 40), rng)) for i in range(60)]
+
+def strip(result):
+    # features carry last_event_age, which moves with the wall clock between calls
+    return {k: v for k, v in result.items() if k != "features"}
+
+def test_batch_matches_single_calls(registry, snapshots):
+    single = [bgac_model.score_graph_snapshot_ml(s) for s in snapshots]
+    batch = bgac_model.score_graph_snapshots_ml(snapshots)
+    assert [strip(r) for r in batch] == [strip(r) for r in single]
+
+def test_precomputed_features_match_extraction(registry, snapshots):
+    # /score_batch mixes raw snapshots (features None) with DAWG vendors (features given)
+    features = [extract_features_from_snapshot(s) if i % 2 else None for i, s in enumerate(snapshots)]
+    mixed = bgac_model.score_graph_snapshots_ml(snapshots, features)
+    extracted = bgac_model.score_graph_snapshots_ml(snapshots)
+    for a, b in zip(mixed, extracted):
+        assert strip(a) == pytest.approx(strip(b), abs=1e-6)
+
+def test_prior_and_delay_come_from_the_snapshot(registry, snapshots):
+    fresh = dict(snapshots[0], prev_engagement_prob=0.9, delay_seconds=0.0)
+    stale = dict(snapshots[0], prev_engagement_prob=0.9, delay_seconds=86400.0)
+    a, b = bgac_model.score_graph_snapshots_ml([fresh, stale])
+    assert a["engagement_prob"] > b["engagement_prob"]
+
+def test_empty_batch(registry):
+    assert bgac_model.score_graph_snapshots_ml([]) == []
@@ -0,0 +1,93 @@
+# ml-service/tests/test_vendor_embeddings.py
+"""
+vendor_embeddings.EmbeddingIndex: top-k search against a brute-force cosine ranking, growth,
+save/load, and that upserts never write into a matrix a search already holds.
+"""
+import numpy as np
+import pytest
+
+from vendor_embeddings import EmbeddingIndex
+
+DIM = 16
+
+def brute_force(vectors, ids, query, k, exclude=None):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = query / np.linalg.norm(query)
+    ranked = sorted(((float(v @ q), vid) for vid, v in zip(ids, unit) if vid != exclude), reverse=True)
+    return [(vid, s) for s, vid in ranked[:k]]
+
+@pytest.fixture
+def filled():
+    rng = np.random.default_rng(0)
+    ids = [f"v{i}" for i in range(500)]
+    vectors = rng.normal(size=(len(ids), DIM)).astype(np.float32)
+    index = EmbeddingIndex(dim=DIM, initial_capacity=4)  # grows several times while filling
+    for lo in range(0, len(ids), 64):
+        index.upsert(ids[lo:lo + 64], vectors[lo:lo + 64])
+    return index, ids, vectors, rng
+
+def assert_same_ranking(got, expected):
+    assert [vid for vid, _ in got] == [vid for vid, _ in expected]
+    np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=0, atol=1e-5)
+
+@pytest.mark.parametrize("k", [1, 10, 499, 1000])
+def test_search_matches_brute_force(filled, k):
+    index, ids, vectors, rng = filled
+    query = rng.normal(size=DIM)
+    assert_same_ranking(index.search(query, k), brute_force(vectors, ids, query, k))
+
+def test_similar_excludes_the_vendor_itself(filled):
+    index, ids, vectors, _ = filled
+    got = index.similar("v7", k=10)
+    assert "v7" not in [vid for vid, _ in got]
+    assert_same_ranking(got, brute_force(vectors, ids, vectors[7], 10, exclude="v7"))
+    assert index.similar("missing") is None
+    assert EmbeddingIndex(dim=DIM).search(np.ones(DIM), k=5) == []
+
+def test_upsert_replaces_existing_rows(filled):
+    index, ids, vectors, rng = filled
+    replaced = rng.normal(size=(3, DIM)).astype(np.float32)
+    index.upsert(["v1", "v2", "new"], replaced)
+    assert len(index) == len(ids) + 1
+    assert index.ids[:3] == ["v0", "v1", "v2"] and index.ids[-1] == "new"
+    np.testing.assert_allclose(index.vector("v2"), replaced[1] / np.linalg.norm(replaced[1]), atol=1e-6)
+    vectors = np.vstack([vectors, replaced[2:]])
+    vectors[1:3] = replaced[:2]
+    query = rng.normal(size=DIM)
+    assert_same_ranking(index.search(query, 20), brute_force(vectors, ids + ["new"], query, 20))
+
+def test_upsert_does_not_write_into_a_matrix_held_by_a_search(filled):
+    index, ids, vectors, rng = filled
+    # what search() takes under the lock before scoring outside it
+    held, n = index._m, len(index)
+    before = held[:n].copy()
+    index.upsert(["v3", "v400"], rng.normal(size=(2, DIM)))
+    index.upsert(["brand_new"], rng.normal(size=(1, DIM)))
+    assert np.array_equal(held[:n], before)
+    assert index._m is not held
+
+def test_save_load_round_trip(filled, tmp_path):
+    index, ids, vectors, rng = filled
+    path = str(tmp_path / "embeddings.npz")
+    index.save(path)
+    restored = EmbeddingIndex(dim=DIM)
+    assert restored.load(path)
+    assert restored.ids == index.ids
+    query = rng.normal(size=DIM)
+    assert restored.search(query, 10) == index.search(query, 10)
+    assert not EmbeddingIndex(dim=DIM).load(str(tmp_path / "missing.npz"))
+    with pytest.raises(ValueError):
+        EmbeddingIndex(dim=DIM + 1).load(path)
+
+def test_batching_does_not_change_embeddings():
+    pytest.importorskip("torch")
+    pytest.importorskip("torch_geometric")
+    from benchmarks.common import make_zipf_population
+    from vendor_embeddings import VendorEmbedder
+    histories = {}
+    for e in make_zipf_population(200, 2000, seed=0, prefix="emb-t"):
+        histories.setdefault(e["vendorId"], []).append(e)
+    histories = list(histories.values())
+    embedder = VendorEmbedder()
+    one_by_one = np.concatenate([embedder.embed([h]) for h in histories])
+    np.testing.assert_allclose(embedder.embed(histories), one_by_one, rtol=0, atol=1e-4)
@@ -0,0 +1,76 @@
+# ml-service/tests/test_vendor_stats.py
+"""
+The DAWG's running per-vendor stats (vendor_features) against exact=True, which recomputes the
+features from the vendor's sorted timeline.
+"""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_vendor_events
+from feature_extractor import FEATURE_ORDER, features_to_vector
+from graph_builder import DynamicAdaptiveWeightedGraph
+
+BACKENDS = ("networkx", "array")
+MEDIAN = FEATURE_ORDER.index("median_wait")
+# last_event_age is wall-clock dependent; median_wait is a P-square estimate past five waits
+EXACT = [i for i in range(len(FEATURE_ORDER) - 1) if i != MEDIAN]
+
+def assert_running_matches_exact(dawg, vid):
+    running, exact = dawg.vendor_features(vid), dawg.vendor_features(vid, exact=True)
+    r, x = features_to_vector(running), features_to_vector(exact)
+    assert np.allclose(r[EXACT], x[EXACT], rtol=1e-9, atol=1e-6), dict(zip(FEATURE_ORDER, zip(r, x)))
+    assert abs(r[MEDIAN] - x[MEDIAN]) <= 0.25 * x[MEDIAN] + 1e-6, (r[MEDIAN], x[MEDIAN])
+
+def event(vid, i, minutes):
+    ts = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    return {"_id": f"{vid}-{i}", "vendorId": vid, "eventType": "EV", "timestamp": ts.isoformat()}
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_in_order(backend):
+    dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+    for e in make_vendor_events("v", 50, random.Random(0)):
+        dawg.add_event_incremental(e)
+    assert_running_matches_exact(dawg, "v")
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_live_event_after_out_of_order_one(backend):
+    dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+    for i, minutes in enumerate((0, 10, 20, 5)):
+        dawg.add_event_incremental(event("v", i, minutes))
+    dawg.vendor_features("v")  # stats rebuilt from the sorted timeline here
+    for i, minutes in enumerate((30, 40), start=4):
+        dawg.add_event_incremental(event("v", i, minutes))
+    assert dawg.vendor_features("v")["avg_wait"] == pytest.approx(480.0)
+    assert_running_matches_exact(dawg, "v")
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_every_out_of_order_event_drops_the_stats(backend):
+    dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+    for i, minutes in enumerate((0, 10, 20, 5, 30, 15, 40, 2, 50)):
+        dawg.add_event_incremental(event("v", i, minutes))
+        dawg.vendor_features("v")
+        assert_running_matches_exact(dawg, "v")
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("latest_last", [True, False])
+def test_shuffled_backfill_then_live_events(backend, seed, latest_last):
+    n = 40
+    events = make_vendor_events("v", n + 20, random.Random(seed))
+    backfill = events[:n]
+    random.Random(seed).shuffle(backfill)
+    # put the latest backfilled event last, or make sure it is not
+    latest = max(range(n), key=lambda i: backfill[i]["timestamp"])
+    backfill.append(backfill.pop(latest))
+    if not latest_last:
+        backfill[-1], backfill[0] = backfill[0], backfill[-1]
+    dawg = DynamicAdaptiveWeightedGraph(backend=backend)
+    for e in backfill:
+        dawg.add_event_incremental(e)
+    dawg.vendor_features("v")
+    for e in events[n:]:  # live events in order, applied to the rebuilt stats
+        dawg.add_event_incremental(e)
+    assert_running_matches_exact(dawg, "v")
@@ -1,86 +1,250 @@
 # ml-service/train_model.py
 import os
-import joblib
+import threading
+import time
 import numpy as np
-import pandas as pd
-from feature_extractor import extract_features_from_snapshot, features_to_vector
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score, mean_squared_error
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from feature_extractor import FEATURE_ORDER, extract_features_batch
+from flat_forest import FlatForest
+from model_store import publish_models, version_dir, ENGAGE_FILE, RISK_FILE
 
-MODEL_DIR = os.getenv("MODEL_DIR", "models")
-os.makedirs(MODEL_DIR, exist_ok=True)
+_COL = {name: i for i, name in enumerate(FEATURE_ORDER)}
 
-# For a demo: we synthesize training data from historical events in Mongo or generate synthetic.
-def synthesize_training_data(n=1000):
+def heuristic_labels(X, rng=None):
     """
-    Create synthetic snapshots and labels for quick training demo.
     Label semantics:
       - engagement_label (0/1) where higher events & low avg_wait => engaged
-      - risk_score (0..1) continuous
-    """
-    X = []
-    y_engage = []
-    y_risk = []
-    import random
-    for _ in range(n):
-        n_events = random.choice([1,2,3,4,5,6,7,8,10])
-        avg_wait = max(1.0, random.expovariate(1/300.0)) * (5.0 if n_events<=2 else 1.0)  # shorter waits for more events
-        median_wait = avg_wait * (0.9 + random.random()*0.4)
-        std_wait = avg_wait * 0.3 * random.random()
-        unique_actions = min(n_events, random.randint(1,4))
-        edge_count = n_events-1
-        avg_edge_count = 1 + random.random()*2
-        last_event_age = random.random()*86400  # up to 1 day
-        feats = {
-            "n_events": n_events,
-            "avg_wait": avg_wait,
-            "median_wait": median_wait,
-            "std_wait": std_wait,
-            "unique_actions": unique_actions,
-            "edge_count": edge_count,
-            "avg_edge_count": avg_edge_count,
-            "last_event_age": last_event_age
-        }
-        X.append(features_to_vector(feats))
-        # engagement label heuristics
-        engage = 1 if (n_events >= 3 and avg_wait < 1800) else 0
-        risk = min(1.0, max(0.0, (avg_wait/3600.0) * 0.5 + (1.0 if unique_actions<=1 else 0.0)*0.3 + random.random()*0.2))
-        y_engage.append(engage)
-        y_risk.append(risk)
-    X = np.vstack(X)
-    y_engage = np.array(y_engage)
-    y_risk = np.array(y_risk)
+      - risk_score (0..1) continuous; rng adds the synthetic trainer's noise term
+    """
+    n_events, avg_wait = X[:, _COL["n_events"]], X[:, _COL["avg_wait"]]
+    y_engage = ((n_events >= 3) & (avg_wait < 1800)).astype(int)
+    noise = rng.random(len(X)) * 0.2 if rng is not None else 0.1
+    y_risk = np.clip((avg_wait / 3600.0) * 0.5 + (X[:, _COL["unique_actions"]] <= 1) * 0.3 + noise, 0.0, 1.0)
+    return y_engage, y_risk
+
+# For a demo: we synthesize training data from historical events in Mongo or generate synthetic.
+def synthesize_training_data(n=1000, seed=None):
+    """
+    Create synthetic feature rows and labels for quick training demo (vectorized).
+    """
+    rng = np.random.default_rng(seed)
+    n_events = rng.choice([1, 2, 3, 4, 5, 6, 7, 8, 10], size=n)
+    avg_wait = np.maximum(1.0, rng.exponential(300.0, n)) * np.where(n_events <= 2, 5.0, 1.0)  # shorter waits for more events
+    X = np.empty((n, len(FEATURE_ORDER)))
+    X[:, _COL["n_events"]] = n_events
+    X[:, _COL["avg_wait"]] = avg_wait
+    X[:, _COL["median_wait"]] = avg_wait * (0.9 + rng.random(n) * 0.4)
+    X[:, _COL["std_wait"]] = avg_wait * 0.3 * rng.random(n)
+    X[:, _COL["unique_actions"]] = np.minimum(n_events, rng.integers(1, 5, n))
+    X[:, _COL["edge_count"]] = n_events - 1
+    X[:, _COL["avg_edge_count"]] = 1 + rng.random(n) * 2
+    X[:, _COL["last_event_age"]] = rng.random(n) * 86400  # up to 1 day
+    y_engage, y_risk = heuristic_labels(X, rng)
+    return X, y_engage, y_risk
+
+def _history_features(histories):
+    # process-pool worker: [(labels, timestamps)] -> feature rows, via the service's feature extractor
+    snapshots = []
+    for labels, timestamps in histories:
+        nodes = [{"label": l, "timestamp": t} for l, t in zip(labels, timestamps)]
+        snapshots.append({"nodes": nodes, "edges": [{"count": 1}] * max(0, len(nodes) - 1)})
+    return extract_features_batch(snapshots)
+
+# (vendorId, timestamp) order for the training/embedding scans below; the same index serves
+# dawg_loader's per-vendor find(...).sort("timestamp") reads
+EVENTS_VENDOR_INDEX = [("vendorId", 1), ("timestamp", 1)]
+
+def ensure_events_index(collection):
+    """
+    Create the (vendorId, timestamp) index on the events collection if it is missing (a no-op otherwise).
+    """
+    try:
+        collection.create_index(EVENTS_VENDOR_INDEX)
+    except Exception as e:
+        # e.g. a read-only user: the scan still works, as a disk-backed sort
+        print("events index not created:", e)
+
+def iter_vendor_events(collection, max_vendors=0):
+    """
+    Stream (vendorId, labels, timestamps) per vendor from the events collection, one vendor at a time.
+    With the (vendorId, timestamp) index the server walks the index instead of sorting; without it,
+    allow_disk_use lets the sort spill to disk instead of failing at the 100 MB in-memory limit.
+    """
+    ensure_events_index(collection)
+    cursor = collection.find({}, {"_id": 0, "vendorId": 1, "eventType": 1, "timestamp": 1},
+                             allow_disk_use=True).sort(EVENTS_VENDOR_INDEX)
+    current, labels, stamps, n = None, [], [], 0
+    for d in cursor:
+        vid = d.get("vendorId")
+        if vid != current:
+            if labels:
+                yield current, labels, stamps
+                n += 1
+                if max_vendors and n >= max_vendors:
+                    return
+            current, labels, stamps = vid, [], []
+        labels.append(d.get("eventType"))
+        stamps.append(d.get("timestamp"))
+    if labels:
+        yield current, labels, stamps
+
+def iter_vendor_histories(collection, max_vendors=0):
+    """
+    Stream (labels, timestamps) per vendor from the events collection, one vendor at a time.
+    """
+    for _, labels, stamps in iter_vendor_events(collection, max_vendors):
+        yield labels, stamps
+
+def featurize_histories(histories, workers=None, chunk_size=500):
+    """
+    Feature matrix for an iterable of (labels, timestamps) histories, computed in a process pool
+    in chunks while the iterable is still being consumed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        histories = list(histories)
+        return _history_features(histories) if histories else np.zeros((0, len(FEATURE_ORDER)))
+    chunk, results = [], []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        for history in histories:
+            chunk.append(history)
+            if len(chunk) >= chunk_size:
+                results.append(pool.submit(_history_features, chunk))
+                chunk = []
+        if chunk:
+            results.append(pool.submit(_history_features, chunk))
+        parts = [f.result() for f in results]
+    return np.vstack(parts) if parts else np.zeros((0, len(FEATURE_ORDER)))
+
+def history_training_data(collection, max_vendors=0, workers=None, chunk_size=500):
+    """
+    Feature rows from real vendor histories streamed from Mongo. Labels come from
+    heuristic_labels (no ground truth is stored).
+    """
+    X = featurize_histories(iter_vendor_histories(collection, max_vendors), workers, chunk_size)
+    y_engage, y_risk = heuristic_labels(X)
     return X, y_engage, y_risk
 
-def train_and_save_models():
-    X, y_engage, y_risk = synthesize_training_data(2000)
-    X_train, X_test, y_train, y_test = train_test_split(X, y_engage, test_size=0.2, random_state=42)
-    clf = RandomForestClassifier(n_estimators=100, random_state=42)
-    clf.fit(X_train, y_train)
-    preds = clf.predict_proba(X_test)[:,1]
+def _fit(model, X, y):
+    t0 = time.perf_counter()
+    model.fit(X, y)
+    return time.perf_counter() - t0
+
+def export_flat_models(clf, reg):
+    """
+    FlatForest copies of both fitted forests, published next to the sklearn artifacts.
+    """
+    return FlatForest.from_sklearn(clf), FlatForest.from_sklearn(reg)
+
+def train_and_save_models(source="synthetic", n=2000, collection=None, max_vendors=0, n_estimators=100, workers=None, report=None):
+    """
+    Build features (synthetic, or from Mongo histories), fit both forests concurrently on all
+    cores, evaluate and publish them as a new model version. Returns (clf_path, reg_path);
+    per-stage wall-clock times and rows/s are written into `report` if given.
+    """
+    # sklearn is imported here, not at module level: it is the slowest import of the service
+    # and only training needs it (serving goes through FlatForest or the unpickled models)
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import roc_auc_score, mean_squared_error
+    report = report if report is not None else {}
+    stages = report.setdefault("stages", {})
+    t_all = time.perf_counter()
+
+    t0 = time.perf_counter()
+    if source == "mongo":
+        X, y_engage, y_risk = history_training_data(collection, max_vendors=max_vendors, workers=workers)
+    else:
+        X, y_engage, y_risk = synthesize_training_data(n, seed=42)
+    if len(X) < 10:
+        raise ValueError(f"not enough training rows ({len(X)})")
+    elapsed = time.perf_counter() - t0
+    stages["features"] = {"seconds": round(elapsed, 3), "rows": len(X), "rows_per_sec": round(len(X) / elapsed, 1) if elapsed else None}
+
+    t0 = time.perf_counter()
+    # one split shared by both models
+    idx_train, idx_test = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    stages["split"] = {"seconds": round(time.perf_counter() - t0, 3)}
+
+    # the two forests train side by side, each on half the cores (tree building releases the GIL)
+    t0 = time.perf_counter()
+    per_model = max(1, (os.cpu_count() or 1) // 2)
+    clf = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=per_model)
+    reg = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=per_model)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_clf = ex.submit(_fit, clf, X[idx_train], y_engage[idx_train])
+        f_reg = ex.submit(_fit, reg, X[idx_train], y_risk[idx_train])
+        clf_s, reg_s = f_clf.result(), f_reg.result()
+    elapsed = time.perf_counter() - t0
+    stages["fit"] = {"seconds": round(elapsed, 3), "clf_seconds": round(clf_s, 3), "reg_seconds": round(reg_s, 3),
+                     "rows_per_sec": round(len(idx_train) / elapsed, 1) if elapsed else None}
+
+    t0 = time.perf_counter()
     try:
-        auc = roc_auc_score(y_test, preds)
+        auc = roc_auc_score(y_engage[idx_test], clf.predict_proba(X[idx_test])[:, 1])
     except Exception:
         auc = None
-
-    # train regressor for risk as continuous outcome
-    X_train_r, X_test_r, y_train_r, y_test_r = train_test_split(X, y_risk, test_size=0.2, random_state=42)
-    reg = RandomForestRegressor(n_estimators=100, random_state=42)
-    reg.fit(X_train_r, y_train_r)
-    preds_r = reg.predict(X_test_r)
     try:
-        mse = mean_squared_error(y_test_r, preds_r)
+        mse = mean_squared_error(y_risk[idx_test], reg.predict(X[idx_test]))
     except Exception:
         mse = None
+    stages["eval"] = {"seconds": round(time.perf_counter() - t0, 3), "auc": auc, "mse": mse}
 
-    # save models
-    clf_path = os.path.join(MODEL_DIR, "engagement_clf.joblib")
-    reg_path = os.path.join(MODEL_DIR, "risk_reg.joblib")
-    joblib.dump(clf, clf_path)
-    joblib.dump(reg, reg_path)
+    # save models as a new version; running services pick it up through their ModelRegistry
+    t0 = time.perf_counter()
+    flat = export_flat_models(clf, reg)
+    version = publish_models(clf, reg, flat=flat,
+                             meta={"source": source, "rows": len(X), "n_estimators": n_estimators, "auc": auc, "mse": mse})
+    clf_path = os.path.join(version_dir(version), ENGAGE_FILE)
+    reg_path = os.path.join(version_dir(version), RISK_FILE)
+    stages["save"] = {"seconds": round(time.perf_counter() - t0, 3)}
+    report.update(total_seconds=round(time.perf_counter() - t_all, 3), clf=clf_path, reg=reg_path, source=source, version=version)
+    report["models"] = (clf, reg)
     print("Saved models:", clf_path, reg_path, " AUC:", auc, "MSE:", mse)
     return clf_path, reg_path
 
+class TrainingJob:
+    """
+    Runs train_and_save_models on a background thread, one run at a time. `status` holds the
+    state and the last run's report; on_done(version, clf, reg) is called with the fitted models.
+    """
+    def __init__(self, on_done=None):
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._thread = None
+        self.status = {"state": "idle", "started_at": None, "finished_at": None, "params": None, "report": None, "error": None}
+
+    @property
+    def running(self):
+        return self.status["state"] == "running"
+
+    def start(self, **params):
+        """
+        Start a run; returns False if one is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.status = {"state": "running", "started_at": time.time(), "finished_at": None,
+                           "params": {k: v for k, v in params.items() if k != "collection"}, "report": None, "error": None}
+            self._thread = threading.Thread(target=self._run, kwargs=params, name="training-job", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, **params):
+        report = {}
+        try:
+            train_and_save_models(report=report, **params)
+            models = report.pop("models")
+            if self.on_done:
+                self.on_done(report["version"], *models)
+            self.status.update(state="done", report=report)
+        except Exception as e:
+            report.pop("models", None)
+            self.status.update(state="error", error=str(e), report=report)
+            print("Training job failed:", e)
+        self.status["finished_at"] = time.time()
+
 if __name__ == "__main__":
     train_and_save_models()
@@ -0,0 +1,380 @@
+# ml-service/vendor_embeddings.py
+"""
+Vendor embeddings from gnn_model.VendorGraphSAGE and an in-memory cosine index over them.
+
+Every vendor's event chain becomes a graph via gnn_utils.build_graph. Graphs are packed into
+disjoint mini-batches (node features concatenated, edge indices offset), so one forward pass
+covers many vendors, and each vendor's node outputs are mean- and max-pooled into a fixed
+2 * hidden_channels vector. The vectors are L2-normalised rows of one contiguous float32 matrix:
+a top-k cosine query is one matrix-vector product plus an argpartition.
+
+EmbeddingJob keeps the index current with a full rebuild from the events collection (POST
+/embeddings/build, or `python vendor_embeddings.py`), run in a child process so torch is never
+imported by a request-serving worker, and, opt-in (EMBED_INTERVAL > 0), an in-process
+incremental pass every EMBED_INTERVAL seconds over the vendors that got events since the
+previous one.
+
+The service has no training loop for VendorGraphSAGE: weights are read from SAGE_MODEL_PATH
+when that file exists, otherwise initialised from a fixed seed, so every worker and restart
+produces the same embeddings.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+from metrics import METRICS
+
+HIDDEN_CHANNELS = 32
+EMBED_DIM = 2 * HIDDEN_CHANNELS  # mean || max pooling
+
+class EmbeddingIndex:
+    """
+    vendorId -> unit-norm float32 vector, stored as rows of one matrix that doubles in capacity.
+    Rows are never removed, so a vendor keeps its row and readers can hold on to a row number.
+    Searches run on a reference to the matrix taken under the lock, so they never block upserts;
+    upsert() therefore never writes a row a search may be reading: new rows go past the rows
+    already published, and replacing an existing vendor's row writes into a copy of the matrix.
+    """
+    def __init__(self, dim=EMBED_DIM, initial_capacity=1024):
+        self.dim = dim
+        self._m = np.zeros((max(1, int(initial_capacity)), dim), dtype=np.float32)
+        self.ids = []   # row -> vendorId
+        self.row = {}   # vendorId -> row
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, vendor_id):
+        return vendor_id in self.row
+
+    def _grow(self, need):
+        cap = self._m.shape[0]
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        m = np.zeros((cap, self.dim), dtype=np.float32)
+        # ids already holds the new rows, which may run past the old capacity
+        m[:self._m.shape[0]] = self._m
+        self._m = m
+
+    def upsert(self, vendor_ids, vectors):
+        """
+        Insert or replace the vectors of `vendor_ids` (rows of `vectors`); they are normalised here.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vendor_ids), self.dim)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            published, m = len(self.ids), self._m
+            rows = np.empty(len(vendor_ids), dtype=np.int64)
+            for i, vid in enumerate(vendor_ids):
+                r = self.row.get(vid)
+                if r is None:
+                    r = self.row[vid] = len(self.ids)
+                    self.ids.append(vid)
+                rows[i] = r
+            self._grow(len(self.ids))
+            if self._m is m and (rows < published).any():
+                # copy-on-write: searches hold on to the old matrix until they finish
+                self._m = m.copy()
+            self._m[rows] = vectors
+
+    def vector(self, vendor_id):
+        with self._lock:
+            r = self.row.get(vendor_id)
+            return None if r is None else self._m[r].copy()
+
+    def search(self, query, k=10, exclude=None):
+        """
+        [(vendorId, cosine similarity)] of the k rows closest to `query`, best first; `exclude` is
+        a vendorId left out of the results (the query vendor itself).
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        with self._lock:
+            n = len(self.ids)
+            m, ids = self._m, self.ids
+            skip = self.row.get(exclude) if exclude is not None else None
+        scores = m[:n] @ q
+        if skip is not None:
+            scores[skip] = -np.inf
+        k = min(int(k), n - (skip is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def similar(self, vendor_id, k=10):
+        """
+        The k vendors most similar to `vendor_id`, or None if it has no embedding yet.
+        """
+        v = self.vector(vendor_id)
+        return None if v is None else self.search(v, k, exclude=vendor_id)
+
+    def save(self, path):
+        # written to a temp name and os.replace()d, so a reader never loads a partial file
+        with self._lock:
+            ids, m = list(self.ids), self._m[:len(self.ids)].copy()
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=np.array(ids, dtype=str), vectors=m)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """
+        Replace the contents with a file written by save(); returns False if there is none.
+        """
+        if not path or not os.path.exists(path):
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            ids, m = data["ids"].tolist(), data["vectors"].astype(np.float32)
+        if m.shape[1:] != (self.dim,):
+            raise ValueError(f"{path}: {m.shape[1:]} vectors, expected ({self.dim},)")
+        with self._lock:
+            self._m = np.zeros((max(1024, len(ids)), self.dim), dtype=np.float32)
+            self._m[:len(ids)] = m
+            self.ids = ids
+            self.row = {vid: i for i, vid in enumerate(ids)}
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"vendors": len(self.ids), "dim": self.dim, "capacity": self._m.shape[0],
+                    "bytes": self._m.nbytes}
+
+def pack_batches(items, batch_size=256, max_nodes=50000):
+    """
+    Group (vendorId, events) items into lists of at most batch_size vendors and (except for a
+    single longer vendor) max_nodes events, consuming `items` lazily. Empty histories are skipped.
+    """
+    batch, nodes = [], 0
+    for vid, events in items:
+        if not events:
+            continue
+        if batch and (len(batch) >= batch_size or nodes + len(events) > max_nodes):
+            yield batch
+            batch, nodes = [], 0
+        batch.append((vid, events))
+        nodes += len(events)
+    if batch:
+        yield batch
+
+class VendorEmbedder:
+    """
+    A VendorGraphSAGE in eval mode plus the batching around it; imports torch on construction.
+    """
+    def __init__(self, model_path=None, hidden_channels=HIDDEN_CHANNELS, seed=0):
+        import torch
+        from gnn_model import VendorGraphSAGE
+        self.torch = torch
+        with torch.random.fork_rng():  # a fixed init without reseeding the caller's RNG
+            torch.manual_seed(seed)
+            self.model = VendorGraphSAGE(hidden_channels=hidden_channels)
+        if model_path and os.path.exists(model_path):
+            self.model.load_state_dict(torch.load(model_path, map_location="cpu"))
+            self.weights = model_path
+        else:
+            self.weights = f"seed:{seed}"
+        self.model.eval()
+        self.dim = 2 * hidden_channels
+
+    def embed_graphs(self, graphs):
+        """
+        float32 [len(graphs), dim] for [(x, edge_index)], with one forward pass over all of them.
+        """
+        torch = self.torch
+        from torch_geometric.nn import global_max_pool, global_mean_pool
+        sizes = [x.shape[0] for x, _ in graphs]
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).tolist()
+        x = torch.cat([g[0] for g in graphs])
+        edge_index = torch.cat([e + off for (_, e), off in zip(graphs, offsets)], dim=1)
+        batch = torch.repeat_interleave(torch.arange(len(graphs)), torch.tensor(sizes))
+        with torch.inference_mode():
+            h = self.model.embed(x, edge_index)
+            pooled = torch.cat([global_mean_pool(h, batch, len(graphs)), global_max_pool(h, batch, len(graphs))], dim=1)
+        return pooled.numpy()
+
+    def embed(self, histories):
+        """
+        float32 [len(histories), dim] for non-empty per-vendor event lists ({"eventType"} dicts).
+        """
+        from gnn_utils import build_graph
+        with METRICS.span("embed_build_graph"):
+            graphs = [build_graph(events) for events in histories]
+        with METRICS.span("embed_forward"):
+            return self.embed_graphs(graphs)
+
+class EmbeddingJob:
+    """
+    Owns the EmbeddingIndex and keeps it current. `histories(vendor_ids)` returns [(vendorId,
+    events)] for the incremental pass; mark() queues vendors for it (a no-op while interval <= 0,
+    the incremental pass being off). start_rebuild() runs full rebuilds one at a time, with
+    `status` shaped like train_model.TrainingJob's: in a spawned child process that writes `path`,
+    which is then loaded, or in this process when there is no path.
+    """
+    def __init__(self, histories, path=None, model_path=None, batch_size=256, max_nodes=50000, interval=0.0):
+        self.histories = histories
+        self.path = path
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_nodes = max_nodes
+        self.interval = interval
+        self.index = EmbeddingIndex(EMBED_DIM)
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"incremental_runs": 0, "incremental_vendors": 0, "incremental_seconds_last": None,
+                        "errors": 0, "last_error": None}
+        self.status = {"state": "idle", "started_at": None, "finished_at": None, "params": None, "report": None, "error": None}
+
+    @property
+    def embedder(self):
+        # built on first use: torch is only imported once something is embedded
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = VendorEmbedder(self.model_path)
+        return self._embedder
+
+    def mark(self, vendor_ids):
+        if self.interval <= 0:
+            return
+        with self._dirty_lock:
+            self._dirty.update(vendor_ids)
+
+    def embed_items(self, items, report=None):
+        """
+        Embed (vendorId, events) items batch by batch into the index; returns the vendor count.
+        """
+        n = 0
+        for batch in pack_batches(items, self.batch_size, self.max_nodes):
+            vectors = self.embedder.embed([events for _, events in batch])
+            self.index.upsert([vid for vid, _ in batch], vectors)
+            n += len(batch)
+            if report is not None:
+                report["vendors"] = n
+                report["batches"] = report.get("batches", 0) + 1
+        return n
+
+    def rebuild(self, collection=None, max_vendors=0, report=None):
+        """
+        Embed every vendor of the events collection (default: mongo.py's), streamed one vendor at
+        a time, then save.
+        """
+        from train_model import iter_vendor_events
+        if collection is None:
+            from mongo import get_db
+            collection = get_db()["events"]
+        report = report if report is not None else {}
+        t0 = time.perf_counter()
+        items = ((vid, [{"eventType": l} for l in labels]) for vid, labels, _ in iter_vendor_events(collection, max_vendors))
+        n = self.embed_items(items, report)
+        elapsed = time.perf_counter() - t0
+        report.update(vendors=n, seconds=round(elapsed, 3), vendors_per_sec=round(n / elapsed, 1) if elapsed else None,
+                      weights=self.embedder.weights)
+        if self.path:
+            self.index.save(self.path)
+        return report
+
+    def start_rebuild(self, **params):
+        """
+        Start rebuild(**params) on a background thread; returns False if one is already running.
+        """
+        with self._job_lock:
+            if self.status["state"] == "running":
+                return False
+            self.status = {"state": "running", "started_at": time.time(), "finished_at": None,
+                           "params": {k: v for k, v in params.items() if k != "collection"}, "report": {}, "error": None}
+            threading.Thread(target=self._run_rebuild, kwargs=params, name="embedding-rebuild", daemon=True).start()
+            return True
+
+    def _run_rebuild(self, **params):
+        report = self.status["report"]
+        try:
+            if self.path:
+                # the child opens its own Mongo client (collection is not picklable) and writes path
+                with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                    report.update(pool.submit(rebuild_file, self.path, self.model_path, self.batch_size, self.max_nodes,
+                                              params.get("max_vendors", 0)).result())
+                self.index.load(self.path)
+            else:
+                self.rebuild(report=report, **params)
+            self.status["state"] = "done"
+        except Exception as e:
+            self.status.update(state="error", error=str(e))
+            print("Embedding rebuild failed:", e)
+        self.status["finished_at"] = time.time()
+
+    def update(self):
+        """
+        One incremental pass: re-embed the vendors marked since the last one. Returns their count.
+        """
+        with self._dirty_lock:
+            vendor_ids, self._dirty = sorted(self._dirty), set()
+        if not vendor_ids:
+            return 0
+        t0 = time.perf_counter()
+        try:
+            with METRICS.span("embed_update", endpoint="embedding-job"):
+                n = self.embed_items(self.histories(vendor_ids))
+        except Exception:
+            self.mark(vendor_ids)  # retried on the next pass
+            raise
+        self.metrics["incremental_runs"] += 1
+        self.metrics["incremental_vendors"] += n
+        self.metrics["incremental_seconds_last"] = round(time.perf_counter() - t0, 4)
+        return n
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                self.metrics["errors"] += 1
+                self.metrics["last_error"] = str(e)
+                print("Embedding update failed:", e)
+
+    def start(self):
+        """
+        Load the saved index (if any) and start the incremental thread; interval <= 0 disables it.
+        """
+        try:
+            self.index.load(self.path)
+        except Exception as e:
+            print("Embedding index load failed, starting empty:", e)
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="embedding-job", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.path and self.interval > 0 and len(self.index):
+            # only the incremental pass changes the index after it was loaded from / written to path
+            self.index.save(self.path)
+
+    def stats(self):
+        return {"index": self.index.stats(), "pending": len(self._dirty), "weights": self._embedder.weights if self._embedder else None,
+                **self.metrics}
+
+def rebuild_file(path, model_path=None, batch_size=256, max_nodes=50000, max_vendors=0):
+    """
+    Full rebuild from mongo.py's events collection into the index file at `path`; the entry
+    point of the rebuild child process. Returns the report.
+    """
+    job = EmbeddingJob(histories=None, path=path, model_path=model_path, batch_size=batch_size, max_nodes=max_nodes)
+    return job.rebuild(max_vendors=max_vendors)
+
+if __name__ == "__main__":
+    print(rebuild_file(os.getenv("EMBEDDINGS_PATH", "vendor_embeddings.npz"), os.getenv("SAGE_MODEL_PATH", "vendor_sage.pt"),
+                       int(os.getenv("EMBED_BATCH", 256)), int(os.getenv("EMBED_MAX_NODES", 50000))))
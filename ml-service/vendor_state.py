@@ -0,0 +1,122 @@
+# ml-service/vendor_state.py
+from array import array
+from collections import OrderedDict
+
+class VendorState:
+    __slots__ = ("engagement", "last_time", "codes")
+
+    def __init__(self, engagement, last_time, codes=None):
+        self.engagement = engagement
+        self.last_time = last_time
+        self.codes = codes if codes is not None else array("H")  # event-type codes, oldest first
+
+class VendorStateStore:
+    """
+    server.py's per-vendor state (engagement, last event time, event history) under a memory budget.
+    Vendors are kept in LRU order; when resident bytes (state + the vendor's GNN tensor buffers)
+    exceed `memory_budget`, the coldest ones are written to the on-disk VendorStateDB (storage.py)
+    and dropped, and get() rehydrates them on their next event. Event types are stored as uint16
+    codes: EVENT_MAP's codes first, other type names interned after them (persisted in the DB).
+    """
+    OVERHEAD = 256  # approx. bytes per resident vendor besides its codes/tensors (dict slots, objects)
+
+    def __init__(self, db, tensors, event_map, memory_budget=0):
+        self.db = db
+        self.tensors = tensors
+        self.memory_budget = int(memory_budget or 0)  # 0 = unbounded
+        self.n_fixed = max(event_map.values()) + 1
+        self.codes = dict(event_map)
+        self.codes.update(db.event_types())
+        self.names = {c: n for n, c in self.codes.items()}
+        self._resident = OrderedDict()  # vendorId -> VendorState, coldest first
+        self._bytes = {}
+        self.resident_bytes = 0
+        self.counters = {"created": 0, "evictions": 0, "rehydrations": 0}
+
+    def code(self, name):
+        c = self.codes.get(name)
+        if c is None:
+            c = max(self.names) + 1
+            self.codes[name], self.names[c] = c, name
+            self.db.put_event_type(name, c)
+        return c
+
+    def feature_code(self, code):
+        # GNN input feature: EVENT_MAP code, 0 for other types (as EVENT_MAP.get(name, 0) did)
+        return code if code < self.n_fixed else 0
+
+    def get(self, vendor):
+        """
+        Resident state for the vendor (rehydrated from disk if it was evicted), or None if unknown.
+        """
+        st = self._resident.get(vendor)
+        if st is not None:
+            self._resident.move_to_end(vendor)
+            return st
+        row = self.db.get(vendor)
+        if row is None:
+            return None
+        engagement, last_time, codes = row
+        st = VendorState(engagement, last_time, codes)
+        self.tensors.load(vendor, [self.feature_code(c) for c in codes])
+        self.counters["rehydrations"] += 1
+        self._admit(vendor, st)
+        return st
+
+    def create(self, vendor, engagement, now):
+        st = VendorState(engagement, now)
+        self.counters["created"] += 1
+        self._admit(vendor, st)
+        return st
+
+    def append_event(self, vendor, st, event_type):
+        """
+        Add one event to the vendor's history and GNN tensors, then evict cold vendors if over budget.
+        """
+        code = self.code(event_type)
+        st.codes.append(code)
+        n = self.tensors.append(vendor, self.feature_code(code))
+        if len(st.codes) > n:
+            # the tensor store dropped old events (max_history); keep the same window here
+            del st.codes[:len(st.codes) - n]
+        self._account(vendor, st)
+        self._enforce()
+
+    def events(self, vendor):
+        st = self._resident.get(vendor)
+        return [self.names[c] for c in st.codes] if st is not None else []
+
+    def _admit(self, vendor, st):
+        self._resident[vendor] = st
+        self._account(vendor, st)
+        self._enforce()
+
+    def _account(self, vendor, st):
+        size = self.OVERHEAD + st.codes.itemsize * len(st.codes) + self.tensors.vendor_nbytes(vendor)
+        self.resident_bytes += size - self._bytes.get(vendor, 0)
+        self._bytes[vendor] = size
+
+    def _enforce(self):
+        if not self.memory_budget or self.resident_bytes <= self.memory_budget:
+            return
+        evicted = []
+        # the most recently used vendor always stays resident
+        while self.resident_bytes > self.memory_budget and len(self._resident) > 1:
+            vendor, st = self._resident.popitem(last=False)
+            evicted.append((vendor, st.engagement, st.last_time, st.codes))
+            self.resident_bytes -= self._bytes.pop(vendor)
+            self.tensors.drop(vendor)
+        self.db.put_many(evicted)
+        self.counters["evictions"] += len(evicted)
+
+    def spill_all(self):
+        """
+        Write every resident vendor to disk (e.g. on shutdown) without evicting it.
+        """
+        self.db.put_many((v, st.engagement, st.last_time, st.codes) for v, st in self._resident.items())
+
+    def gauges(self):
+        n = len(self._resident)
+        return {"resident_vendors": n, "resident_bytes": self.resident_bytes,
+                "bytes_per_vendor": round(self.resident_bytes / n, 1) if n else 0.0,
+                "memory_budget": self.memory_budget, "vendors_on_disk": self.db.count(), **self.counters}
@@ -0,0 +1,152 @@
+# ml-service/vendor_stats.py
+import math
+import time
+import numpy as np
+
+class P2Quantile:
+    """
+    P-square streaming quantile estimator (Jain & Chlamtac, 1985): five markers, O(1) memory and
+    update. Exact (np.median-style) while it has seen five values or fewer.
+    """
+    __slots__ = ("p", "q", "n", "np_", "dn", "count")
+
+    def __init__(self, p=0.5):
+        self.p = p
+        self.q = []  # marker heights (the raw values until there are five)
+        self.n = [0, 1, 2, 3, 4]  # marker positions
+        self.np_ = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # desired positions
+        self.dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+        self.count = 0
+
+    @classmethod
+    def from_values(cls, values, p=0.5):
+        """
+        Seed the markers from a full sample (used when stats are rebuilt from a stored graph).
+        """
+        sk = cls(p)
+        values = np.sort(np.asarray(values, dtype=float))
+        N = len(values)
+        if N <= 5:
+            for v in values.tolist():
+                sk.add(v)
+            return sk
+        sk.np_ = [0.0, (N - 1) * p / 2, (N - 1) * p, (N - 1) * (1 + p) / 2, N - 1.0]
+        sk.n = [int(round(x)) for x in sk.np_]
+        sk.q = values[sk.n].tolist()
+        sk.count = N
+        return sk
+
+    def add(self, x):
+        self.count += 1
+        q = self.q
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        n = self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np_[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np_[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # parabolic prediction, linear if it would break marker ordering
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if self.count == 0:
+            return 0.0
+        if self.count <= 5:
+            m = len(self.q)
+            return (self.q[(m - 1) // 2] + self.q[m // 2]) / 2
+        return self.q[2]
+
+class VendorStats:
+    """
+    Running per-vendor inputs for the eight scoring features, updated per event in O(1):
+    event count, Welford mean/variance and a P-square median of the waits between events,
+    distinct labels, vendor edge count and summed edge counts, and the latest timestamp.
+    """
+    __slots__ = ("n_events", "n_waits", "mean", "m2", "median", "labels", "edge_count", "edge_count_sum", "last_ts")
+
+    def __init__(self):
+        self.n_events = 0
+        self.n_waits = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.median = P2Quantile(0.5)
+        self.labels = set()
+        self.edge_count = 0
+        self.edge_count_sum = 0
+        self.last_ts = None  # epoch seconds
+
+    @classmethod
+    def from_arrays(cls, timestamps, labels, edge_counts):
+        """
+        Exact stats for an existing history (timestamps in epoch seconds, any order).
+        """
+        st = cls()
+        ts = np.sort(np.asarray(timestamps, dtype=float))
+        waits = np.diff(ts)
+        st.n_events = len(ts)
+        st.n_waits = len(waits)
+        if len(waits):
+            st.mean = float(waits.mean())
+            st.m2 = float(((waits - st.mean) ** 2).sum())
+        st.median = P2Quantile.from_values(waits)
+        st.labels = set(labels)
+        st.edge_count = len(edge_counts)
+        st.edge_count_sum = int(np.sum(edge_counts)) if len(edge_counts) else 0
+        st.last_ts = float(ts[-1]) if len(ts) else None
+        return st
+
+    def add_event(self, label, ts, wait=None):
+        self.n_events += 1
+        self.labels.add(label)
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+        if wait is not None:
+            self.n_waits += 1
+            delta = wait - self.mean
+            self.mean += delta / self.n_waits
+            self.m2 += delta * (wait - self.mean)
+            self.median.add(wait)
+
+    def add_edge(self, created):
+        if created:
+            self.edge_count += 1
+        self.edge_count_sum += 1
+
+    def features(self, now=None):
+        if self.n_events == 0:
+            return {"n_events": 0, "avg_wait": 0.0, "median_wait": 0.0, "std_wait": 0.0, "unique_actions": 0,
+                    "edge_count": 0, "avg_edge_count": 0.0, "last_event_age": 0.0}
+        now = time.time() if now is None else now
+        return {
+            "n_events": self.n_events,
+            "avg_wait": self.mean if self.n_waits else 0.0,
+            "median_wait": self.median.value(),
+            "std_wait": math.sqrt(self.m2 / self.n_waits) if self.n_waits else 0.0,
+            "unique_actions": len(self.labels),
+            "edge_count": self.edge_count,
+            "avg_edge_count": self.edge_count_sum / self.edge_count if self.edge_count else 0.0,
+            "last_event_age": now - self.last_ts,
+        }